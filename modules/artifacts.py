@@ -1,5 +1,30 @@
+# modules/artifacts.py — run ディレクトリとスナップショットの保存・読み出し
+#
+# スナップショット（gin_menu.html / result-page-NNN.html 等）は既定で内容アドレスのストアへ：
+#   data/snapshots/ab/abcdef….html.gz   … 内容の sha256 ごとに1つだけ（gzip）
+#   data/run-…/snapshots.jsonl          … その run の「名前 → sha256」（1行1件の小さな目録）
+# 前回と同じページは目録に1行足すだけになる。圧縮・書き込みは専用スレッドで行い、
+# 呼び出し側（巡回）は待たない。[snapshots] store = false なら従来どおり素の .html を書く。
+# 読み出し（iter_result_pages / read_snapshot）はどちらの形式でも同じように読める。
+from __future__ import annotations
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import queue
+import shutil
+import threading
+import time
 from pathlib import Path
 from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .const import SNAPSHOT_STORE, SNAPSHOT_RETENTION_DAYS, SNAPSHOT_MAX_MB
+
+MANIFEST = "snapshots.jsonl"
+OBJECTS_DIR = "snapshots"
+GC_GRACE_SEC = 60  # 掃除の開始よりこれだけ前以降に書かれた・使われたオブジェクトは消さない（別プロセスの書き込み中）
 
 def run_dir(base: Path) -> Path:
     ts = datetime.now().strftime("%Y%m%d-%H%M")
@@ -7,5 +32,229 @@ def run_dir(base: Path) -> Path:
     d.mkdir(parents=True, exist_ok=True)
     return d
 
+def _run_root(path: Path) -> Optional[Path]:
+    """ path を含む run-* ディレクトリ（target 別のサブディレクトリからも辿る） """
+    for p in (path, *path.parents):
+        if p.name.startswith("run-"):
+            return p
+    return None
+
+def _object_path(base: Path, digest: str) -> Path:
+    return base / OBJECTS_DIR / digest[:2] / f"{digest}.html.gz"
+
+
+# ===== 書き込み（専用スレッド） =====
+class _Writer:
+    """ save_text のキューを1本のスレッドで処理（ハッシュ・圧縮・目録の追記もここ） """
+
+    def __init__(self):
+        self._q: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stored = 0   # 新しく書いたオブジェクト
+        self.reused = 0   # 既にあったので目録だけ
+
+    def put(self, path: Path, text: str):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="snapshot-writer", daemon=True)
+                self._thread.start()
+        self._q.put((path, text))
+
+    def _run(self):
+        while True:
+            path, text = self._q.get()
+            try:
+                _write(path, text, self)
+            except Exception as e:  # 保存の失敗で巡回は止めない
+                print(f"[warn] snapshot write failed: {path.name}: {e}")
+            finally:
+                self._q.task_done()
+
+    def flush(self):
+        self._q.join()
+
+_writer = _Writer()
+atexit.register(_writer.flush)  # 例外で落ちても書き切る
+
+def _write(path: Path, text: str, stats: Optional[_Writer] = None):
+    root = _run_root(path.parent)
+    if not SNAPSHOT_STORE or root is None:
+        path.write_text(text, encoding="utf-8")
+        return
+    raw = text.encode("utf-8")
+    digest = hashlib.sha256(raw).hexdigest()
+    obj = _object_path(root.parent, digest)
+    try:
+        os.utime(obj)  # 再利用も「使った」印に mtime を更新（別プロセスの sweep に消させない）
+        reused = True
+    except FileNotFoundError:
+        reused = False
+    if reused:
+        if stats is not None:
+            stats.reused += 1
+    else:
+        obj.parent.mkdir(parents=True, exist_ok=True)
+        tmp = obj.with_name(f"{obj.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(gzip.compress(raw, compresslevel=6, mtime=0))
+        os.replace(tmp, obj)
+        if stats is not None:
+            stats.stored += 1
+    line = {"name": path.name, "sha256": digest, "bytes": len(raw), "ts": time.strftime("%Y-%m-%d %H:%M:%S")}
+    with (path.parent / MANIFEST).open("a", encoding="utf-8") as fh:
+        fh.write(json.dumps(line, ensure_ascii=False) + "\n")
+
 def save_text(path: Path, text: str):
-    path.write_text(text, encoding="utf-8")
+    """ スナップショットを保存（キューに積んですぐ戻る。書き切るのは flush_snapshots()） """
+    _writer.put(Path(path), text)
+
+def flush_snapshots() -> dict:
+    """ 積んである保存を書き終えるまで待つ。{"stored", "reused"}（このプロセスの累計） """
+    _writer.flush()
+    return {"stored": _writer.stored, "reused": _writer.reused}
+
+
+# ===== 読み出し =====
+def _manifest(dirpath: Path) -> Dict[str, str]:
+    """ dirpath の目録：名前 → sha256（同じ名前は後の行が勝つ） """
+    out: Dict[str, str] = {}
+    mf = dirpath / MANIFEST
+    if mf.exists():
+        for line in mf.read_text(encoding="utf-8").splitlines():
+            try:
+                rec = json.loads(line)
+                out[rec["name"]] = rec["sha256"]
+            except (ValueError, KeyError):
+                continue
+    return out
+
+def read_snapshot(path: Path) -> str:
+    """ 素の .html があればそれを、なければ目録からストアのオブジェクトを読む """
+    path = Path(path)
+    if path.exists():
+        return path.read_text(encoding="utf-8")
+    digest = _manifest(path.parent).get(path.name)
+    root = _run_root(path.parent)
+    if digest is None or root is None:
+        raise FileNotFoundError(path)
+    return gzip.decompress(_object_path(root.parent, digest).read_bytes()).decode("utf-8")
+
+def snapshot_names(runpath: Path, pattern: str = "result-page-*.html") -> List[str]:
+    """ runpath 以下にある pattern のスナップショット名（runpath からの相対パス、順序つき） """
+    root = Path(runpath)
+    names = {p.relative_to(root).as_posix() for p in root.rglob(pattern)}
+    for mf in root.rglob(MANIFEST):
+        rel = mf.parent.relative_to(root)
+        names.update((rel / n).as_posix() for n in _manifest(mf.parent) if Path(n).match(pattern))
+    return sorted(names)
+
+def iter_result_pages(runpath: Path) -> Iterator[Tuple[str, str]]:
+    """
+    run ディレクトリの result-page-*.html をページ順に (名前, HTML) で返す。
+    複数 target の実行（runpath/NN-分類1/ 配下）もサブディレクトリ順に辿る。
+    素のファイルでもストア（snapshots.jsonl）でも同じように読める。
+    """
+    root = Path(runpath)
+    for name in snapshot_names(root):
+        yield name, read_snapshot(root / name)
+
+
+# ===== 保持期間の掃除 =====
+def _run_time(d: Path) -> float:
+    try:
+        return datetime.strptime(d.name[4:], "%Y%m%d-%H%M").timestamp()
+    except ValueError:
+        return d.stat().st_mtime
+
+def _tree_bytes(d: Path) -> int:
+    return sum(p.stat().st_size for p in d.rglob("*") if p.is_file())
+
+def sweep(base: Path, max_age_days: float = SNAPSHOT_RETENTION_DAYS, max_mb: float = SNAPSHOT_MAX_MB,
+          keep: Optional[Path] = None) -> dict:
+    """
+    base（data/）の run-* を掃除する：
+      1) max_age_days より古い run を削除
+      2) run + ストアの合計が max_mb を超えていれば古い run から削除
+      3) どの目録からも参照されないオブジェクトを削除
+    keep（実行中の run）は消さない。0 以下の値はその条件を使わない。
+    別プロセスの巡回と同時に走ってもよいように、掃除の開始（から GC_GRACE_SEC 前）以降に
+    書かれた・再利用されたオブジェクトは目録になくても消さない（目録を読んだ後に足された行の分）。
+    """
+    flush_snapshots()
+    fresh = time.time() - GC_GRACE_SEC
+    base = Path(base)
+    runs = sorted((d for d in base.glob("run-*") if d.is_dir()), key=_run_time)
+    keep = Path(keep).resolve() if keep else None
+    removed: List[Path] = []
+
+    def _drop(d: Path):
+        shutil.rmtree(d, ignore_errors=True)
+        removed.append(d)
+
+    if max_age_days > 0:
+        cutoff = time.time() - max_age_days * 86400
+        for d in list(runs):
+            if _run_time(d) < cutoff and d.resolve() != keep:
+                _drop(d)
+                runs.remove(d)
+
+    def _gc() -> Tuple[int, int]:
+        live = set()
+        for d in runs:
+            for mf in d.rglob(MANIFEST):
+                live.update(_manifest(mf.parent).values())
+        n = freed = 0
+        for obj in (base / OBJECTS_DIR).glob("*/*.html.gz"):
+            if obj.name[:-len(".html.gz")] in live:
+                continue
+            try:
+                st = obj.stat()
+            except FileNotFoundError:
+                continue
+            if st.st_mtime >= fresh:
+                continue
+            freed += st.st_size
+            obj.unlink(missing_ok=True)
+            n += 1
+        return n, freed
+
+    n_obj, freed = _gc()
+    if max_mb > 0:
+        sizes = {d: _tree_bytes(d) for d in runs}
+        objects = base / OBJECTS_DIR
+        total = sum(sizes.values()) + (_tree_bytes(objects) if objects.exists() else 0)
+        limit = max_mb * 1024 * 1024
+        for d in list(runs):
+            if total <= limit:
+                break
+            if d.resolve() == keep:
+                continue
+            total -= sizes[d]
+            _drop(d)
+            runs.remove(d)
+            n, f = _gc()  # この run だけが参照していたオブジェクトも外す
+            n_obj, freed, total = n_obj + n, freed + f, total - f
+    return {"runs_removed": len(removed), "objects_removed": n_obj, "object_bytes_freed": freed,
+            "runs_kept": len(runs)}
+
+def sweep_after_run(base: Path, runpath: Path, log):
+    """ run の終わりに保存を書き切ってから保持期間の掃除をし、結果を1行ログ """
+    try:
+        st = {**sweep(base, keep=runpath), **flush_snapshots()}
+    except Exception as e:
+        log(f"[warn] snapshot sweep failed: {e}")
+        return
+    log(f"[snapshots] 新規 {st['stored']} / 再利用 {st['reused']}、"
+        f"掃除: run {st['runs_removed']} / オブジェクト {st['objects_removed']} 削除",
+        event="snapshots", obj=st)
+
+
+if __name__ == "__main__":
+    # 手動で掃除：python -m modules.artifacts [--days N] [--max-mb M] [data_dir]
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("data_dir", nargs="?", type=Path, default=Path(__file__).resolve().parent.parent / "data")
+    ap.add_argument("--days", type=float, default=SNAPSHOT_RETENTION_DAYS)
+    ap.add_argument("--max-mb", type=float, default=SNAPSHOT_MAX_MB)
+    a = ap.parse_args()
+    print(sweep(a.data_dir, a.days, a.max_mb))
@@ -0,0 +1,289 @@
+# modules/bench.py — パーサ／差分のベンチマーク
+#   python -m modules.bench parse                       # 同梱の合成コーパス
+#   python -m modules.bench parse --dir data/run-20251004-0900
+#   python -m modules.bench parse --facilities 80 --cols 6 --pages 50 --update-baseline
+#   python -m modules.bench e2e --pages 20 --latency-ms 80 -- --engine async   # 代役サーバで main.py を丸ごと
+from __future__ import annotations
+import argparse, cProfile, json, os, pstats, random, subprocess, sys, tempfile, time, tracemalloc
+from pathlib import Path
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from .const import ROOT
+from .diffstore import DiffStore
+from .scraper import PARSERS, parse_result_html
+from .artifacts import iter_result_pages
+
+BASELINE_PATH = ROOT / "bench-baseline.json"
+
+_SLOTS = [
+    ("9:00", "11:00"), ("11:00", "13:00"), ("13:00", "15:00"),
+    ("15:00", "17:00"), ("17:00", "19:00"), ("19:00", "21:00"),
+    ("21:00", "22:00"), ("7:00", "9:00"),
+]
+
+
+# ===== 合成コーパス =====
+def synth_result_page(day: int, facilities: int, cols: int, rooms: int = 3,
+                      ok_ratio: float = 0.35, seed: int = 0,
+                      form_html: Optional[str] = None, charset: str = "utf-8") -> str:
+    """
+    本番の結果ページと同じ形の HTML を作る：
+      <h3><span>令和07年10月DD日(土)</span></h3> + hidden selectdate
+      施設ごとに <table>（ヘッダー <th id="tdB_col">HH:MM<br>～<br>HH:MM</th> と部屋行）
+    day は 2025-10-01 起点の通し日数。form_html を渡すと既定の selectdate フォームと差し替える。
+    """
+    rnd = random.Random(seed * 100003 + day)
+    cols = max(1, min(cols, len(_SLOTS)))
+    dt = date(2025, 10, 1) + timedelta(days=day - 1)
+    wd = "月火水木金土日"[dt.weekday()]
+    if form_html is None:
+        form_html = f"<form name=\"formNext\"><input type=\"hidden\" name=\"selectdate\" value=\"{dt:%Y%m%d}\"></form>"
+    parts = [
+        f"<html><head><meta charset=\"{charset}\"></head><body>",
+        f"<h3><span>令和{dt.year - 2018:02d}年{dt.month:02d}月{dt.day:02d}日({wd})</span></h3>",
+        form_html,
+    ]
+    for b in range(1, facilities + 1):
+        head = "".join(
+            f"<th class=\"time\" id=\"td{b}_{c}\">{_SLOTS[c - 1][0]}<br>～<br>{_SLOTS[c - 1][1]}</th>"
+            for c in range(1, cols + 1)
+        )
+        parts.append(f"<table class=\"calendar\"><tr><th>施設</th>{head}</tr>")
+        for r in range(1, rooms + 1):
+            cells = []
+            for c in range(1, cols + 1):
+                if rnd.random() < ok_ratio:
+                    cells.append(f"<td id=\"td{b}{r}_{c}\" class=\"ok\"><img src=\"/img/o.gif\" alt=\"O\"></td>")
+                else:
+                    cells.append(f"<td id=\"td{b}{r}_{c}\" class=\"ng\"><img src=\"/img/x.gif\" alt=\"X\"></td>")
+            parts.append(
+                f"<tr>\n<th class=\"name\"><strong>施設{b:03d}</strong><br>部屋{r}</th>{''.join(cells)}</tr>\n"
+            )
+        parts.append("</table>")
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def synth_corpus(pages: int, facilities: int, cols: int, seed: int = 0) -> List[str]:
+    return [synth_result_page(i, facilities, cols, seed=seed) for i in range(1, pages + 1)]
+
+
+def load_snapshots(dirs: List[Path]) -> List[str]:
+    """ run ディレクトリ（またはその親）から result-page-*.html をページ順に読む（ストア保存分も） """
+    out: List[str] = []
+    for d in dirs:
+        if d.is_file():
+            out.append(d.read_text(encoding="utf-8"))
+        else:
+            out.extend(html for _name, html in iter_result_pages(d))
+    return out
+
+
+# ===== 計測 =====
+def _time_stages(pages: List[str], backend: str) -> Tuple[float, float, List[dict]]:
+    t0 = time.perf_counter()
+    records: List[dict] = []
+    for html in pages:
+        records.extend(parse_result_html(html, backend))
+    t_parse = time.perf_counter() - t0
+
+    # 既知（prev）を半分入れた状態で diff
+    with tempfile.TemporaryDirectory() as td:
+        store = DiffStore(Path(td) / "prev.json")
+        store.prev = records[::2]
+        t0 = time.perf_counter()
+        store.diff(records)
+        t_diff = time.perf_counter() - t0
+    return t_parse, t_diff, records
+
+
+def _profile(pages: List[str], backend: str, top: int) -> List[Tuple[str, int, float]]:
+    prof = cProfile.Profile()
+    prof.enable()
+    _time_stages(pages, backend)
+    prof.disable()
+    st = pstats.Stats(prof)
+    rows = []
+    for (fname, line, func), (_cc, nc, _tt, ct, _callers) in st.stats.items():  # type: ignore[attr-defined]
+        if "modules" not in fname.replace("\\", "/"):
+            continue
+        rows.append((f"{Path(fname).stem}.{func}", nc, ct))
+    rows.sort(key=lambda r: r[2], reverse=True)
+    return rows[:top]
+
+
+def _peak_memory(pages: List[str], backend: str) -> int:
+    tracemalloc.start()
+    try:
+        _time_stages(pages, backend)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_parse(pages: List[str], backend: str, repeat: int = 3, top: int = 8) -> Dict:
+    best_parse = best_diff = float("inf")
+    n_rec = 0
+    for _ in range(max(1, repeat)):
+        t_parse, t_diff, records = _time_stages(pages, backend)
+        best_parse = min(best_parse, t_parse)
+        best_diff = min(best_diff, t_diff)
+        n_rec = len(records)
+    return {
+        "backend": backend,
+        "pages": len(pages),
+        "records": n_rec,
+        "parse_sec": best_parse,
+        "diff_sec": best_diff,
+        "pages_per_sec": len(pages) / best_parse if best_parse > 0 else 0.0,
+        "records_per_sec": n_rec / best_parse if best_parse > 0 else 0.0,
+        "diff_records_per_sec": n_rec / best_diff if best_diff > 0 else 0.0,
+        "peak_mem_bytes": _peak_memory(pages, backend),
+        "functions": _profile(pages, backend, top),
+    }
+
+
+# ===== ベースライン =====
+def _load_baseline(path: Path) -> Dict:
+    """ ファイルがなければ {}。読めない・壊れているときは ValueError（なしと区別する） """
+    if not path.exists():
+        return {}
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except Exception as e:
+        raise ValueError(f"{path}: {e}") from e
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: JSON object ではありません")
+    return data
+
+
+def check_baseline(result: Dict, key: str, path: Path, tolerance: float) -> Tuple[Optional[bool], str]:
+    """ (True=OK / False=劣化 / None=比べる baseline がない・読めない, メッセージ) """
+    try:
+        base = _load_baseline(path).get(key)
+    except ValueError as e:
+        return None, f"[bench] baseline を読めません: {e}（--update-baseline で作り直す）"
+    if not base:
+        return None, f"[bench] baseline なし（{key}）。--update-baseline で作成"
+    floor = base["pages_per_sec"] * (1.0 - tolerance)
+    ok = result["pages_per_sec"] >= floor
+    msg = (f"[bench] baseline {base['pages_per_sec']:.1f} pages/s, "
+           f"floor {floor:.1f} (-{tolerance:.0%}) -> {'OK' if ok else 'REGRESSION'}")
+    return ok, msg
+
+
+def update_baseline(result: Dict, key: str, path: Path):
+    try:
+        data = _load_baseline(path)
+    except ValueError as e:
+        print(f"[warn] baseline を読めないため作り直します: {e}")
+        data = {}
+    data[key] = {
+        "pages_per_sec": round(result["pages_per_sec"], 2),
+        "records_per_sec": round(result["records_per_sec"], 2),
+        "updated": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+
+def _print_report(r: Dict):
+    print(f"backend={r['backend']} pages={r['pages']} records={r['records']}")
+    print(f"  parse : {r['parse_sec']*1000:9.1f} ms  {r['pages_per_sec']:10.1f} pages/s  {r['records_per_sec']:12.1f} records/s")
+    print(f"  diff  : {r['diff_sec']*1000:9.1f} ms  {r['diff_records_per_sec']:12.1f} records/s")
+    print(f"  peak memory: {r['peak_mem_bytes'] / 1024 / 1024:.2f} MiB")
+    print("  per-function (cumulative):")
+    for name, calls, cum in r["functions"]:
+        print(f"    {cum*1000:9.1f} ms  {calls:8d} calls  {name}")
+
+
+# ===== end-to-end（ローカル代役サーバ） =====
+def bench_e2e(args) -> int:
+    """ modules.mockserver を立てて main.py --dry-run を別プロセスで実行し、所要時間を測る """
+    from .mockserver import MockConfig, start_mock_server
+
+    cfg = MockConfig(pages=args.pages, facilities=args.facilities, cols=args.cols,
+                     latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                     error_rate=args.error_rate, seed=args.seed)
+    srv = start_mock_server(cfg)
+    env = dict(os.environ, GIN_MENU_URL=srv.gin_menu_url)
+    extra = [a for a in args.main_args if a != "--"]
+    cmd = [sys.executable, str(ROOT / "main.py"), "--dry-run", *extra]
+    print(f"[bench] mock={srv.gin_menu_url} pages={cfg.pages} facilities={cfg.facilities} "
+          f"latency={cfg.latency_ms}ms error_rate={cfg.error_rate}")
+    print(f"[bench] $ {' '.join(cmd)}")
+    try:
+        t0 = time.perf_counter()
+        rc = subprocess.run(cmd, cwd=ROOT, env=env,
+                            stdout=None if args.verbose else subprocess.DEVNULL).returncode
+        wall = time.perf_counter() - t0
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+    stats = srv.state.stats
+    n_pages = stats.get("result_pages", 0)
+    print(f"  exit={rc} wall={wall:.2f}s requests={stats['requests']} result_pages={n_pages} "
+          f"errors_injected={stats['errors_injected']}")
+    if n_pages:
+        print(f"  {n_pages / wall:.2f} pages/s  {wall / n_pages * 1000:.0f} ms/page（起動込み）")
+    return rc
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m modules.bench")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("parse", help="parse_result_html / DiffStore.diff のスループット")
+    p.add_argument("--dir", type=Path, action="append", default=[],
+                   help="スナップショットの run ディレクトリ（複数可）。未指定なら合成コーパス")
+    p.add_argument("--pages", type=int, default=30)
+    p.add_argument("--facilities", type=int, default=40)
+    p.add_argument("--cols", type=int, default=6)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--backend", choices=sorted(PARSERS), default="regex")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    p.add_argument("--tolerance", type=float, default=0.25, help="許容する低下率（0.25 = 25%%）")
+    p.add_argument("--update-baseline", action="store_true")
+
+    e = sub.add_parser("e2e", help="ローカル代役サーバ相手に main.py を丸ごと計測（'--' 以降は main.py へ）")
+    e.add_argument("--pages", type=int, default=10)
+    e.add_argument("--facilities", type=int, default=20)
+    e.add_argument("--cols", type=int, default=6)
+    e.add_argument("--latency-ms", type=int, default=50)
+    e.add_argument("--jitter-ms", type=int, default=0)
+    e.add_argument("--error-rate", type=float, default=0.0)
+    e.add_argument("--seed", type=int, default=0)
+    e.add_argument("-v", "--verbose", action="store_true", help="main.py の出力を表示")
+    e.add_argument("main_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "e2e":
+        return bench_e2e(args)
+
+    if args.dir:
+        pages = load_snapshots(args.dir)
+        key = f"snapshots:{len(pages)}:{args.backend}"
+    else:
+        pages = synth_corpus(args.pages, args.facilities, args.cols, args.seed)
+        key = f"synthetic:{args.pages}x{args.facilities}x{args.cols}:{args.backend}"
+    if not pages:
+        print("[bench] result-page-*.html が見つかりません")
+        return 1
+
+    result = bench_parse(pages, args.backend, repeat=args.repeat)
+    _print_report(result)
+
+    if args.update_baseline:
+        update_baseline(result, key, args.baseline)
+        print(f"[bench] baseline 更新: {args.baseline} ({key})")
+        return 0
+    ok, msg = check_baseline(result, key, args.baseline, args.tolerance)
+    print(msg)
+    if ok is None:
+        return 3  # 比べられなかった：合格扱いにはしない
+    return 0 if ok else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,6 +25,15 @@ CFG: dict = _load_config()
 SEL: dict = (CFG.get("selectors") or {})
 APP: dict = (CFG.get("app") or {})
 SLEEP: dict = (CFG.get("sleep") or {})
+PARSER: dict = (CFG.get("parser") or {})
+CRAWL: dict = (CFG.get("crawl") or {})
+PAGER: dict = (CFG.get("pager") or {})
+NETWORK: dict = (CFG.get("network") or {})
+SESSION: dict = (CFG.get("session") or {})
+NOTIFY: dict = (CFG.get("notify") or {})
+STORE: dict = (CFG.get("store") or {})
+LOG: dict = (CFG.get("log") or {})
+SNAPSHOTS: dict = (CFG.get("snapshots") or {})
 
 def _env_int(name: str, default: int) -> int:
     try:
@@ -46,7 +55,7 @@ _DEFAULT_SELECTORS = {
     "next_button": "a:has-text('次へ'), input[type='button'][value='次へ']",
 
     # 抽出（○セル）
-    "ok_cell": "td.ok img[alt='O'], td.ok",
+    "ok_cell": "td.ok img[alt='O']",  # scraper と同じく alt="O" の画像があるセルだけ
 
     # エラー検出（本文テキスト）
     "error_text": "text=エラーが発生しました, text=一定時間操作がなかった場合, text=アクセス権限がありません",
@@ -77,7 +86,7 @@ def _sel(key: str) -> str:
 # ----------------------------
 # 公開：URL/セレクタ（本名）
 # ----------------------------
-URL_GIN_MENU            = _sel("gin_menu_url")
+URL_GIN_MENU            = os.getenv("GIN_MENU_URL") or _sel("gin_menu_url")  # ENV はローカル代役サーバ用
 MULTIFUNC_SELECTOR      = _sel("multifunc")
 LEFT_AVAIL_MENU         = _sel("left_avail_menu")
 SEARCH_BUTTON           = _sel("search_button")
@@ -90,6 +99,8 @@ ERROR_TEXT_SELECTOR     = _sel("error_text")
 GENERIC_ERROR_SELECTOR  = "text=エラーが発生しました"
 TIMEOUT_SELECTOR        = "text=一定時間操作がなかった場合"
 ACCESS_DENIED_SELECTOR  = "text=アクセス権限がありません"
+# 上の3つの本文（HTML 文字列での判定用）
+ERROR_PAGE_TEXTS = ("エラーが発生しました", "一定時間操作がなかった場合", "アクセス権限がありません")
 
 # エラーボタン群（まとめ）
 ERROR_BUTTONS_SELECTOR  = _sel("error_buttons")
@@ -104,7 +115,82 @@ CLOSE_BUTTON   = "button:has-text('閉じる'), a:has-text('閉じる')"
 # ----------------------------
 USER_AGENT        = APP.get("user_agent", "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome Safari")
 STEP_TIMEOUT_SEC  = int(APP.get("step_timeout_sec", 40))
-TOTAL_TIMEOUT_SEC = int(APP.get("total_timeout_sec", 300))
+TOTAL_TIMEOUT_SEC = _env_int("TOTAL_TIMEOUT_SEC", int(APP.get("total_timeout_sec", 300)))
+
+# ----------------------------
+# 結果ページのパーサ（ENV → TOML → 既定 の順）："regex" / "regex-scan" / "lxml"
+# ----------------------------
+PARSER_BACKEND = os.getenv("PARSER_BACKEND") or str(PARSER.get("backend", "regex"))
+
+# 結果ページの読み方（ENV → TOML → 既定）：
+#   "html"  : HTML 全体を取得して上のパーサで解析（既定）
+#   "dom"   : frame.evaluate で ○ セルだけ受け取る。HTML は結果が怪しいときだけ取得・保存
+#   "check" : 両方行って食い違いを log.jsonl（event="extract_check"）へ。結果は HTML 側を採用
+EXTRACT_MODE = os.getenv("EXTRACT_MODE") or str(PARSER.get("extract", "html"))
+
+# 前回と結果表が同じページは解析を省いて前回の抽出結果を使う（ENV → TOML → 既定）：
+#   PAGE_CACHE=1 : data/page_cache.json に (target, ページ番号) → 指紋・レコードを残して比べる
+#   PAGE_CACHE=0 : 毎回すべて解析（従来）
+PAGE_CACHE = _env_int("PAGE_CACHE", int(bool(PARSER.get("page_cache", True)))) == 1
+
+# ----------------------------
+# 2ページ目以降の取得方法（ENV → TOML → 既定）："dom"（『次へ』クリック） / "http"（Cookie 共有で直接取得）
+# ----------------------------
+PAGER_MODE = os.getenv("PAGER_MODE") or str(PAGER.get("mode", "dom"))
+
+# ----------------------------
+# 既知枠（差分の基準）の保存先（ENV → TOML → 既定）：
+#   "json"   : data/prev.json を丸ごと読み書き（従来）
+#   "sqlite" : data/prev.sqlite3（(date, time, facility) 主キー。過去日は自動削除、初回に prev.json を取り込み）
+# ----------------------------
+STORE_BACKEND = os.getenv("DIFF_STORE") or str(STORE.get("backend", "json"))
+
+# ----------------------------
+# 通信の絞り込み（[network]）：不要な resource_type / URL を context.route で中止
+# ENV NETWORK_BLOCK=0 で無効化
+# ----------------------------
+def _str_list(v) -> tuple:
+    if isinstance(v, str):
+        v = v.split(",")
+    return tuple(s.strip() for s in (v or []) if str(s).strip())
+
+NETWORK_ENABLED      = _env_int("NETWORK_BLOCK", int(bool(NETWORK.get("enabled", True)))) == 1
+BLOCK_RESOURCE_TYPES = _str_list(NETWORK.get("block_resource_types", ["image", "font", "media"]))
+BLOCK_URL_PATTERNS   = _str_list(NETWORK.get("block_url_patterns", []))
+ALLOW_URL_PATTERNS   = _str_list(NETWORK.get("allow_url_patterns", []))
+
+# ----------------------------
+# セッションのウォームスタート（[session]）：storage_state と検索フォーム URL を保存して入口を省略
+# ENV SESSION_WARM_START=0 で無効化
+# ----------------------------
+SESSION_WARM_START  = _env_int("SESSION_WARM_START", int(bool(SESSION.get("warm_start", True)))) == 1
+SESSION_MAX_AGE_MIN = _env_int("SESSION_MAX_AGE_MIN", int(SESSION.get("max_age_min", 20)))
+
+# ----------------------------
+# スナップショットの保存（[snapshots]、ENV → TOML → 既定）
+#   SNAPSHOT_STORE=1 : data/snapshots/ に内容ごと1つだけ gzip で保存し、run には目録（snapshots.jsonl）だけ
+#   SNAPSHOT_STORE=0 : run ディレクトリに素の .html（従来）
+#   保持：run 終了時に retention_days より古い run を消し、合計が max_mb を超えたら古い run から消す（0 で無効）
+# ----------------------------
+SNAPSHOT_STORE          = _env_int("SNAPSHOT_STORE", int(bool(SNAPSHOTS.get("store", True)))) == 1
+SNAPSHOT_RETENTION_DAYS = _env_int("SNAPSHOT_RETENTION_DAYS", int(SNAPSHOTS.get("retention_days", 14)))
+SNAPSHOT_MAX_MB         = _env_int("SNAPSHOT_MAX_MB", int(SNAPSHOTS.get("max_mb", 500)))
+
+# ----------------------------
+# run ディレクトリのログ（[log]、ENV → TOML → 既定）："debug" / "info" / "warn" / "error"
+#   コンソールは LOG_LEVEL 以上、log.txt / log.jsonl は LOG_FILE_LEVEL 以上
+# ----------------------------
+LOG_LEVEL      = os.getenv("LOG_LEVEL") or str(LOG.get("console_level", "info"))
+LOG_FILE_LEVEL = os.getenv("LOG_FILE_LEVEL") or str(LOG.get("file_level", "debug"))
+
+# ----------------------------
+# 巡回中の速報（[notify]、ENV → TOML → 既定）
+#   "off"      : 巡回が終わってから1通（従来）
+#   "first"    : 最初に新規が見つかった時点で1通、残りは巡回後のまとめで
+#   "interval" : 最初の新規ですぐ1通、以後は EARLY_NOTIFY_SEC 秒おきにまとめて
+# ----------------------------
+EARLY_NOTIFY     = os.getenv("EARLY_NOTIFY") or str(NOTIFY.get("early", "off"))
+EARLY_NOTIFY_SEC = _env_int("EARLY_NOTIFY_SEC", int(NOTIFY.get("interval_sec", 300)))
 
 # ----------------------------
 # スリープ／リトライ（ENV → TOML → 既定 の順）
@@ -182,6 +268,30 @@ CONFIRM_ALLSEARCH_LABEL   = _os.getenv("CONFIRM_ALLSEARCH_LABEL", "確定・全
 # 曜日チェック（UIは “日 / 土 / 祝日” のチェックボックス）
 DAY_CHECK_LABELS = ("日", "土", "祝日")
 
+# ---- 巡回対象（分類1×目的の組）と同時実行数 ----
+# ENV CRAWL_TARGETS="屋内スポーツ施設:バレーボール,文化施設" → TOML [crawl] targets → 既定（1組のみ）
+# 目的を省略した要素は PURPOSE_LABEL を使う
+def _parse_targets(raw) -> tuple:
+    items = raw.split(",") if isinstance(raw, str) else list(raw or [])
+    out = []
+    for item in items:
+        cat, _, purpose = str(item).strip().partition(":")
+        if cat.strip():
+            out.append((cat.strip(), purpose.strip() or PURPOSE_LABEL))
+    return tuple(out)
+
+CRAWL_TARGETS = (_parse_targets(_os.getenv("CRAWL_TARGETS", ""))
+                 or _parse_targets(CRAWL.get("targets"))
+                 or ((CATEGORY1_LABEL, PURPOSE_LABEL),))
+CRAWL_CONCURRENCY = max(1, _env_int("CRAWL_CONCURRENCY", int(CRAWL.get("concurrency", 2))))
+
+# ---- 日付ウィンドウでの分割検索（ENV → TOML [crawl] → 既定） ----
+# SHARD_DAYS > 0 なら、検索の開始日（selectdate）を SHARD_DAYS 日ずつずらした SHARD_WINDOWS 個の検索に分け、
+# それぞれ別コンテキストで最大 SHARD_WORKERS 並列（CRAWL_CONCURRENCY は超えない）に巡回する（最後のウィンドウは終わりまで）。0 で無効
+SHARD_DAYS    = max(0, _env_int("SHARD_DAYS", int(CRAWL.get("shard_days", 0))))
+SHARD_WINDOWS = max(1, _env_int("SHARD_WINDOWS", int(CRAWL.get("shard_windows", 4))))
+SHARD_WORKERS = max(1, _env_int("SHARD_WORKERS", int(CRAWL.get("shard_workers", 4))))
+
 # ---- 互換エイリアス（旧コードが別名で import してもOKにする） ----
 globals().update({
     "CATEGORY1": CATEGORY1_LABEL,
@@ -0,0 +1,241 @@
+# modules/daemon.py — 常駐モード（main.py --daemon --interval 15m）
+#
+# 1つのブラウザとコンテキストを温めたまま、ゆらぎ付きの間隔で巡回を繰り返す。
+#   - 既知枠のストアは開いたまま持ち続ける（json は prev.json を、sqlite は DB を毎回開き直さない）
+#   - コンテキストは N 回ごと、ブラウザは関連プロセスの RSS がしきい値を超えたら作り直す
+#   - SIGTERM/SIGINT で今の巡回を終えてから止まる
+#   - ロック（nerima.lock）は巡回中も含めて心拍スレッドが更新し続ける
+from __future__ import annotations
+import os
+import random
+import re
+import signal
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from .artifacts import run_dir, sweep_after_run
+from .diffstore import open_store
+from .stream import EarlyNotifier
+from .pagecache import PageCache, activate as activate_pages
+from .runner import (
+    DATA_DIR, CrawlTarget, crawl_with_browser, finalize, launch_browser, logger_factory,
+    new_crawl_context, write_timings,
+)
+from .trace import Tracer, activate, span
+from .deadline import Deadline
+from .const import CRAWL_TARGETS
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "": 60}
+
+
+def parse_interval(text: str) -> float:
+    """ "15m" / "90s" / "1h" / "1h30m" / "20"（単位なしは分）→ 秒 """
+    text = str(text).strip().lower()
+    parts = re.findall(r"(\d+(?:\.\d+)?)\s*([smh]?)", text)
+    if not parts or re.sub(r"[\d.\s smh]", "", text):
+        raise ValueError(f"invalid interval: {text!r}")
+    return sum(float(n) * _UNITS[u] for n, u in parts)
+
+
+def _descendants_rss_mb(root_pid: int) -> Optional[float]:
+    """ root_pid 配下（playwright ドライバ＋Chromium 群）の RSS 合計（MB）。/proc がなければ None """
+    proc = Path("/proc")
+    if not proc.is_dir():
+        return None
+    children: Dict[int, List[int]] = {}
+    rss: Dict[int, int] = {}
+    for d in proc.iterdir():
+        if not d.name.isdigit():
+            continue
+        try:
+            status = (d / "status").read_text()
+        except OSError:
+            continue
+        m_pp = re.search(r"^PPid:\s+(\d+)", status, re.M)
+        m_rss = re.search(r"^VmRSS:\s+(\d+)\s+kB", status, re.M)
+        if m_pp:
+            children.setdefault(int(m_pp.group(1)), []).append(int(d.name))
+        rss[int(d.name)] = int(m_rss.group(1)) if m_rss else 0
+    total, stack = 0, list(children.get(root_pid, []))
+    while stack:
+        pid = stack.pop()
+        total += rss.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total / 1024
+
+
+def _refresh_lock(lock_path: Optional[Path]):
+    """ runner.acquire_lock の TTL 切れで他プロセスに奪われないよう時刻を更新 """
+    if lock_path is not None:
+        lock_path.write_text(f"{os.getpid()}\n{time.time()}\n", encoding="utf-8")
+
+
+class _LockHeartbeat:
+    """ 常駐中ずっと（巡回の最中も）ロックの時刻を更新し、cron の run_once に奪われないようにする """
+
+    def __init__(self, lock_path: Optional[Path], every_sec: float = 60.0):
+        self.lock_path = lock_path
+        self.every_sec = every_sec
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lock-heartbeat", daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                _refresh_lock(self.lock_path)
+            except Exception as e:
+                print(f"[daemon] lock refresh failed: {e}")
+            self._stop.wait(self.every_sec)
+
+    def start(self) -> "_LockHeartbeat":
+        if self.lock_path is not None:
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+def run_daemon(interval_sec: float, jitter: float = 0.15, recycle_runs: int = 20,
+               recycle_mem_mb: float = 1500, show=False, slowmo=0, dry_run=False, force_mail=False,
+               targets: Optional[List[CrawlTarget]] = None, max_cycles: Optional[int] = None,
+               lock_path: Optional[Path] = None) -> int:
+    load_dotenv()
+    force_mail = force_mail or os.getenv("FORCE_MAIL", "0") == "1"  # runner.run_once と同じ
+    targets = targets or [CrawlTarget(c, p) for c, p in CRAWL_TARGETS]
+    store = open_store(DATA_DIR)  # 以後は同じストアで差分（json はメモリ上の prev、sqlite は開いたままの接続）
+    pages = PageCache.open_for(DATA_DIR)  # ページの指紋も前のサイクルと比べる
+
+    stopping = {"flag": False}
+
+    def _stop(signum, _frame):
+        print(f"[daemon] signal {signum} -> 今の巡回が終わったら停止")
+        stopping["flag"] = True
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            signal.signal(sig, _stop)
+        except ValueError:  # メインスレッド以外
+            pass
+
+    from playwright.sync_api import sync_playwright
+
+    print(f"[daemon] interval={interval_sec:.0f}s jitter=±{jitter:.0%} recycle_runs={recycle_runs} "
+          f"recycle_mem_mb={recycle_mem_mb} targets={[t.label for t in targets]}")
+
+    cycle = 0
+    log = None
+    with sync_playwright() as p:
+        browser = None
+        contexts: Dict[CrawlTarget, tuple] = {}
+        ctx_runs = 0
+
+        def close_contexts():
+            for ctx, _net in contexts.values():
+                try:
+                    ctx.close()
+                except Exception:
+                    pass
+            contexts.clear()
+
+        heartbeat = _LockHeartbeat(lock_path).start()  # 止めるのは finally（release_lock の後に書き戻さない）
+        try:
+            while not stopping["flag"] and (max_cycles is None or cycle < max_cycles):
+                cycle += 1
+                t0 = time.perf_counter()
+                runpath = run_dir(DATA_DIR)
+                if log is not None:
+                    log.close()  # 前のサイクルのログを閉じる
+                log = logger_factory(runpath)
+
+                # --- ウォームなブラウザ／コンテキストを用意（必要なら作り直し） ---
+                if browser is None or not browser.is_connected():
+                    browser, _ = launch_browser(p, show=show, slowmo=slowmo)
+                    contexts.clear()
+                    ctx_runs = 0
+                    log(f"[daemon] browser launched (cycle {cycle})", event="daemon_browser_launch")
+                if ctx_runs >= recycle_runs:
+                    close_contexts()
+                    ctx_runs = 0
+                    log(f"[daemon] contexts recycled after {recycle_runs} runs", event="daemon_recycle",
+                        obj={"reason": "runs"})
+                for t in targets:
+                    if t not in contexts:
+                        contexts[t] = new_crawl_context(browser)
+
+                # --- 巡回 → 差分・通知（DiffStore はメモリで持ち越し） ---
+                log(f"[daemon] cycle {cycle} start", event="daemon_cycle_start")
+                tracer = Tracer(log)
+                activate(tracer)
+                deadline = Deadline()  # 1サイクルごとに TOTAL_TIMEOUT_SEC
+                try:
+                    with span("run", cat="run"):
+                        early = EarlyNotifier.start_for(store, dry_run, log, force_mail=force_mail)
+                        try:
+                            with span("crawl", cat="run"):
+                                extracted = crawl_with_browser(browser, None, targets, runpath, log, concurrency=1,
+                                                               contexts=contexts, deadline=deadline)
+                        finally:
+                            if early is not None:
+                                early.stop()
+                        with span("finalize", cat="run"):
+                            new_records = finalize(extracted, dry_run=dry_run, force_mail=force_mail, store=store,
+                                                   alerted=early.alerted if early is not None else None)
+                    log(f"[daemon] cycle {cycle}: {len(extracted)}件 / 新規 {len(new_records)}件",
+                        event="daemon_cycle", obj={"cycle": cycle, "records": len(extracted),
+                                                   "new": len(new_records),
+                                                   "sec": round(time.perf_counter() - t0, 2)})
+                except Exception as e:
+                    log(f"[daemon] cycle {cycle} failed: {e}", level="error", event="daemon_cycle_error")
+                    close_contexts()  # 壊れたセッションは捨てる
+                finally:
+                    activate(None)
+                    if pages is not None:
+                        pages.finish(log)
+                    log(deadline.summary(), event="budget", obj=deadline.stats())
+                    write_timings(tracer, runpath, log)
+                    sweep_after_run(DATA_DIR, runpath, log)
+                ctx_runs += 1
+
+                # --- メモリしきい値：ブラウザごと作り直す ---
+                rss = _descendants_rss_mb(os.getpid())
+                if rss is not None and rss > recycle_mem_mb:
+                    log(f"[daemon] browser RSS {rss:.0f}MB > {recycle_mem_mb}MB -> restart",
+                        event="daemon_recycle", obj={"reason": "memory", "rss_mb": round(rss)})
+                    close_contexts()
+                    try:
+                        browser.close()
+                    except Exception:
+                        pass
+                    browser = None
+
+                if stopping["flag"] or (max_cycles is not None and cycle >= max_cycles):
+                    break
+
+                # --- 次回まで待つ（ゆらぎ付き）。ロックは心拍スレッドが更新 ---
+                wait = max(1.0, interval_sec * random.uniform(1 - jitter, 1 + jitter))
+                print(f"[daemon] next cycle in {wait:.0f}s")
+                wake_at = time.monotonic() + wait
+                while not stopping["flag"] and time.monotonic() < wake_at:
+                    time.sleep(min(30.0, max(0.0, wake_at - time.monotonic())))
+        finally:
+            heartbeat.stop()
+            activate_pages(None)
+            store.close()
+            if log is not None:
+                log.close()
+            close_contexts()
+            if browser is not None:
+                try:
+                    browser.close()
+                except Exception:
+                    pass
+
+    print(f"[daemon] stopped after {cycle} cycles")
+    return 0
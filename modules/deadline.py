@@ -0,0 +1,72 @@
+# modules/deadline.py — 1回の実行の持ち時間（TOTAL_TIMEOUT_SEC）
+#
+# run_once で Deadline を作り、crawl_once → flow の各手順（Waiter 経由）まで渡す。
+#   - Playwright に渡す timeout は残り時間で頭打ちにする（clamp）
+#   - 手順を始める時点で使い切っていれば DeadlineExceeded（リトライもしない）
+#   - ページ巡回は使い切った時点でそこまでの結果で打ち切り、差分・通知は通常どおり行う
+#   - 手順ごとに使った秒数を集計し、最後に log.jsonl（event="budget"）へ
+from __future__ import annotations
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from .const import TOTAL_TIMEOUT_SEC
+from .trace import span
+
+
+class DeadlineExceeded(TimeoutError):
+    """ 持ち時間切れ（これ以上の手順は始めない） """
+
+
+class Deadline:
+    def __init__(self, total_sec: Optional[float] = None):
+        self.total_sec = float(TOTAL_TIMEOUT_SEC if total_sec is None else total_sec)
+        self._t0 = time.monotonic()
+        self._end = self._t0 + self.total_sec
+        self._lock = threading.Lock()
+        self.usage: Dict[str, float] = {}  # 手順 → 使った秒数（並行分は重なって数える）
+        self.cut_short = False              # 巡回を途中で打ち切ったか
+
+    def remaining(self) -> float:
+        return max(0.0, self._end - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self._end
+
+    def ms(self, want_ms: float) -> int:
+        """ Playwright 用の timeout（ms）。残り時間で頭打ち。0 は「無制限」になるので最低 1 """
+        return max(1, int(min(want_ms, self.remaining() * 1000)))
+
+    def check(self, step: str):
+        if self.expired():
+            raise DeadlineExceeded(f"total timeout {self.total_sec:.0f}s exceeded before {step}")
+
+    @contextmanager
+    def step(self, name: str, cat: str = "crawl", **args):
+        """ 手順1つ：始める前に残りを確認し、span を記録し、使った秒数を足し込む """
+        self.check(name)
+        t0 = time.monotonic()
+        try:
+            with span(name, cat, **args):
+                yield
+        finally:
+            used = time.monotonic() - t0
+            with self._lock:
+                self.usage[name] = self.usage.get(name, 0.0) + used
+
+    def stats(self) -> dict:
+        with self._lock:
+            steps = {k: round(v, 2) for k, v in sorted(self.usage.items(), key=lambda kv: -kv[1])}
+        used = min(self.total_sec, time.monotonic() - self._t0)
+        return {
+            "total_sec": self.total_sec, "used_sec": round(used, 2),
+            "remaining_sec": round(self.remaining(), 2), "expired": self.expired(),
+            "cut_short": self.cut_short, "steps": steps,
+        }
+
+    def summary(self) -> str:
+        s = self.stats()
+        top = ", ".join(f"{k}={v:.1f}s" for k, v in list(s["steps"].items())[:5])
+        return (f"[budget] used {s['used_sec']:.0f}/{s['total_sec']:.0f}s"
+                f"{' (打ち切りあり)' if s['cut_short'] else ''} {top}")
@@ -1,29 +1,52 @@
 # modules/diffstore.py
 from __future__ import annotations
 import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import List, Optional, Set, Tuple
 
-Record = Dict[str, str]  # {"date": "...", "time": "...", "facility": "..."}
+from .const import STORE_BACKEND
+from .utils import Slot, iso_to_int
+
+Record = Slot  # 差分キーは Slot そのもの（date, start, end, facility）
+
+PREV_JSON = "prev.json"
+PREV_DB = "prev.sqlite3"
 
 class DiffStore:
+    """
+    既知枠（prev）の JSON ストア。SqliteDiffStore も同じ口（prev / diff / save / len / close）を持つ。
+    """
+
     def __init__(self, path: Path):
         self.path = Path(path)
         self.prev: List[Record] = []
         if self.path.exists():
             try:
-                self.prev = json.loads(self.path.read_text(encoding="utf-8"))
+                self.prev = [Slot.from_record(r) for r in json.loads(self.path.read_text(encoding="utf-8"))]
             except Exception:
                 self.prev = []
 
+    @property
+    def prev(self) -> List[Record]:
+        return self._prev
+
+    @prev.setter
+    def prev(self, recs: List[Record]):
+        self._prev = list(recs)
+        self._prev_keys: Optional[Set[Record]] = None  # diff のたびに作り直さない（prev が変わったら捨てる）
+
     @staticmethod
-    def _key(r: Record) -> Tuple[str, str, str]:
-        # 差分判定キー（ISO日付で扱っている前提）
-        return (r.get("date", ""), r.get("time", ""), r.get("facility", ""))
+    def _key(r) -> Record:
+        # 差分判定キー：Slot はそのまま、dict（旧形式）は Slot にして比べる
+        return r if isinstance(r, Slot) else Slot.from_record(r)
 
     def diff(self, current: List[Record]) -> List[Record]:
-        prev_keys = {self._key(r) for r in self.prev}
-        return [r for r in current if self._key(r) not in prev_keys]
+        if self._prev_keys is None:
+            self._prev_keys = set(self._prev)
+        return [r for r in current if self._key(r) not in self._prev_keys]
 
     def save(self, current: List[Record], mode: str = "union"):
         """
@@ -39,5 +62,138 @@ class DiffStore:
                 merged[self._key(r)] = r
             out = list(merged.values())
 
-        self.path.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
+        self.path.write_text(json.dumps([r.to_record() for r in out], ensure_ascii=False, indent=2),
+                             encoding="utf-8")
         self.prev = out  # メモリも更新
+
+    def __len__(self) -> int:
+        return len(self._prev)
+
+    def close(self):
+        """ JSON はファイルを開いたままにしないので何もしない（SqliteDiffStore と同じ口） """
+
+
+# ===== SQLite バックエンド =====
+_JST = timezone(timedelta(hours=9))
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS slots (
+    date       INTEGER NOT NULL,  -- YYYYMMDD（不明は 0）
+    start      INTEGER NOT NULL,  -- 0:00 からの分
+    end        INTEGER NOT NULL,
+    facility   TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen  TEXT NOT NULL,
+    PRIMARY KEY (date, start, end, facility)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+_UPSERT = (
+    "INSERT INTO slots (date, start, end, facility, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (date, start, end, facility) DO UPDATE SET last_seen = excluded.last_seen"
+)
+_IN_CHUNK = 500  # SQLite のパラメータ数上限（古い版で 999）より十分小さく
+
+
+def _today() -> int:
+    return iso_to_int(datetime.now(_JST).date().isoformat())
+
+
+class SqliteDiffStore(DiffStore):
+    """
+    DiffStore と同じ diff / save を stdlib sqlite3 で。Slot の (date, start, end, facility) が主キー。
+      - diff : 今回出てきた日付の既知キーだけを主キーの索引で引く（全件は読まない）
+      - save : 1トランザクションでまとめて upsert（ファイル全体の書き直しはしない）
+      - 開くとき・保存のたびに今日（JST）より前の日付を削除
+      - DB が新しく、migrate_from（prev.json）があれば1回だけ取り込む
+    daemon の EarlyNotifier と finalize が別スレッドから触るので接続はロックで守る。
+    """
+
+    def __init__(self, path: Path, migrate_from: Optional[Path] = None):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._db:
+            self._db.executescript(_SCHEMA)
+        self.migrated = self._migrate(Path(migrate_from)) if migrate_from else 0
+        self.pruned = self._prune()
+
+    def _migrate(self, src: Path) -> int:
+        with self._lock:
+            done = self._db.execute("SELECT value FROM meta WHERE key = 'migrated_from'").fetchone()
+        if done or not src.exists():
+            return 0
+        try:
+            rows = json.loads(src.read_text(encoding="utf-8"))
+        except Exception:
+            rows = []
+        now = datetime.now(_JST).isoformat(timespec="seconds")
+        with self._lock, self._db:
+            self._db.executemany(_UPSERT, [(*Slot.from_record(r), now, now) for r in rows])
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)", (str(src),))
+        print(f"[store] {src.name} から {len(rows)}件を移行")
+        return len(rows)
+
+    def _prune(self) -> int:
+        """ 今日より前の日付を削除（日付が空のものは残す） """
+        with self._lock, self._db:
+            n = self._db.execute("DELETE FROM slots WHERE date != 0 AND date < ?", (_today(),)).rowcount
+        if n > 0:
+            print(f"[store] 過去日 {n}件を削除")
+        return n
+
+    def _known(self, dates: List[int]) -> Set[Tuple[int, int, int, str]]:
+        out: Set[Tuple[int, int, int, str]] = set()
+        with self._lock:
+            for i in range(0, len(dates), _IN_CHUNK):
+                chunk = dates[i:i + _IN_CHUNK]
+                q = f"SELECT date, start, end, facility FROM slots WHERE date IN ({','.join('?' * len(chunk))})"
+                out.update(self._db.execute(q, chunk))
+        return out
+
+    def diff(self, current: List[Record]) -> List[Record]:
+        keys = [self._key(r) for r in current]
+        known = self._known(sorted({k.date for k in keys}))  # Slot はタプルなので行タプルとそのまま比べられる
+        return [r for r, k in zip(current, keys) if k not in known]
+
+    def save(self, current: List[Record], mode: str = "union"):
+        """ mode は DiffStore.save と同じ（"overwrite" は既知を今回分だけにする） """
+        now = datetime.now(_JST).isoformat(timespec="seconds")
+        with self._lock, self._db:
+            if mode == "overwrite":
+                self._db.execute("DELETE FROM slots")
+            self._db.executemany(_UPSERT, [(*self._key(r), now, now) for r in current])
+        self._prune()
+
+    @property
+    def prev(self) -> List[Record]:
+        """ 既知の全件（DiffStore.prev と同じ形。diff / save はこれを使わず索引で引く） """
+        with self._lock:
+            rows = self._db.execute("SELECT date, start, end, facility FROM slots ORDER BY date, start, end, facility")
+            return [Slot(*row) for row in rows]
+
+    @prev.setter
+    def prev(self, recs: List[Record]):
+        """ 既知を recs だけに置き換える（save(recs, mode="overwrite") と同じだが過去日は消さない） """
+        now = datetime.now(_JST).isoformat(timespec="seconds")
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM slots")
+            self._db.executemany(_UPSERT, [(*self._key(r), now, now) for r in recs])
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM slots").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def open_store(data_dir: Path, backend: Optional[str] = None) -> DiffStore:
+    """ 設定（STORE_BACKEND）に応じた既知枠ストアを data_dir に開く """
+    name = backend or STORE_BACKEND
+    data_dir = Path(data_dir)
+    if name == "json":
+        return DiffStore(data_dir / PREV_JSON)
+    if name == "sqlite":
+        return SqliteDiffStore(data_dir / PREV_DB, migrate_from=data_dir / PREV_JSON)
+    raise ValueError(f"unknown store backend: {name} (available: json, sqlite)")
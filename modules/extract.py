@@ -0,0 +1,148 @@
+# modules/extract.py — 結果ページをブラウザ内で抽出する（EXTRACT_MODE="dom" / "check"）
+#
+# 右フレームの HTML 全体を CDP 越しに受け取って scraper で読む代わりに、
+# frame.evaluate 1回で ○ セル（OK_CELL_SELECTOR）だけを (date, facility, col, start, end) で受け取る。
+# 読み方は scraper._parse_lxml と同じ（文書順に th#tdX_col の時刻を覚え、施設行の ○ に当てる）。
+# 日付の和暦変換と連続枠の結合は Python 側で scraper と同じ関数を使う。
+from __future__ import annotations
+from typing import List, NamedTuple, Tuple
+
+from .const import OK_CELL_SELECTOR
+from .scraper import Record, _iso_from_era_text, _merge_ranges
+
+# 引数: OK_CELL_SELECTOR。戻り値: {header, selectdate, cells: [[row, facility, col, start, end], ...]}
+JS_EXTRACT = r"""(okSel) => {
+    const timeRe = /^\d{1,2}:\d{2}$/;
+    const idRe = /^td\d+_(\d+)$/;
+    const label = (th) => {
+        const t = (th.textContent || "").replace(/\s+/g, "");
+        const i = t.indexOf("～");
+        if (i < 0) return ["", ""];
+        const s = t.slice(0, i), e = t.slice(i + 1);
+        return timeRe.test(s) && timeRe.test(e) ? [s, e] : ["", ""];
+    };
+    const facility = (tr) => {
+        const th = tr.firstElementChild;
+        if (!th || th.tagName !== "TH") return null;
+        const strong = th.querySelector(":scope > strong"), br = th.querySelector(":scope > br");
+        if (!strong || !br) return null;
+        const n1 = strong.firstChild && strong.firstChild.nodeType === 3 ? strong.firstChild.nodeValue : "";
+        const n2 = br.nextSibling && br.nextSibling.nodeType === 3 ? br.nextSibling.nodeValue : "";
+        return n1 && n2 ? (n1 + " " + n2).trim() : null;
+    };
+    const headers = {};
+    const cells = [];
+    let row = 0;
+    for (const el of document.querySelectorAll("tr, th")) {
+        if (el.tagName === "TH") {
+            const m = idRe.exec(el.id || "");
+            if (m) headers[m[1]] = label(el);
+            continue;
+        }
+        const name = facility(el);
+        if (name === null) continue;
+        row += 1;
+        const cols = new Set();
+        for (const hit of el.querySelectorAll(okSel)) {
+            const td = hit.closest("td");
+            const m = td && el.contains(td) ? idRe.exec(td.id || "") : null;
+            if (m) cols.add(Number(m[1]));
+        }
+        for (const col of Array.from(cols).sort((a, b) => a - b)) {
+            const [s, e] = headers[col] || ["", ""];
+            cells.push([row, name, col, s, e]);
+        }
+    }
+    const h = document.querySelector("h3 > span");
+    const sd = document.querySelector("input[name='selectdate']");
+    return {header: h ? h.textContent.trim() : "", selectdate: sd ? sd.value : "", cells};
+}"""
+
+# ページの日付だけ（日付ウィンドウの判定用）。戻り値: {header, selectdate}
+JS_PAGE_DATE = r"""() => {
+    const h = document.querySelector("h3 > span");
+    const sd = document.querySelector("input[name='selectdate']");
+    return {header: h ? h.textContent.trim() : "", selectdate: sd ? sd.value : ""};
+}"""
+
+
+class DomCell(NamedTuple):
+    """ ブラウザから受け取った ○ セル1つ（row は同じ施設名の行を区別するための通し番号） """
+    date: str
+    facility: str
+    col: int
+    start: str
+    end: str
+    row: int = 0
+
+
+def _date_from_dom(header: str, selectdate: str) -> str:
+    """ scraper._pick_iso_date と同じ：ヘッダの和暦を優先、なければ selectdate """
+    iso = _iso_from_era_text(header or "")
+    if iso:
+        return iso
+    sd = (selectdate or "").strip()
+    if len(sd) == 8 and sd.isdigit():
+        return f"{sd[0:4]}-{sd[4:6]}-{sd[6:8]}"
+    return ""
+
+
+def cells_from_dom(data: dict) -> List[DomCell]:
+    date = _date_from_dom(data.get("header", ""), data.get("selectdate", ""))
+    return [DomCell(date, name, int(col), s, e, int(row)) for row, name, col, s, e in data.get("cells") or []]
+
+
+def records_from_cells(cells: List[DomCell]) -> List[Record]:
+    """ 行ごとに col 昇順の時刻を結合して parse_result_html と同じ形のレコードにする """
+    out: List[Record] = []
+    i = 0
+    while i < len(cells):
+        j = i
+        while j < len(cells) and cells[j].row == cells[i].row:
+            j += 1
+        row = cells[i:j]
+        for s, e in _merge_ranges([(c.start, c.end) for c in row]):
+            out.append(Record.make(row[0].date, s, e, row[0].facility))
+        i = j
+    return out
+
+
+def problems(cells: List[DomCell], data: dict) -> List[str]:
+    """ 抽出結果が怪しい理由（空なら問題なし）。怪しければ呼び出し側は HTML で取り直す """
+    out = []
+    date = _date_from_dom(data.get("header", ""), data.get("selectdate", ""))
+    if not date:
+        out.append("date not found")
+    missing = sorted({c.col for c in cells if not (c.start and c.end)})
+    if missing:
+        out.append(f"header time not found for col {missing}")
+    return out
+
+
+def extract_frame(frame) -> Tuple[List[Record], List[str]]:
+    """ frame 内で1回だけ evaluate して (レコード, 問題点) を返す """
+    data = frame.evaluate(JS_EXTRACT, OK_CELL_SELECTOR) or {}
+    cells = cells_from_dom(data)
+    return records_from_cells(cells), problems(cells, data)
+
+
+async def extract_frame_async(frame) -> Tuple[List[Record], List[str]]:
+    data = await frame.evaluate(JS_EXTRACT, OK_CELL_SELECTOR) or {}
+    cells = cells_from_dom(data)
+    return records_from_cells(cells), problems(cells, data)
+
+
+def page_date(frame) -> str:
+    """ 表示中の結果ページの日付（ISO）。読めなければ "" """
+    data = frame.evaluate(JS_PAGE_DATE) or {}
+    return _date_from_dom(data.get("header", ""), data.get("selectdate", ""))
+
+
+async def page_date_async(frame) -> str:
+    data = await frame.evaluate(JS_PAGE_DATE) or {}
+    return _date_from_dom(data.get("header", ""), data.get("selectdate", ""))
+
+
+def compare_records(dom: List[Record], html: List[Record]) -> Tuple[List[Record], List[Record]]:
+    """ scraper.compare_backends と同じ形：(dom にだけある, html にだけある) """
+    return [r for r in dom if r not in html], [r for r in html if r not in dom]
@@ -1,8 +1,12 @@
 # modules/flow.py
+from __future__ import annotations
 from pathlib import Path
 import random
 import time
-from playwright.sync_api import Page
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:  # 実行時には playwright を import しない（replay 等で不要）
+    from playwright.sync_api import Page
 
 from .const import (
     URL_GIN_MENU,
@@ -23,6 +27,7 @@ from .const import (
     PURPOSE_LABEL,              # 〃（例：合唱）
 )
 from .artifacts import save_text
+from .waits import Waiter, JS_SELECTED_LABEL, JS_YOBI_CHANGED, JS_YOBI_VALUE
 
 
 # ===== helpers =====
@@ -31,16 +36,18 @@ def sleep_rand(ms_min: int, ms_max: int):
 
 
 # ===== navigation primitives =====
-def goto_menu(page: Page):
+def goto_menu(page: Page, waiter: Optional[Waiter] = None):
     """開始URLへダイレクト遷移。"""
-    page.goto(URL_GIN_MENU, wait_until="domcontentloaded")
+    w = waiter or Waiter()
+    page.goto(URL_GIN_MENU, wait_until="domcontentloaded", timeout=w.timeout())
 
 
-def click_multifunc(page: Page):
+def click_multifunc(page: Page, waiter: Optional[Waiter] = None):
     """
     1枚目 /stagia/reserve/gin_menu にいるときだけ『多機能操作』を押す。
-    /gml_init 以降では押さない（ボタンは出ない）。
+    /gml_init 以降では押さない（ボタンは出ない）。押したら gml_init への遷移完了まで待つ。
     """
+    w = waiter or Waiter()
     url = page.url or ""
     if "gin_menu" not in url:
         return  # 2枚目以降は何もしない
@@ -55,16 +62,15 @@ def click_multifunc(page: Page):
     for sel in candidates:
         try:
             loc = page.locator(sel).first
-            if loc.count() > 0 and loc.is_visible(timeout=500):
-                loc.click(timeout=STEP_TIMEOUT_SEC * 1000)
-                page.wait_for_load_state("domcontentloaded")
+            if loc.count() > 0 and loc.is_visible():
+                w.navigation("multifunc", page, lambda: loc.click(timeout=w.timeout()))
                 return
         except Exception:
             pass
 
     # フォールバック（従来セレクタ）
-    page.locator(MULTIFUNC_SELECTOR).first.click(timeout=STEP_TIMEOUT_SEC * 1000)
-    page.wait_for_load_state("domcontentloaded")
+    w.navigation("multifunc", page,
+                 lambda: page.locator(MULTIFUNC_SELECTOR).first.click(timeout=w.timeout()))
 
 
 def right_frame(page: Page):
@@ -98,42 +104,137 @@ def right_frame(page: Page):
     return page.main_frame
 
 
-def go_to_availability_menu(page: Page) -> bool:
+class FrameResolver:
     """
-    2枚目（/gml_init）で、左メニュー『空き状況の確認』リンクをクリックして
-    検索フォーム側へ遷移。見つかれば True。
+    right_frame の結果を覚えておく版。初回（と外れたとき）だけ中身で探し、
+    以後は覚えたフレーム名＋URL のディレクトリで引く（ブラウザへの問い合わせなし）。
+    巡回（リトライを含む）1回ぶんで使い回し、hit/miss と探索時間を数える。
+    当たったフレームの中身は見ないので、中身が違っていた（エラー画面・フォームなし・試行の失敗）ときは
+    呼び出し側が invalidate() して、次の呼び出しで中身から探し直させる。
     """
-    selectors = [
-        "a[href*='gml_z_group_sel_1']",
-        "a:has-text('空き状況の確認')",
-        "text=空き状況の確認",
-    ]
-    # すべてのフレームを横断
-    for sel in selectors:
+
+    def __init__(self):
+        self.name: Optional[str] = None
+        self.url_dir: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.hit_ms = 0.0
+        self.probe_ms = 0.0
+
+    def _cached(self, page: Page):
+        if not self.name:
+            return None
+        for f in page.frames:
+            if (f.name == self.name and f is not page.main_frame and not f.is_detached()
+                    and (f.url or "").startswith(self.url_dir)):
+                return f
+        return None
+
+    def _remember(self, page: Page, f):
+        # 名前のないフレームは左メニュー等と区別できないので覚えない（毎回探す）
+        if f is page.main_frame or not f.name or not (f.url or "").startswith("http"):
+            return
+        self.name = f.name
+        self.url_dir = f.url.rsplit("/", 1)[0] + "/"
+
+    def _count(self, hit: bool, t0: float):
+        ms = (time.perf_counter() - t0) * 1000
+        if hit:
+            self.hits += 1
+            self.hit_ms += ms
+        else:
+            self.misses += 1
+            self.probe_ms += ms
+
+    def __call__(self, page: Page):
+        t0 = time.perf_counter()
+        f = self._cached(page)
+        if f is not None:
+            self._count(True, t0)
+            return f
+        f = right_frame(page)
+        self._remember(page, f)
+        self._count(False, t0)
+        return f
+
+    def invalidate(self):
+        """ 覚えたフレームが違っていたとき（次の呼び出しで探し直す） """
+        if self.name:
+            self.invalidations += 1
+        self.name = self.url_dir = None
+
+    def stats(self) -> dict:
+        probe_avg = self.probe_ms / self.misses if self.misses else 0.0
+        hit_avg = self.hit_ms / self.hits if self.hits else 0.0
+        return {
+            "hits": self.hits, "misses": self.misses, "invalidations": self.invalidations, "frame": self.name,
+            "probe_ms_avg": round(probe_avg, 1), "hit_ms_avg": round(hit_avg, 3),
+            # 当たった回数ぶん、探索していたら掛かっていたはずの時間
+            "saved_ms_est": round(self.hits * max(0.0, probe_avg - hit_avg), 1),
+        }
+
+    def summary(self) -> str:
+        s = self.stats()
+        return (f"[frame] hits={s['hits']} misses={s['misses']} invalidations={s['invalidations']} frame={s['frame']!r} "
+                f"probe_avg={s['probe_ms_avg']:.0f}ms saved≈{s['saved_ms_est']:.0f}ms")
+
+
+_AVAIL_LINK_SELECTORS = (
+    "a[href*='gml_z_group_sel_1']",
+    "a:has-text('空き状況の確認')",
+    "text=空き状況の確認",
+)
+
+
+def _find_avail_link(page: Page):
+    """ 全フレームを横断して『空き状況の確認』リンクを探す。なければ None """
+    for sel in _AVAIL_LINK_SELECTORS:
         for f in page.frames:
             try:
                 loc = f.locator(sel).first
-                if loc.count() > 0 and loc.is_visible(timeout=500):
-                    loc.click(timeout=STEP_TIMEOUT_SEC * 1000)
-                    page.wait_for_load_state("domcontentloaded")
-                    return True
+                if loc.count() > 0 and loc.is_visible():
+                    return loc
             except Exception:
                 pass
-    # フォールバック：ページ直下
-    for sel in selectors:
+    return None
+
+
+def _has_search_form(page: Page) -> bool:
+    """ どこかの子フレームに検索フォーム（select）が読み込まれたか """
+    for f in page.frames:
+        if f is page.main_frame:
+            continue
         try:
-            loc = page.locator(sel).first
-            if loc.count() > 0 and loc.is_visible(timeout=500):
-                loc.click(timeout=STEP_TIMEOUT_SEC * 1000)
-                page.wait_for_load_state("domcontentloaded")
+            if f.locator("select").count() > 0:
                 return True
         except Exception:
             pass
     return False
 
 
+def go_to_availability_menu(page: Page, waiter: Optional[Waiter] = None) -> bool:
+    """
+    2枚目（/gml_init）で、左メニュー『空き状況の確認』リンクをクリックして
+    検索フォーム側へ遷移。見つかれば True。
+    左フレームの読み込み → クリック → 右フレームにフォームが出るまで、をそれぞれ条件で待つ。
+    """
+    w = waiter or Waiter()
+    found = {}
+
+    def _link_ready():
+        found["loc"] = _find_avail_link(page)
+        return found["loc"] is not None
+
+    if not w.until("left_menu", _link_ready):
+        return False
+    found["loc"].click(timeout=w.timeout())
+    w.until("search_form", lambda: _has_search_form(page))
+    return True
+
+
 # ===== form handling =====
-def _click_nearby_confirm(container_locator):
+def _click_nearby_confirm(container_locator, timeout_ms: int = STEP_TIMEOUT_SEC * 1000):
     """
     コンテナ内で『確定・全検索』→『確定』の順にボタン候補を探してクリック。
     """
@@ -149,23 +250,25 @@ def _click_nearby_confirm(container_locator):
             "input[type='button'][value*='確定'], "
             "img[alt='確定']"
         ).first
-    btn.click(timeout=STEP_TIMEOUT_SEC * 1000)
+    btn.click(timeout=timeout_ms)
 
 
-def prepare_form(f, run_dir: Path, logger):
+def prepare_form(f, run_dir: Path, logger, category: str = CATEGORY1_LABEL, purpose: str = PURPOSE_LABEL,
+                 waiter: Optional[Waiter] = None):
     """
     検索フォームの初期化：
-      - 分類1：『CATEGORY1_LABEL』を選択 → 近傍の「確定」
-      - 目的：『PURPOSE_LABEL』を選択 → 近傍の「確定・全検索」優先
+      - 分類1：『category』（既定 CATEGORY1_LABEL）を選択 → 近傍の「確定」
+      - 目的：『purpose』（既定 PURPOSE_LABEL）を選択 → 近傍の「確定・全検索」優先
       - 曜日：『日』『土』『祝』にチェック
+    「確定」は遷移（あれば）と選択の反映を短い上限で待つ（遷移しないボタンでも止まらない）。
+    曜日は hidden の u_yobi 書き換えを待つ。
     """
-    # 事前に「フォームっぽい要素」があるか軽く確認
-    try:
-        has_form = f.locator(
-            "select, input, button, img[alt='検索'], text=予約状況, text=複数日表示"
-        ).first.is_visible(timeout=1000)
-    except Exception:
-        has_form = False
+    w = waiter or Waiter(logger)
+
+    # 事前に「フォームっぽい要素」があるか軽く確認（出たらすぐ抜ける）
+    has_form = w.until("form_ready", lambda: f.locator(
+        "select, input, button, img[alt='検索'], text=予約状況, text=複数日表示"
+    ).first.is_visible(), timeout_ms=1000)
     if not has_form:
         # 全フレームから再探索（語をヒントに）
         page = f.page
@@ -173,46 +276,48 @@ def prepare_form(f, run_dir: Path, logger):
             try:
                 if ff.locator(
                     "text=屋内スポーツ施設, text=文化施設, text=バレーボール, text=予約状況, text=複数日表示"
-                ).first.is_visible(timeout=500):
+                ).first.is_visible():
                     f = ff
                     break
             except Exception:
                 pass
 
-    # --- 分類1：CATEGORY1_LABEL → 近傍の「確定」を押す ---
+    # --- 分類1：category → 近傍の「確定」を押す ---
     try:
-        sel1 = f.locator(f"select:has(option:has-text('{CATEGORY1_LABEL}'))").first
-        sel1.select_option(label=CATEGORY1_LABEL)
-        time.sleep(0.1)  # 反映待ち
+        sel1 = f.locator(f"select:has(option:has-text('{category}'))").first
+        sel1.select_option(label=category)
         container1 = sel1.locator("xpath=ancestor::*[self::form or self::table or self::div][1]")
-        _click_nearby_confirm(container1)
-        time.sleep(0.3)  # 反映待ち
+        w.confirm("confirm_category", f, lambda: _click_nearby_confirm(container1, w.timeout()),
+                  JS_SELECTED_LABEL, arg=category)
     except Exception as e:
-        logger(f"[warn] 分類1 '{CATEGORY1_LABEL}' の選択に失敗: {e}")
+        logger(f"[warn] 分類1 '{category}' の選択に失敗: {e}")
 
-    # --- 目的：PURPOSE_LABEL → 近傍の「確定・全検索」を優先して押す ---
+    # --- 目的：purpose → 近傍の「確定・全検索」を優先して押す ---
     try:
-        sel2 = f.locator(f"select:has(option:has-text('{PURPOSE_LABEL}'))").first
-        sel2.select_option(label=PURPOSE_LABEL)
-        time.sleep(0.1)  # 反映待ち
+        sel2 = f.locator(f"select:has(option:has-text('{purpose}'))").first
+        sel2.select_option(label=purpose)
 
         container2 = sel2.locator("xpath=ancestor::*[self::form or self::table or self::div][1]")
-        _click_nearby_confirm(container2)
-        time.sleep(0.3)
+        w.confirm("confirm_purpose", f, lambda: _click_nearby_confirm(container2, w.timeout()),
+                  JS_SELECTED_LABEL, arg=purpose)
     except Exception as e:
-        logger(f"[warn] 目的 '{PURPOSE_LABEL}' の確定に失敗: {e}")
+        logger(f"[warn] 目的 '{purpose}' の確定に失敗: {e}")
 
     # --- 曜日：日・土・祝（インデックス指定で確実にチェック） ---
     try:
         # form[name='formDate'] 内の chkbox は配列（0=日,1=月,2=火,3=水,4=木,5=金,6=土,7=祝日）
         chkboxes = f.locator("form[name='formDate'] input[name='chkbox']")
         count = chkboxes.count()
+        before = f.evaluate(JS_YOBI_VALUE) if count else None
+        changed = False
         for idx in [0, 6, 7]:  # 日・土・祝
             if count > idx:
                 cb = chkboxes.nth(idx)
                 if cb.is_visible() and not cb.is_checked():
                     cb.check()
-        time.sleep(0.15)  # hidden の u_yobi 更新待ち
+                    changed = True
+        if changed and before is not None:
+            w.js("u_yobi", f, JS_YOBI_CHANGED, arg=before)  # hidden の u_yobi 更新待ち
     except Exception as e:
         logger(f"[warn] 曜日チェック(日・土・祝)に失敗: {e}")
 
@@ -220,18 +325,19 @@ def prepare_form(f, run_dir: Path, logger):
     save_text(run_dir / "availability-form.html", f.content())
 
 
-def submit_search(f, logger):
-    """検索ボタンを押す（フレーム内）。見えなければ諦める。"""
+def submit_search(f, logger, waiter: Optional[Waiter] = None):
+    """検索ボタンを押す（フレーム内）。見えなければ諦める。押したら結果ページへの遷移完了まで待つ。"""
+    w = waiter or Waiter(logger)
     btn = f.locator(SEARCH_BTN_SELECTOR).first
     try:
-        if not btn.is_visible(timeout=500):
+        if not btn.is_visible():
             logger("[warn] 検索ボタンが見えないためスキップ")
             return
     except Exception:
         logger("[warn] 検索ボタンの可視チェックに失敗（スキップ）")
         return
     try:
-        btn.click(timeout=1000)
+        w.navigation("search", f, lambda: btn.click(timeout=w.timeout(1000)))
     except Exception as e:
         logger(f"[warn] 検索ボタンのクリック失敗: {e}")
 
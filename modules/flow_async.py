@@ -0,0 +1,246 @@
+# modules/flow_async.py — flow.py の async 版（playwright.async_api 用）
+# 手順・セレクタ・待ち条件は flow.py と同じ。違いは await と AsyncWaiter だけ。
+from __future__ import annotations
+import asyncio
+import random
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from playwright.async_api import Page
+
+from .const import (
+    URL_GIN_MENU,
+    MULTIFUNC_SELECTOR,
+    SEARCH_BTN_SELECTOR,
+    NEXT_BTN_SELECTOR,
+    STEP_TIMEOUT_SEC,
+    CATEGORY1_LABEL,
+    PURPOSE_LABEL,
+)
+from .artifacts import save_text
+from .flow import FrameResolver
+from .waits import AsyncWaiter, JS_SELECTED_LABEL, JS_YOBI_CHANGED, JS_YOBI_VALUE
+
+
+# ===== helpers =====
+async def sleep_rand(ms_min: int, ms_max: int):
+    await asyncio.sleep(random.uniform(ms_min / 1000, ms_max / 1000))
+
+
+async def _visible(loc) -> bool:
+    try:
+        return await loc.count() > 0 and await loc.is_visible()
+    except Exception:
+        return False
+
+
+# ===== navigation primitives =====
+async def goto_menu(page: Page, waiter: Optional[AsyncWaiter] = None):
+    """開始URLへダイレクト遷移。"""
+    w = waiter or AsyncWaiter()
+    await page.goto(URL_GIN_MENU, wait_until="domcontentloaded", timeout=w.timeout())
+
+
+async def click_multifunc(page: Page, waiter: Optional[AsyncWaiter] = None):
+    """1枚目 gin_menu にいるときだけ『多機能操作』を押す（flow.click_multifunc と同じ）。"""
+    w = waiter or AsyncWaiter()
+    if "gin_menu" not in (page.url or ""):
+        return
+
+    candidates = [
+        "a:has(img[alt='多機能操作'])",
+        "input[type='image'][alt='多機能操作']",
+        "img[alt='多機能操作']",
+        "button:has-text('多機能操作')",
+        "a:has-text('多機能操作')",
+    ]
+    for sel in candidates:
+        try:
+            loc = page.locator(sel).first
+            if await _visible(loc):
+                await w.navigation("multifunc", page, lambda: loc.click(timeout=w.timeout()))
+                return
+        except Exception:
+            pass
+
+    # フォールバック（従来セレクタ）
+    await w.navigation("multifunc", page,
+                       lambda: page.locator(MULTIFUNC_SELECTOR).first.click(timeout=w.timeout()))
+
+
+async def right_frame(page: Page):
+    """右フレーム（検索フォーム/検索結果）を中身で特定して返す（flow.right_frame と同じ）。"""
+    form_sel = f"{SEARCH_BTN_SELECTOR}, select, input[type='checkbox'], text=予約状況, text=複数日表示"
+    for sel in (form_sel, NEXT_BTN_SELECTOR):
+        for f in page.frames:
+            if f is page.main_frame:
+                continue
+            try:
+                if await f.locator(sel).first.is_visible(timeout=500):
+                    return f
+            except Exception:
+                pass
+    return page.main_frame
+
+
+class AsyncFrameResolver(FrameResolver):
+    """ flow.FrameResolver の async 版（覚え方・集計は共通。外れたときの探索だけ await） """
+
+    async def __call__(self, page: Page):
+        t0 = time.perf_counter()
+        f = self._cached(page)
+        if f is not None:
+            self._count(True, t0)
+            return f
+        f = await right_frame(page)
+        self._remember(page, f)
+        self._count(False, t0)
+        return f
+
+
+_AVAIL_LINK_SELECTORS = (
+    "a[href*='gml_z_group_sel_1']",
+    "a:has-text('空き状況の確認')",
+    "text=空き状況の確認",
+)
+
+
+async def _find_avail_link(page: Page):
+    for sel in _AVAIL_LINK_SELECTORS:
+        for f in page.frames:
+            loc = f.locator(sel).first
+            if await _visible(loc):
+                return loc
+    return None
+
+
+async def _has_search_form(page: Page) -> bool:
+    for f in page.frames:
+        if f is page.main_frame:
+            continue
+        try:
+            if await f.locator("select").count() > 0:
+                return True
+        except Exception:
+            pass
+    return False
+
+
+async def go_to_availability_menu(page: Page, waiter: Optional[AsyncWaiter] = None) -> bool:
+    """左メニュー『空き状況の確認』をクリックして検索フォーム側へ遷移。見つかれば True。"""
+    w = waiter or AsyncWaiter()
+    found = {}
+
+    async def _link_ready():
+        found["loc"] = await _find_avail_link(page)
+        return found["loc"] is not None
+
+    if not await w.until("left_menu", _link_ready):
+        return False
+    await found["loc"].click(timeout=w.timeout())
+    await w.until("search_form", lambda: _has_search_form(page))
+    return True
+
+
+# ===== form handling =====
+async def _click_nearby_confirm(container_locator, timeout_ms: int = STEP_TIMEOUT_SEC * 1000):
+    btn = container_locator.locator(
+        "button:has-text('確定・全検索'), "
+        "input[type='submit'][value*='確定・全検索'], "
+        "input[type='button'][value*='確定・全検索']"
+    ).first
+    if await btn.count() == 0:
+        btn = container_locator.locator(
+            "button:has-text('確定'), "
+            "input[type='submit'][value*='確定'], "
+            "input[type='button'][value*='確定'], "
+            "img[alt='確定']"
+        ).first
+    await btn.click(timeout=timeout_ms)
+
+
+async def prepare_form(f, run_dir: Path, logger, category: str = CATEGORY1_LABEL, purpose: str = PURPOSE_LABEL,
+                       waiter: Optional[AsyncWaiter] = None):
+    """検索フォームの初期化（分類1 → 目的 → 曜日 日・土・祝）。flow.prepare_form と同じ手順。"""
+    w = waiter or AsyncWaiter(logger)
+    has_form = await w.until("form_ready", lambda: f.locator(
+        "select, input, button, img[alt='検索'], text=予約状況, text=複数日表示"
+    ).first.is_visible(), timeout_ms=1000)
+    if not has_form:
+        for ff in f.page.frames:
+            try:
+                if await ff.locator(
+                    "text=屋内スポーツ施設, text=文化施設, text=バレーボール, text=予約状況, text=複数日表示"
+                ).first.is_visible():
+                    f = ff
+                    break
+            except Exception:
+                pass
+
+    for label, what, step in ((category, "分類1", "category"), (purpose, "目的", "purpose")):
+        try:
+            sel = f.locator(f"select:has(option:has-text('{label}'))").first
+            await sel.select_option(label=label)
+            container = sel.locator("xpath=ancestor::*[self::form or self::table or self::div][1]")
+            await w.confirm(f"confirm_{step}", f, lambda: _click_nearby_confirm(container, w.timeout()),
+                            JS_SELECTED_LABEL, arg=label)
+        except Exception as e:
+            logger(f"[warn] {what} '{label}' の選択に失敗: {e}")
+
+    try:
+        chkboxes = f.locator("form[name='formDate'] input[name='chkbox']")
+        count = await chkboxes.count()
+        before = await f.evaluate(JS_YOBI_VALUE) if count else None
+        changed = False
+        for idx in [0, 6, 7]:  # 日・土・祝
+            if count > idx:
+                cb = chkboxes.nth(idx)
+                if await cb.is_visible() and not await cb.is_checked():
+                    await cb.check()
+                    changed = True
+        if changed and before is not None:
+            await w.js("u_yobi", f, JS_YOBI_CHANGED, arg=before)  # hidden の u_yobi 更新待ち
+    except Exception as e:
+        logger(f"[warn] 曜日チェック(日・土・祝)に失敗: {e}")
+
+    html = await f.content()
+    save_text(run_dir / "availability-form.html", html)
+
+
+async def submit_search(f, logger, waiter: Optional[AsyncWaiter] = None):
+    """検索ボタンを押す（フレーム内）。見えなければ諦める。押したら結果ページへの遷移完了まで待つ。"""
+    w = waiter or AsyncWaiter(logger)
+    btn = f.locator(SEARCH_BTN_SELECTOR).first
+    try:
+        if not await btn.is_visible():
+            logger("[warn] 検索ボタンが見えないためスキップ")
+            return
+    except Exception:
+        logger("[warn] 検索ボタンの可視チェックに失敗（スキップ）")
+        return
+    try:
+        await w.navigation("search", f, lambda: btn.click(timeout=w.timeout(1000)))
+    except Exception as e:
+        logger(f"[warn] 検索ボタンのクリック失敗: {e}")
+
+
+# ===== paging =====
+async def next_page(f) -> bool:
+    """『次へ』が見えて押せるときだけクリックして True（flow.next_page と同じ判定）。"""
+    btn = f.locator(NEXT_BTN_SELECTOR).first
+    try:
+        if await btn.count() == 0:
+            return False
+        if not await btn.is_visible(timeout=200):
+            return False
+        if not await btn.is_enabled():
+            return False
+    except Exception:
+        return False
+    try:
+        await btn.click(timeout=500)
+        return True
+    except Exception:
+        return False
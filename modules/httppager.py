@@ -0,0 +1,301 @@
+# modules/httppager.py — 2ページ目以降を HTTP で直接取得する高速ページャ
+#
+#   1) 1→2ページ目だけはブラウザで『次へ』を押し、そのとき飛んだリクエストを記録する
+#   2) 記録したリクエストと1ページ目のフォーム値の差分（JS が書き換えた項目）を学習する
+#   3) 以降は「直前ページのフォーム値 + 学習した差分」を、ブラウザの Cookie 付きで
+#      keep-alive の HTTP 接続へ送って結果ページを取得する
+#   4) 応答が結果ページとして読めなければ None を返し、呼び出し側が DOM クリックに戻す
+from __future__ import annotations
+import http.client
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit
+
+from .const import USER_AGENT, STEP_TIMEOUT_SEC, ERROR_PAGE_TEXTS
+
+_CHARSET_RE = re.compile(r'charset=["\']?([\w\-]+)', re.I)
+_NEXT_RE = re.compile(r'>\s*次へ\s*<|value="次へ"')
+
+Fields = List[Tuple[str, str]]
+
+
+# ===== keep-alive クライアント =====
+class KeepAliveClient:
+    """ (scheme, host, port) ごとに http.client の接続を1本持ち回す最小のプール """
+
+    def __init__(self, timeout: float = STEP_TIMEOUT_SEC):
+        self.timeout = timeout
+        self._conns: Dict[Tuple[str, str, int], http.client.HTTPConnection] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.reconnects = 0
+
+    def _conn(self, scheme: str, host: str, port: int) -> http.client.HTTPConnection:
+        key = (scheme, host, port)
+        conn = self._conns.get(key)
+        if conn is None:
+            cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            conn = cls(host, port, timeout=self.timeout)
+            self._conns[key] = conn
+        return conn
+
+    def request(self, method: str, url: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None) -> Tuple[int, http.client.HTTPMessage, bytes]:
+        u = urlsplit(url)
+        port = u.port or (443 if u.scheme == "https" else 80)
+        path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+        with self._lock:
+            for retry in (False, True):
+                conn = self._conn(u.scheme, u.hostname or "", port)
+                try:
+                    conn.request(method, path, body=body, headers=headers or {})
+                    resp = conn.getresponse()
+                    data = resp.read()
+                    self.requests += 1
+                    if resp.getheader("connection", "").lower() == "close":
+                        self._drop(u.scheme, u.hostname or "", port)
+                    return resp.status, resp.msg, data
+                except (http.client.HTTPException, OSError):
+                    # サーバ側で keep-alive が切れていたら1回だけ張り直す
+                    self._drop(u.scheme, u.hostname or "", port)
+                    if retry:
+                        raise
+                    self.reconnects += 1
+        raise RuntimeError("unreachable")
+
+    def _drop(self, scheme: str, host: str, port: int):
+        conn = self._conns.pop((scheme, host, port), None)
+        if conn is not None:
+            conn.close()
+
+    def close(self):
+        with self._lock:
+            for conn in self._conns.values():
+                conn.close()
+            self._conns.clear()
+
+
+# ===== フォーム解析 =====
+def page_forms(html: str, base_url: str) -> List[Tuple[str, str, Fields]]:
+    """ HTML 内の <form> を (絶対 action URL, METHOD, 送信される値) で列挙 """
+    from lxml import etree, html as lxml_html
+    try:
+        doc = lxml_html.document_fromstring(html)
+    except (etree.ParserError, ValueError):
+        return []
+    out = []
+    for form in doc.forms:
+        action = urljoin(base_url, form.get("action") or base_url)
+        method = (form.get("method") or "GET").upper()
+        out.append((action, method, [(k, v or "") for k, v in form.form_values()]))
+    return out
+
+
+def looks_like_result_page(html: str) -> bool:
+    """ 結果ページとして読めるか（日付がありエラー画面でない） """
+    from .scraper import _pick_iso_date
+    if any(t in html for t in ERROR_PAGE_TEXTS):
+        return False
+    return bool(_pick_iso_date(html))
+
+
+def has_next(html: str) -> bool:
+    return bool(_NEXT_RE.search(html))
+
+
+def _same_endpoint(a: str, b: str) -> bool:
+    ua, ub = urlsplit(a), urlsplit(b)
+    return (ua.scheme, ua.netloc, ua.path) == (ub.scheme, ub.netloc, ub.path)
+
+
+def py_charset(name: str) -> str:
+    """ ブラウザと同じ解釈に寄せる：Shift_JIS 宣言は実際には cp932（～ 等が化けないように） """
+    n = (name or "").lower().replace("_", "-")
+    if n in ("shift-jis", "sjis", "x-sjis", "ms-kanji", "windows-31j"):
+        return "cp932"
+    return name or "utf-8"
+
+
+def _decode(data: bytes, content_type: str, fallback: str) -> Tuple[str, str]:
+    m = _CHARSET_RE.search(content_type or "")
+    if not m:
+        m = _CHARSET_RE.search(data[:2048].decode("ascii", "ignore"))
+    charset = py_charset(m.group(1) if m else fallback)
+    try:
+        return data.decode(charset, errors="replace"), charset
+    except LookupError:
+        return data.decode(fallback, errors="replace"), fallback
+
+
+# ===== ページャ本体 =====
+class HttpPager:
+    """
+    学習済みの『次へ』リクエストを HTTP で再現する。
+    fetch_next(html, url) は次ページの (HTML, URL) を返し、続きがない/読めないときは None。
+    """
+
+    def __init__(self, action: str, method: str, keep: List[str],
+                 overrides: Dict[str, str], increments: Dict[str, int],
+                 cookies: Dict[str, str], charset: str, client: Optional[KeepAliveClient] = None):
+        self.action = action
+        self.method = method
+        self.keep = keep                  # 実際に送られていた項目名（順序つき）
+        self.overrides = overrides        # JS 等で固定値に書き換えられた項目
+        self.increments = increments      # 数値で +n された項目（ページ番号など）
+        self.cookies = cookies
+        self.rotated: Dict[str, dict] = {}  # 応答の Set-Cookie で更新された分（context.add_cookies の形）
+        self.charset = py_charset(charset)
+        self.client = client or KeepAliveClient()
+        self.fetched = 0
+        self.last_error = ""
+
+    # ---- 学習 ----
+    @classmethod
+    def learn(cls, page_html: str, page_url: str, request, cookies: List[dict],
+              charset: str = "utf-8") -> Optional["HttpPager"]:
+        """
+        page_html : 『次へ』を押す前のページ（1ページ目）の HTML
+        request   : 『次へ』で発生した playwright の Request（ナビゲーション）
+        cookies   : context.cookies() の結果
+        """
+        charset = py_charset(charset)
+        if request.method == "POST":
+            sent = parse_qsl(request.post_data or "", keep_blank_values=True, encoding=charset)
+            action = request.url
+        else:
+            sent = parse_qsl(urlsplit(request.url).query, keep_blank_values=True, encoding=charset)
+            action = request.url.split("?", 1)[0]
+
+        forms = [fm for fm in page_forms(page_html, page_url) if _same_endpoint(fm[0], action)]
+        if not forms:
+            return None
+        base = dict(forms[0][2])
+
+        overrides: Dict[str, str] = {}
+        increments: Dict[str, int] = {}
+        for k, v in sent:
+            old = base.get(k)
+            if old == v:
+                continue
+            if old is not None and old.isdigit() and v.isdigit():
+                increments[k] = int(v) - int(old)
+            else:
+                overrides[k] = v
+        keep = [k for k, _ in sent]
+        jar = {c["name"]: c["value"] for c in cookies if _cookie_matches(c, action)}
+        return cls(action, request.method, keep, overrides, increments, jar, charset)
+
+    # ---- 取得 ----
+    def _fields_from(self, html: str, url: str) -> Optional[Fields]:
+        forms = [fm for fm in page_forms(html, url) if _same_endpoint(fm[0], self.action)]
+        if not forms:
+            return None
+        current = dict(forms[0][2])
+        out: Fields = []
+        for k in self.keep:
+            if k in self.overrides:
+                v = self.overrides[k]
+            elif k in self.increments and current.get(k, "").isdigit():
+                v = str(int(current[k]) + self.increments[k])
+            else:
+                v = current.get(k, "")
+            out.append((k, v))
+        return out
+
+    def fetch_next(self, html: str, url: str) -> Optional[Tuple[str, str]]:
+        if not has_next(html):
+            return None
+        fields = self._fields_from(html, url)
+        if fields is None:
+            self.last_error = "form not found"
+            return None
+
+        body = urlencode(fields, encoding=self.charset, errors="replace")
+        headers = {
+            "User-Agent": USER_AGENT,
+            "Referer": url,
+            "Cookie": "; ".join(f"{k}={v}" for k, v in self.cookies.items()),
+        }
+        method, target = self.method, self.action
+        if method == "POST":
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            payload: Optional[bytes] = body.encode("ascii")
+        else:
+            target = f"{self.action}?{body}"
+            payload = None
+
+        try:
+            for _ in range(3):  # リダイレクトは数回まで追う
+                status, msg, data = self.client.request(method, target, payload, headers)
+                self._absorb_cookies(msg, target)
+                if status in (301, 302, 303, 307, 308) and msg.get("location"):
+                    target = urljoin(target, msg["location"])
+                    if status in (301, 302, 303):
+                        method, payload = "GET", None
+                        headers.pop("Content-Type", None)
+                    continue
+                break
+        except Exception as e:
+            self.last_error = f"http error: {e}"
+            return None
+
+        if status != 200:
+            self.last_error = f"http status {status}"
+            return None
+        text, _ = _decode(data, msg.get("content-type", ""), self.charset)
+        if not looks_like_result_page(text):
+            self.last_error = "response is not a result page"
+            return None
+        self.fetched += 1
+        return text, target
+
+    def _absorb_cookies(self, msg, url: str):
+        for raw in msg.get_all("set-cookie") or []:
+            c = _parse_set_cookie(raw, url)
+            if c is None:
+                continue
+            self.cookies[c["name"]] = c["value"]
+            self.rotated[c["name"]] = c
+
+    def push_cookies(self, context) -> int:
+        """ HTTP 側で更新された Cookie をブラウザへ戻す（DOM 巡回に戻る前に呼ぶ）。戻した数 """
+        if not self.rotated:
+            return 0
+        context.add_cookies(list(self.rotated.values()))
+        return len(self.rotated)
+
+    def close(self):
+        self.client.close()
+
+
+def _cookie_matches(c: dict, url: str) -> bool:
+    """ ブラウザがこの URL へ送る Cookie か（domain・path・secure） """
+    u = urlsplit(url)
+    host = u.hostname or ""
+    domain = (c.get("domain") or "").lstrip(".")
+    if domain and not (host == domain or host.endswith("." + domain)):
+        return False
+    if c.get("secure") and u.scheme != "https":
+        return False
+    cpath = c.get("path") or "/"
+    path = u.path or "/"
+    return path == cpath or path.startswith(cpath if cpath.endswith("/") else cpath + "/")
+
+
+def _parse_set_cookie(raw: str, url: str) -> Optional[dict]:
+    """ Set-Cookie 1行を context.add_cookies に渡せる形へ（Domain/Path がなければ URL から補う） """
+    parts = [p.strip() for p in raw.split(";")]
+    name, sep, value = parts[0].partition("=")
+    if not sep or not name.strip():
+        return None
+    u = urlsplit(url)
+    attrs = {}
+    for p in parts[1:]:
+        k, _, v = p.partition("=")
+        attrs[k.strip().lower()] = v.strip()
+    path = attrs.get("path") or ""
+    if not path.startswith("/"):
+        path = (u.path or "/").rsplit("/", 1)[0] or "/"  # 既定は要求パスのディレクトリ
+    return {"name": name.strip(), "value": value, "domain": attrs.get("domain") or (u.hostname or ""),
+            "path": path, "secure": "secure" in attrs, "httpOnly": "httponly" in attrs}
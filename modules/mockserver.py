@@ -0,0 +1,312 @@
+# modules/mockserver.py — stagia 予約システムの流れを再現するローカルの代役サーバ
+#   python -m modules.mockserver --port 8765 --pages 20 --facilities 30 --latency-ms 80
+#   GIN_MENU_URL=http://127.0.0.1:8765/stagia/reserve/gin_menu python main.py --dry-run
+#
+# 画面の流れ（本番と同じ URL 名・要素）：
+#   gin_menu（img[alt=多機能操作]）→ gml_init（frameset：左メニュー／右フレーム）
+#   → 左『空き状況の確認』→ 右 gml_z_group_sel_1（分類1→確定 / 目的→確定・全検索 / formDate 曜日）
+#   → 検索 → gml_z_result（結果表＋『次へ』フォーム、selectdate/page を hidden で持ち回り）
+from __future__ import annotations
+import argparse
+import random
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from .bench import synth_result_page
+
+BASE = "/stagia/reserve"
+CATEGORIES = ("屋内スポーツ施設", "屋外スポーツ施設", "文化施設")
+PURPOSES = ("バレーボール", "バスケットボール", "卓球", "合唱", "会議")
+FIRST_DAY = date(2025, 10, 1)  # 結果1ページ目の日付（検索の selectdate の既定）
+
+
+@dataclass
+class MockConfig:
+    pages: int = 10             # 結果ページ数（1ページ = 1日）
+    facilities: int = 20        # 1ページあたりの施設数
+    cols: int = 6               # 時間帯の列数
+    latency_ms: int = 0         # 応答ごとの遅延
+    jitter_ms: int = 0          # 遅延の揺らぎ（±）
+    error_rate: float = 0.0     # 結果ページでエラー画面を返す確率
+    seed: int = 0
+    charset: str = "cp932"      # 本番同様 Shift_JIS 系で返す（宣言は Shift_JIS）
+
+
+_PAGE_HEAD = ('<html><head><meta http-equiv="Content-Type" content="text/html; charset=Shift_JIS">'
+              '<title>{title}</title></head><body>')
+
+
+def _page(title: str, body: str) -> str:
+    return _PAGE_HEAD.format(title=title) + body + "</body></html>"
+
+
+def _error_page() -> str:
+    return _page("エラー", "<p>エラーが発生しました。</p><a href=\"gin_menu\" target=\"_top\">TOPへ</a>")
+
+
+def _denied_page() -> str:
+    return _page("エラー", "<p>アクセス権限がありません。</p><a href=\"gin_menu\" target=\"_top\">TOPへ</a>")
+
+
+def _options(items, selected: str) -> str:
+    return "".join(
+        f"<option value=\"{v}\"{' selected' if v == selected else ''}>{v}</option>" for v in ("",) + tuple(items)
+    )
+
+
+def _form_page(sess: dict) -> str:
+    cat, purpose = sess.get("category", ""), sess.get("purpose", "")
+    yobi = sess.get("u_yobi", "00000000")
+    days = "日月火水木金土祝"
+    checks = "".join(
+        f"<label><input type=\"checkbox\" name=\"chkbox\" value=\"{i}\" onclick=\"updYobi()\""
+        f"{' checked' if yobi[i] == '1' else ''}>{d}</label>"
+        for i, d in enumerate(days)
+    )
+    body = f"""
+<h2>予約状況の確認</h2>
+<form name="formCat" method="post" action="gml_z_group_sel_1">
+  <table class="cond"><tr><th>分類1</th><td>
+    <select name="bunrui1">{_options(CATEGORIES, cat)}</select>
+    <input type="submit" name="kakutei1" value="確 定">
+  </td></tr></table>
+  <table class="cond"><tr><th>目的</th><td>
+    <select name="mokuteki">{_options(PURPOSES, purpose)}</select>
+    <input type="submit" name="kakutei2" value="確定・全検索">
+  </td></tr></table>
+</form>
+<form name="formDate" method="post" action="gml_z_result">
+  <div>{checks}</div>
+  <input type="hidden" name="u_yobi" value="{yobi}">
+  <input type="hidden" name="selectdate" value="{FIRST_DAY:%Y%m%d}">
+  <input type="hidden" name="page" value="1">
+  <p><span>複数日表示</span> <input type="submit" name="search" value="検索"></p>
+</form>
+<script>
+function updYobi() {{
+  var cs = document.formDate.chkbox, v = "";
+  for (var i = 0; i < cs.length; i++) v += cs[i].checked ? "1" : "0";
+  document.formDate.u_yobi.value = v;
+}}
+</script>"""
+    return _page("空き状況の確認", body)
+
+
+def _page_of(selectdate: str) -> int:
+    """ 'YYYYMMDD' の日付が何ページ目か（読めなければ1） """
+    try:
+        return (date(int(selectdate[0:4]), int(selectdate[4:6]), int(selectdate[6:8])) - FIRST_DAY).days + 1
+    except ValueError:
+        return 1
+
+
+def _result_page(cfg: MockConfig, page: int) -> str:
+    dt = FIRST_DAY + timedelta(days=page - 1)
+    last = page >= cfg.pages
+    next_btn = "" if last else (
+        "<input type=\"button\" value=\"次へ\" "
+        "onclick=\"document.formNext.nav.value='next';document.formNext.submit();\">"
+    )
+    form = (
+        "<h2>予約状況</h2>"
+        "<form name=\"formNext\" method=\"post\" action=\"gml_z_result\">"
+        f"<input type=\"hidden\" name=\"selectdate\" value=\"{dt:%Y%m%d}\">"
+        f"<input type=\"hidden\" name=\"page\" value=\"{page}\">"
+        "<input type=\"hidden\" name=\"nav\" value=\"\">"
+        f"{next_btn}</form>"
+    )
+    return synth_result_page(page, cfg.facilities, cfg.cols, seed=cfg.seed, form_html=form, charset="Shift_JIS")
+
+
+class MockState:
+    """ サーバ全体の状態（セッションと統計）。ハンドラから共有される """
+
+    def __init__(self, cfg: MockConfig):
+        self.cfg = cfg
+        self.sessions: Dict[str, dict] = {}
+        self.lock = threading.Lock()
+        self.rnd = random.Random(cfg.seed)
+        self.stats = {"requests": 0, "result_pages": 0, "errors_injected": 0}
+
+    def count(self, key: str):
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def maybe_error(self) -> bool:
+        with self.lock:
+            hit = self.rnd.random() < self.cfg.error_rate
+            if hit:
+                self.stats["errors_injected"] += 1
+        return hit
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    server: "MockServer"
+
+    def log_message(self, *args):
+        pass
+
+    # ---- 共通 ----
+    def _session(self) -> Tuple[str, dict, bool]:
+        raw = self.headers.get("Cookie", "")
+        sid = dict(p.strip().split("=", 1) for p in raw.split(";") if "=" in p).get("JSESSIONID", "")
+        st = self.server.state
+        with st.lock:
+            if sid in st.sessions:
+                return sid, st.sessions[sid], False
+            sid = secrets.token_hex(8)
+            st.sessions[sid] = {}
+            return sid, st.sessions[sid], True
+
+    def _send(self, html: str, status: int = 200, cookie: Optional[str] = None,
+              ctype: str = "text/html; charset=Shift_JIS"):
+        cfg = self.server.state.cfg
+        if cfg.latency_ms or cfg.jitter_ms:
+            jitter = random.uniform(-cfg.jitter_ms, cfg.jitter_ms) if cfg.jitter_ms else 0
+            time.sleep(max(0.0, cfg.latency_ms + jitter) / 1000)
+        data = html.encode(cfg.charset, errors="replace")
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        if cookie:
+            self.send_header("Set-Cookie", f"JSESSIONID={cookie}; Path=/")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _form(self) -> Dict[str, str]:
+        n = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(n).decode("ascii", "replace") if n else ""
+        if not raw:
+            raw = urlsplit(self.path).query
+        pairs = parse_qsl(raw, keep_blank_values=True, encoding=self.server.state.cfg.charset)
+        out: Dict[str, str] = {}
+        for k, v in pairs:
+            out[k] = v if k not in out else out[k] + "," + v
+        return out
+
+    # ---- ルーティング ----
+    def do_GET(self):
+        self._route(self._form() if "?" in self.path else {})
+
+    def do_POST(self):
+        self._route(self._form())
+
+    def _route(self, form: Dict[str, str]):
+        st = self.server.state
+        st.count("requests")
+        path = urlsplit(self.path).path
+        sid, sess, new = self._session()
+        cookie = sid if new else None
+
+        if path.startswith("/img/"):
+            self._send("GIF89a", ctype="image/gif")
+        elif path == f"{BASE}/gin_menu":
+            sess.clear()
+            self._send(_page("施設予約", (
+                "<h1>練馬区施設予約システム（mock）</h1>"
+                "<a href=\"gml_init\"><img src=\"/img/multi.gif\" alt=\"多機能操作\" width=\"120\" height=\"40\"></a>"
+            )), cookie=cookie)
+        elif path == f"{BASE}/gml_init":
+            sess["init"] = True
+            self._send(
+                "<html><head><meta http-equiv=\"Content-Type\" content=\"text/html; charset=Shift_JIS\"></head>"
+                "<frameset cols=\"220,*\"><frame name=\"left\" src=\"gml_left\">"
+                "<frame name=\"right\" src=\"gml_blank\"></frameset></html>", cookie=cookie)
+        elif path == f"{BASE}/gml_left":
+            self._send(_page("メニュー", (
+                "<ul><li><a href=\"gml_z_group_sel_1\" target=\"right\">空き状況の確認</a></li>"
+                "<li><a href=\"gin_menu\" target=\"_top\">TOPへ</a></li></ul>"
+            )), cookie=cookie)
+        elif path == f"{BASE}/gml_blank":
+            self._send(_page("案内", "<p>左のメニューから選択してください。</p>"), cookie=cookie)
+        elif path == f"{BASE}/gml_z_group_sel_1":
+            if not sess.get("init"):
+                self._send(_denied_page(), cookie=cookie)
+                return
+            if "bunrui1" in form and "kakutei1" in form:
+                sess["category"] = form["bunrui1"]
+            if "mokuteki" in form and "kakutei2" in form:
+                sess["category"] = form.get("bunrui1", sess.get("category", ""))
+                sess["purpose"] = form["mokuteki"]
+            self._send(_form_page(sess), cookie=cookie)
+        elif path == f"{BASE}/gml_z_result":
+            if not (sess.get("init") and sess.get("purpose")):
+                self._send(_denied_page(), cookie=cookie)
+                return
+            if st.maybe_error():
+                self._send(_error_page(), cookie=cookie)
+                return
+            page = int(form.get("page") or 1)
+            if form.get("nav") == "next":
+                page += 1
+            elif form.get("selectdate"):
+                page = _page_of(form["selectdate"])  # 検索：開始日（日付ウィンドウ）から
+            page = max(1, min(page, st.cfg.pages))
+            st.count("result_pages")
+            self._send(_result_page(st.cfg, page), cookie=cookie)
+        else:
+            self._send(_page("Not Found", "<p>not found</p>"), status=404, cookie=cookie)
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, cfg: MockConfig):
+        super().__init__(addr, _Handler)
+        self.state = MockState(cfg)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def gin_menu_url(self) -> str:
+        return f"{self.base_url}{BASE}/gin_menu"
+
+
+def start_mock_server(cfg: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0) -> MockServer:
+    """ 別スレッドで起動して返す（port=0 なら空きポート）。終了は server.shutdown() """
+    srv = MockServer((host, port), cfg or MockConfig())
+    threading.Thread(target=srv.serve_forever, name="mockserver", daemon=True).start()
+    return srv
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m modules.mockserver")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--pages", type=int, default=10)
+    ap.add_argument("--facilities", type=int, default=20)
+    ap.add_argument("--cols", type=int, default=6)
+    ap.add_argument("--latency-ms", type=int, default=0)
+    ap.add_argument("--jitter-ms", type=int, default=0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    cfg = MockConfig(pages=args.pages, facilities=args.facilities, cols=args.cols,
+                     latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                     error_rate=args.error_rate, seed=args.seed)
+    srv = MockServer((args.host, args.port), cfg)
+    print(f"[mock] {srv.gin_menu_url}  pages={cfg.pages} facilities={cfg.facilities} "
+          f"latency={cfg.latency_ms}ms error_rate={cfg.error_rate}")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"[mock] stats: {srv.state.stats}")
+        srv.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
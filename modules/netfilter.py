@@ -0,0 +1,127 @@
+# modules/netfilter.py — 巡回コンテキストの不要リソース遮断と通信量カウンタ
+#
+# 使うのはメニュー・フォーム・結果フレームの DOM だけなので、画像/フォント等は context.route で中止する。
+# セレクタは img[alt='多機能操作'] / img[alt='O'] のように alt 属性で当てているため、
+# 画像本体を読まなくても要素はそのまま DOM に残り、クリック・抽出に影響しない。
+from __future__ import annotations
+import fnmatch
+import threading
+from typing import Dict, Iterable, Optional
+
+from .const import (
+    NETWORK_ENABLED, BLOCK_RESOURCE_TYPES, BLOCK_URL_PATTERNS, ALLOW_URL_PATTERNS,
+)
+
+
+def _match(url: str, patterns) -> Optional[str]:
+    """ パターン（'*' を含めば glob、なければ部分一致）に当たれば当たったパターンを返す """
+    for p in patterns:
+        if ("*" in p and fnmatch.fnmatch(url, p)) or ("*" not in p and p in url):
+            return p
+    return None
+
+
+class NetworkFilter:
+    """ 1つの BrowserContext に route を張り、遮断/取得の件数とバイト数を数える """
+
+    def __init__(self, resource_types: Iterable[str] = (), url_patterns: Iterable[str] = (),
+                 allow_patterns: Iterable[str] = ()):
+        self.resource_types = frozenset(resource_types)
+        self.url_patterns = tuple(url_patterns)
+        self.allow_patterns = tuple(allow_patterns)
+        self._lock = threading.Lock()
+        self.blocked: Dict[str, int] = {}      # resource_type → 件数
+        self.blocked_patterns: Dict[str, int] = {}
+        self.fetched: Dict[str, int] = {}      # resource_type → 件数
+        self.fetched_bytes: Dict[str, int] = {}
+
+    @classmethod
+    def from_config(cls) -> Optional["NetworkFilter"]:
+        if not NETWORK_ENABLED:
+            return None
+        return cls(BLOCK_RESOURCE_TYPES, BLOCK_URL_PATTERNS, ALLOW_URL_PATTERNS)
+
+    # ---- 判定 ----
+    def _verdict(self, url: str, rtype: str) -> Optional[str]:
+        """ 遮断するなら理由（"type:image" / "url:<pattern>"）、通すなら None """
+        if self.allow_patterns and _match(url, self.allow_patterns):
+            return None
+        if rtype in self.resource_types:
+            return f"type:{rtype}"
+        p = _match(url, self.url_patterns)
+        return f"url:{p}" if p else None
+
+    def _count_blocked(self, rtype: str, reason: str):
+        with self._lock:
+            self.blocked[rtype] = self.blocked.get(rtype, 0) + 1
+            if reason.startswith("url:"):
+                self.blocked_patterns[reason[4:]] = self.blocked_patterns.get(reason[4:], 0) + 1
+
+    def _on_response(self, response):
+        # バイト数は Content-Length（追加の往復なしで取れる範囲）。chunked は 0 扱い
+        try:
+            rtype = response.request.resource_type
+            size = int(response.headers.get("content-length") or 0)
+        except Exception:
+            return
+        with self._lock:
+            self.fetched[rtype] = self.fetched.get(rtype, 0) + 1
+            self.fetched_bytes[rtype] = self.fetched_bytes.get(rtype, 0) + size
+
+    # ---- 取り付け ----
+    def install(self, ctx):
+        """ sync API のコンテキストへ """
+        def handle(route):
+            req = route.request
+            reason = self._verdict(req.url, req.resource_type)
+            if reason:
+                self._count_blocked(req.resource_type, reason)
+                route.abort("blockedbyclient")
+            else:
+                route.continue_()
+
+        if self.resource_types or self.url_patterns:
+            ctx.route("**/*", handle)
+        ctx.on("response", self._on_response)
+
+    async def install_async(self, ctx):
+        """ async API のコンテキストへ """
+        async def handle(route):
+            req = route.request
+            reason = self._verdict(req.url, req.resource_type)
+            if reason:
+                self._count_blocked(req.resource_type, reason)
+                await route.abort("blockedbyclient")
+            else:
+                await route.continue_()
+
+        if self.resource_types or self.url_patterns:
+            await ctx.route("**/*", handle)
+        ctx.on("response", self._on_response)
+
+    # ---- 集計 ----
+    def reset(self):
+        """ 使い回すコンテキストで、回ごとに数え直すとき """
+        with self._lock:
+            self.blocked.clear()
+            self.blocked_patterns.clear()
+            self.fetched.clear()
+            self.fetched_bytes.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "blocked": sum(self.blocked.values()),
+                "fetched": sum(self.fetched.values()),
+                "fetched_bytes": sum(self.fetched_bytes.values()),
+                "blocked_by_type": dict(self.blocked),
+                "blocked_by_pattern": dict(self.blocked_patterns),
+                "fetched_by_type": {
+                    t: {"n": n, "bytes": self.fetched_bytes.get(t, 0)} for t, n in self.fetched.items()
+                },
+            }
+
+    def summary(self) -> str:
+        s = self.stats()
+        return (f"[net] blocked={s['blocked']} fetched={s['fetched']} "
+                f"({s['fetched_bytes'] / 1024:.1f} KiB) blocked_by_type={s['blocked_by_type']}")
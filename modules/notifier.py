@@ -5,7 +5,12 @@ from email.mime.text import MIMEText
 
 # ※ ここでは load_dotenv() を呼ばない
 
-def send_mail(records, dry_run=True):
+def send_mail(records, dry_run=True, kind="", alerted=0):
+    """
+    records : utils.Slot のリスト
+    kind    : 件名の頭に付ける区分（"速報" / "まとめ"。空なら従来どおり）
+    alerted : 速報で知らせ済みのため records から除いた件数（まとめの本文に添える）
+    """
     host = os.getenv("SMTP_HOST")
     port = int(os.getenv("SMTP_PORT", "587") or "587")
     user = os.getenv("SMTP_USER")
@@ -14,19 +19,25 @@ def send_mail(records, dry_run=True):
     mail_to = os.getenv("MAIL_TO", "")
     subject_prefix = os.getenv("SUBJECT_PREFIX", "")
 
-    if not (host and port and mail_to):
-        raise RuntimeError("SMTP env not set properly")
-
-    subject = f"{subject_prefix} 新規{len(records)}件" if subject_prefix else f"新規{len(records)}件"
+    subject = f"新規{len(records)}件"
+    if kind:
+        subject = f"[{kind}] {subject}"
+    if subject_prefix:
+        subject = f"{subject_prefix} {subject}"
     body = "新規で空きが見つかりました：\n\n" + "\n".join(
-        f"・{r['date_iso']} {r['time']} / {r['facility']}" for r in records
+        f"・{r.date_iso} {r.time} / {r.facility}" for r in records
     )
+    if alerted:
+        body += f"\n\n（ほかに速報済み {alerted}件）"
     body += "\n\n検索開始ページ: https://yoyaku.city.nerima.tokyo.jp/stagia/reserve/gin_menu\n"
 
     if dry_run:
         print("[mail] DRY-RUN\n", subject, "\n", body)
         return True
 
+    if not (host and port and mail_to):
+        raise RuntimeError("SMTP env not set properly")
+
     msg = MIMEText(body, _charset="utf-8")
     msg["Subject"] = subject
     msg["From"] = mail_from
@@ -46,4 +57,5 @@ if __name__ == "__main__":
         load_dotenv()
     except Exception:
         pass
-    send_mail([{"date_iso":"2025-10-04","time":"09:00–11:00","facility":"テスト"}], dry_run=True)
+    from modules.utils import Slot
+    send_mail([Slot.make("2025-10-04", "09:00", "11:00", "テスト")], dry_run=True)
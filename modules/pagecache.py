@@ -0,0 +1,131 @@
+# modules/pagecache.py — 前回と同じ結果ページは解析せずに前回の抽出結果を使う
+#
+# ページごとに「結果表の指紋」（日付 + <table>…</table> 部分を空白を詰めて sha1）を
+# data/page_cache.json に (target, ページ番号) をキーにして残し、次の実行で指紋が同じなら
+# 解析（parse_result_html）を飛ばして保存してあるレコードをそのまま返す。
+#   - 指紋に含めるのは解析結果を左右する部分だけ（表・日付・パーサ名）。<input>（hidden のトークンや
+#     ページ番号）や表の外のお知らせ等が変わっても同じページとみなす
+#   - 保存するのはこの実行で見たキーだけ（消えたページ・target は自然に落ちる）
+#   - 有効な cache がなければ parse_page は普通に解析するだけ（replay やライブラリ利用時）
+# スナップショットの保存はこれとは別（artifacts）。ここは解析を省くだけ。
+from __future__ import annotations
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .const import PAGE_CACHE, PARSER_BACKEND
+from .scraper import Record, _pick_iso_date, parse_result_html
+from .trace import span
+
+PAGE_CACHE_JSON = "page_cache.json"
+_active: Optional["PageCache"] = None  # 解析スレッドから見えるようにモジュール変数で持つ
+_VOLATILE = re.compile(r"<input\b[^>]*>", re.I)  # フォームの状態（解析には使わない。日付は別に入れる）
+
+
+def fingerprint(html: str, backend: Optional[str] = None) -> str:
+    """ 結果表の指紋。<h3>（日付見出し）/ 最初の <table> から最後の </table> までを <input> を除き空白を詰めてハッシュ """
+    starts = [i for i in (html.find("<h3"), html.find("<table")) if i >= 0]
+    end = html.rfind("</table>")
+    region = html[min(starts) if starts else 0:end + len("</table>") if end >= 0 else len(html)]
+    h = hashlib.sha1(f"{backend or PARSER_BACKEND}\0{_pick_iso_date(html)}\0".encode("utf-8"))
+    h.update(" ".join(_VOLATILE.sub("", region).split()).encode("utf-8"))
+    return h.hexdigest()
+
+
+def page_key(label: str, page_idx: int) -> str:
+    """ 検索条件（target のラベル）とページ番号で1ページを表すキー """
+    return f"{label}#{page_idx}"
+
+
+class PageCache:
+    """ ページキー → (指紋, レコード)。ワーカースレッドから同時に呼ばれてもよい """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._prev: Dict[str, Tuple[str, List[Record]]] = {}
+        self._seen: Dict[str, Tuple[str, List[Record]]] = {}  # この実行で見た分（save で書くのはこれ）
+        self.hits = 0
+        self.misses = 0
+        if self.path.exists():
+            try:
+                raw = json.loads(self.path.read_text(encoding="utf-8"))
+                for key, ent in raw.items():
+                    self._prev[key] = (ent["fp"], [Record(*r) for r in ent["recs"]])
+            except Exception as e:  # 壊れていたら使わないだけ
+                print(f"[warn] page cache ignored: {e}")
+                self._prev = {}
+
+    def parse(self, key: str, html: str, backend: Optional[str] = None, log=None) -> Tuple[List[Record], bool]:
+        """ (レコード, 前回の結果を使ったか)。log は解析の警告用（parse_result_html へ） """
+        fp = fingerprint(html, backend)
+        with self._lock:
+            ent = self._prev.get(key)
+        if ent is not None and ent[0] == fp:
+            recs, hit = list(ent[1]), True
+        else:
+            with span("parse_result_html", key=key):
+                recs, hit = parse_result_html(html, backend, log=log), False
+        with self._lock:
+            self._seen[key] = (fp, recs)
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return recs, hit
+
+    def save(self):
+        """ この実行で見たページだけを書き出し、次の実行の比較元にする（何も見ていなければ書かない） """
+        with self._lock:
+            if not self._seen:
+                return
+            self._prev, self._seen = self._seen, {}
+            data = {k: {"fp": fp, "recs": [list(r) for r in recs]} for k, (fp, recs) in self._prev.items()}
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pages": self.hits + self.misses, "new": self.misses, "reused": self.hits}
+
+    def finish(self, log):
+        """ 実行の終わりに：件数を1行ログして保存し、カウンタを戻す（daemon はサイクルごと） """
+        st = self.stats()
+        if st["pages"]:
+            log(f"[pages] 変化あり {st['new']} / 前回と同じ {st['reused']}（解析を省略）",
+                event="page_cache", obj=st)
+        try:
+            self.save()
+        except Exception as e:
+            log(f"[warn] page cache save failed: {e}", level="warn")
+        with self._lock:
+            self.hits = self.misses = 0
+
+    @classmethod
+    def open_for(cls, data_dir: Path) -> Optional["PageCache"]:
+        """ 設定で有効なら読み込んで activate し返す。無効なら None """
+        if not PAGE_CACHE:
+            return None
+        cache = cls(Path(data_dir) / PAGE_CACHE_JSON)
+        activate(cache)
+        return cache
+
+
+def activate(cache: Optional[PageCache]):
+    """ 以後の parse_page() が使う cache（None で無効化） """
+    global _active
+    _active = cache
+
+
+def parse_page(key: str, html: str, log=None) -> Tuple[List[Record], bool]:
+    """ 有効な cache があれば指紋で比べて解析を省く。なければ普通に解析（hit は常に False） """
+    c = _active
+    if c is None:
+        with span("parse_result_html", key=key):
+            return parse_result_html(html, log=log), False
+    return c.parse(key, html, log=log)
@@ -0,0 +1,45 @@
+# modules/replay.py — 保存済み run ディレクトリから 抽出→差分→通知 を再実行（ブラウザなし）
+#   python main.py --replay data/run-20251004-0900/          # dry-run（送信/prev更新なし）
+#   python main.py --replay data/run-20251004-0900/ --send   # 実送信＋prev.json 更新
+from __future__ import annotations
+import time
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from .artifacts import iter_result_pages
+from .scraper import parse_result_html
+
+
+def replay_run(runpath: Path, dry_run: bool = True, force_mail: bool = False,
+               backend: Optional[str] = None) -> int:
+    """
+    runpath の result-page-*.html をページ順に parse_result_html → DiffStore → send_mail。
+    Playwright は import も起動もしない。
+    """
+    from .runner import finalize  # runner も playwright を遅延 import にしてある
+
+    runpath = Path(runpath)
+    if not runpath.is_dir():
+        print(f"[error] replay dir not found: {runpath}")
+        return 1
+    load_dotenv()  # --send 時の SMTP 設定
+
+    print(f"[replay] {runpath} dry_run={dry_run}")
+    t0 = time.perf_counter()
+    extracted = []
+    n_pages = 0
+    for name, html in iter_result_pages(runpath):
+        n_pages += 1
+        recs = parse_result_html(html, backend)
+        print(f"[page] {name} 抽出: {len(recs)}件")
+        extracted.extend(recs)
+
+    if n_pages == 0:
+        print("[error] result-page-*.html がありません")
+        return 1
+    print(f"[replay] {n_pages} pages / {len(extracted)}件 ({(time.perf_counter() - t0) * 1000:.1f} ms)")
+
+    finalize(extracted, dry_run=dry_run, force_mail=force_mail)
+    return 0
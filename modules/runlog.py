@@ -0,0 +1,97 @@
+# modules/runlog.py — run ディレクトリの log.txt / log.jsonl 書き出し
+#
+# 呼び出し側は従来どおり log(line, level="info", event=None, obj=None)。
+#   - ファイルはそれぞれ1回だけ開いてバッファ付きで持ち、書き込みは専用スレッドがキューから行う
+#     （巡回スレッドはディスク待ちをしない。キューが空になるたびに flush）
+#   - close() / プロセス終了時（atexit）に残りを書き切って閉じる
+#   - level で絞る：コンソールは LOG_LEVEL 以上、ファイルは LOG_FILE_LEVEL 以上
+from __future__ import annotations
+import atexit
+import json
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from .const import LOG_LEVEL, LOG_FILE_LEVEL
+
+LOG_TXT = "log.txt"
+LOG_JSONL = "log.jsonl"
+
+LEVELS = {"debug": 10, "info": 20, "warn": 30, "warning": 30, "error": 40}
+_BUFFER = 64 * 1024
+_STOP = object()
+
+
+def _rank(level: str) -> int:
+    return LEVELS.get((level or "info").lower(), LEVELS["info"])
+
+
+class RunLogger:
+    """ log(line, level, event, obj) で呼べる run ディレクトリ用のロガー """
+
+    def __init__(self, runpath: Path, console_level: str = LOG_LEVEL, file_level: str = LOG_FILE_LEVEL):
+        self.runpath = Path(runpath)
+        self.console_min = _rank(console_level)
+        self.file_min = _rank(file_level)
+        self._txt = (self.runpath / LOG_TXT).open("a", encoding="utf-8", buffering=_BUFFER)
+        self._jsonl = (self.runpath / LOG_JSONL).open("a", encoding="utf-8", buffering=_BUFFER)
+        self._q: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)  # 例外で落ちても書き切る
+
+    def __call__(self, line: str, level: str = "info", event: Optional[str] = None, obj=None):
+        rank = _rank(level)
+        if rank >= self.console_min:
+            print(line)
+        if rank < self.file_min or self._closed:
+            return
+        ts = time.strftime("%Y-%m-%d %H:%M:%S")
+        rec = {"ts": ts, "level": level, "msg": line}
+        if event:
+            rec["event"] = event
+        if obj is not None:
+            rec["obj"] = obj
+        # obj は呼び出し側で後から変わりうるので、文字列にするのはここで
+        self._q.put((f"[{ts}] {line}\n", json.dumps(rec, ensure_ascii=False, default=str) + "\n"))
+
+    def _run(self):
+        while True:
+            item = self._q.get()
+            try:
+                if item is _STOP:
+                    return
+                txt, js = item
+                self._txt.write(txt)
+                self._jsonl.write(js)
+                if self._q.empty():
+                    self._txt.flush()
+                    self._jsonl.flush()
+            except Exception as e:  # ディスク等の失敗で巡回は止めない
+                print(f"[warn] log write failed: {e}")
+            finally:
+                self._q.task_done()
+
+    def flush(self):
+        """ ここまでに渡した行が書き終わるまで待つ """
+        if not self._closed:
+            self._q.join()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._q.put(_STOP)
+        self._thread.join()
+        for fh in (self._txt, self._jsonl):
+            try:
+                fh.flush()
+                fh.close()
+            except Exception:
+                pass
+        atexit.unregister(self.close)
@@ -1,47 +1,52 @@
 # modules/runner.py
-import argparse, os, random, time, json, re, sys, traceback
+import argparse, contextvars, os, socket, time, re, sys, traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, NamedTuple, Optional, Tuple
 from dotenv import load_dotenv
-from playwright.sync_api import sync_playwright
 from .const import (
-    URL_GIN_MENU, USER_AGENT, STEP_TIMEOUT_SEC, TOTAL_TIMEOUT_SEC,
-    INITIAL_SLEEP_MS_MIN, INITIAL_SLEEP_MS_MAX, MAX_RETRIES
+    URL_GIN_MENU, USER_AGENT,
+    INITIAL_SLEEP_MS_MIN, INITIAL_SLEEP_MS_MAX, PAGE_SLEEP_MS_MIN, PAGE_SLEEP_MS_MAX, MAX_RETRIES,
+    CATEGORY1_LABEL, PURPOSE_LABEL, CRAWL_TARGETS, CRAWL_CONCURRENCY,
+    PAGER_MODE, EXTRACT_MODE, TOTAL_TIMEOUT_SEC, _parse_targets, SHARD_DAYS, SHARD_WINDOWS, SHARD_WORKERS,
 )
 from .flow import (
-    goto_menu, click_multifunc, right_frame,
+    goto_menu, click_multifunc, FrameResolver,
     prepare_form, submit_search, access_denied_guard, next_page,
-    go_to_availability_menu,
+    go_to_availability_menu, sleep_rand,
 )
-from .scraper import parse_result_html
-from .diffstore import DiffStore
+from .waits import Waiter
+from .trace import Tracer, activate, span, track
+from .deadline import Deadline
+from .pagecache import PageCache, page_key, parse_page, activate as activate_pages
+from .extract import extract_frame, compare_records, page_date
+from .scraper import _pick_iso_date
+from .shard import DateWindow, Bounds, ShardRun, apply_window, date_windows
+from .shard import activate as activate_shards, current as current_shards
+from .httppager import HttpPager, has_next
+from .netfilter import NetworkFilter
+from .session import load_session, save_session, clear_session, is_rejected
+from .diffstore import DiffStore, open_store
+from .stream import EarlyNotifier, publish
 from .notifier import send_mail
-from .artifacts import run_dir, save_text
+from .artifacts import run_dir, save_text, sweep_after_run
+from .runlog import RunLogger
 
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
-LOG_TXT = "log.txt"
-LOG_JSONL = "log.jsonl"
-
-
-def logger_factory(runpath: Path):
-    def log(line: str, level="info", event=None, obj=None):
-        ts = time.strftime("[%Y-%m-%d %H:%M:%S]")
-        txt = f"{ts} {line}\n"
-        (runpath / LOG_TXT).open("a", encoding="utf-8").write(txt)
-        rec = {"ts": ts[1:-1], "level": level, "msg": line}
-        if event:
-            rec["event"] = event
-        if obj is not None:
-            rec["obj"] = obj
-        (runpath / LOG_JSONL).open("a", encoding="utf-8").write(
-            json.dumps(rec, ensure_ascii=False) + "\n"
-        )
-        print(line)
-    return log
-
-
-def acquire_lock(lock_path: Path, ttl_sec=600):
+
+
+def logger_factory(runpath: Path) -> RunLogger:
+    """ log(line, level="info", event=None, obj=None)。使い終わったら close()（しなくても終了時に書き切る） """
+    return RunLogger(runpath)
+
+
+# ロックの有効期限：1回の実行（持ち時間 + 差分・通知・掃除）より短いと、実行中に別プロセスが奪える
+LOCK_TTL_SEC = max(600, TOTAL_TIMEOUT_SEC + 300)
+
+
+def acquire_lock(lock_path: Path, ttl_sec=LOCK_TTL_SEC):
     now = time.time()
     if lock_path.exists():
         try:
@@ -72,145 +77,750 @@ def _extract_selectdate(html: str) -> Optional[str]:
     return m.group(1) if m else None
 
 
-def crawl_once(page, runpath: Path, log):
+class CrawlTarget(NamedTuple):
+    """ 1回の検索条件（分類1 × 目的。window があればその日付ウィンドウだけ） """
+    category: str = CATEGORY1_LABEL
+    purpose: str = PURPOSE_LABEL
+    window: Optional[DateWindow] = None
+
+    @property
+    def label(self) -> str:
+        base = f"{self.category}/{self.purpose}"
+        return base if self.window is None else f"{base}@{self.window.label}"
+
+
+class CrawlCheckpoint:
     """
-    1回分の処理（入口→条件セット→検索→ページ巡回）を実行して、
-    抽出レコードの配列を返す。ここでは例外を握りつぶさない。
+    target 1組の巡回の途中経過（ページ番号 → そのページの抽出結果）。
+    crawl_target がリトライをまたいで持ち、失敗したページから再開する。
+    add() のたびにそのページの結果を stream へ流す（速報用。無効なら何もしない）。
     """
-    all_open = []
 
-    # 初期ディレイ（マナー）
-    time.sleep(random.uniform(INITIAL_SLEEP_MS_MIN/1000, INITIAL_SLEEP_MS_MAX/1000))
+    def __init__(self):
+        self.pages: Dict[int, List[dict]] = {}
 
-    # 1) 入口へ
-    goto_menu(page)
-    save_text(runpath / "gin_menu.html", page.content())
+    @property
+    def last_page(self) -> int:
+        """ 1ページ目から連続して取れている最後のページ（なければ 0） """
+        n = 0
+        while n + 1 in self.pages:
+            n += 1
+        return n
 
-    # 2) 多機能操作（1枚目だけ）
-    click_multifunc(page)
+    def add(self, page_idx: int, recs: List[dict]):
+        self.pages[page_idx] = recs
+        publish(recs)
 
-    # 3) 2枚目直後のスナップショット
-    save_text(runpath / "gml_init.html", page.content())
-    page.wait_for_load_state("domcontentloaded")
-    time.sleep(0.5)
+    def records(self) -> List[dict]:
+        return [r for i in sorted(self.pages) for r in self.pages[i]]
 
-    # 4) 左メニュー『空き状況の確認』
-    go_to_availability_menu(page)
-    page.wait_for_load_state("domcontentloaded")
-    time.sleep(0.5)
+    def __len__(self) -> int:
+        return sum(len(v) for v in self.pages.values())
 
-    # 5) 右フレーム → 検索フォーム準備
-    f = right_frame(page)
-    prepare_form(f, runpath, log)
 
-    # 6) 検索
-    submit_search(f, log)
-    page.wait_for_load_state("domcontentloaded")
+class PagePipeline:
+    """
+    結果ページの保存と解析をワーカースレッドで行う（ブラウザ側は HTML を1回読んだらすぐ次のページへ）。
+    終わった分は collect() / close() でページ番号順に checkpoint へ入れる。
+    dom（ブラウザ内で抽出済みのレコード）だけ渡されたページは保存も解析もしない。
+    html と dom の両方があれば突き合わせ（EXTRACT_MODE="check"）、結果は html 側を採る。
+    前回と結果表が同じページは解析を省いて前回のレコードを使う（pagecache、キーは label + ページ番号）。
+    """
+
+    def __init__(self, runpath: Path, log, checkpoint: CrawlCheckpoint, workers: int = 1, label: str = ""):
+        self.runpath = runpath
+        self.log = log
+        self.checkpoint = checkpoint
+        self.label = label
+        self.reused = set()  # 前回の結果を使ったページ
+        self._ex = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="parse")
+        self._futs: List[Tuple[int, Future]] = []
+        self.checked = 0
+        self.mismatched = 0
+
+    def _work(self, page_idx: int, html: Optional[str], dom: Optional[List[dict]]) -> List[dict]:
+        if html is None:
+            return dom or []
+        save_text(self.runpath / f"result-page-{page_idx:03d}.html", html)
+        recs, hit = parse_page(page_key(self.label, page_idx), html, log=self.log)
+        if hit:
+            self.reused.add(page_idx)
+        if dom is not None:
+            self._check(page_idx, dom, recs)
+        return recs
+
+    def _check(self, page_idx: int, dom: List[dict], recs: List[dict]):
+        only_dom, only_html = compare_records(dom, recs)
+        self.checked += 1
+        if not (only_dom or only_html):
+            return
+        self.mismatched += 1
+        self.log(f"[warn] extract check: page {page_idx} dom={len(dom)} html={len(recs)} "
+                 f"(dom のみ {len(only_dom)} / html のみ {len(only_html)})",
+                 level="warn", event="extract_check",
+                 obj={"page": page_idx, "only_dom": [r.to_record() for r in only_dom[:5]],
+                     "only_html": [r.to_record() for r in only_html[:5]]})
+
+    def submit(self, page_idx: int, html: Optional[str], dom: Optional[List[dict]] = None):
+        # span の track（target 名）をワーカーにも引き継ぐ
+        ctx = contextvars.copy_context()
+        self._futs.append((page_idx, self._ex.submit(ctx.run, self._work, page_idx, html, dom)))
+
+    def collect(self, wait: bool = False):
+        """ 先頭から終わっている分を checkpoint へ（wait=True なら全部待つ） """
+        while self._futs and (wait or self._futs[0][1].done()):
+            idx, fut = self._futs.pop(0)
+            try:
+                recs = fut.result()
+            except Exception as e:
+                self.log(f"[warn] page {idx} parse failed: {e}")
+                continue
+            self.log(f"[page] {idx}/?? 抽出: {len(recs)}件" + ("（前回と同じ）" if idx in self.reused else ""))
+            self.checkpoint.add(idx, recs)
+
+    def close(self):
+        self.collect(wait=True)
+        self._ex.shutdown(wait=True)
+        if self.checked:
+            self.log(f"[info] extract check: {self.checked} pages / {self.mismatched} mismatched",
+                     event="extract_check", obj={"pages": self.checked, "mismatched": self.mismatched})
+
+
+def _extract_dom(f, log, page_idx: int) -> Optional[List[dict]]:
+    """ ブラウザ内で ○ セルを抽出。失敗・怪しい結果なら None（呼び出し側が HTML で取り直して保存する） """
+    try:
+        with span("extract_dom", page=page_idx):
+            recs, issues = extract_frame(f)
+    except Exception as e:
+        issues = [f"evaluate failed: {e}"]
+    if not issues:
+        return recs
+    log(f"[warn] dom extract: page {page_idx} {'; '.join(issues)} -> HTML で取り直し",
+        level="warn", event="extract_dom", obj={"page": page_idx, "issues": issues})
+    return None
+
+
+def parse_targets_arg(raw: str) -> List[CrawlTarget]:
+    """ "屋内スポーツ施設:バレーボール,文化施設" → [CrawlTarget, ...]（目的省略は PURPOSE_LABEL） """
+    return [CrawlTarget(c, p) for c, p in _parse_targets(raw)]
+
+
+def shard_targets(targets: List[CrawlTarget], days: int = SHARD_DAYS,
+                  windows: int = SHARD_WINDOWS) -> List[CrawlTarget]:
+    """ 各 target を日付ウィンドウごとの検索に分ける（days <= 0 ならそのまま） """
+    ws = date_windows(days, windows)
+    if not ws:
+        return list(targets)
+    return [t._replace(window=w) for t in targets for w in ws]
+
+
+def shard_concurrency(targets: List[CrawlTarget], concurrency: int) -> int:
+    """ ウィンドウに分けたときは SHARD_WORKERS も並列数の上限にする（--concurrency / CRAWL_CONCURRENCY は超えない） """
+    return min(concurrency, SHARD_WORKERS) if any(t.window is not None for t in targets) else concurrency
+
+
+def _warm_start(page, log, frames: FrameResolver, waiter: Waiter):
+    """
+    保存セッションで検索フォームへ直接入る。使えたらフォームのフレーム、
+    拒否・期限切れ・フォームなしなら None（呼び出し側は通常経路へ）。
+    """
+    sess = load_session()
+    if sess is None:
+        return None
+    t0 = time.perf_counter()
+    try:
+        page.goto(sess["form_url"], wait_until="domcontentloaded", timeout=waiter.timeout())
+        if is_rejected(page.content()):
+            raise RuntimeError("session rejected by site")
+        f = frames(page)
+        if f.locator("select").count() == 0:
+            raise RuntimeError("search form not found")
+    except Exception as e:
+        log(f"[info] warm start 不可（{e}）-> 通常の経路で入り直す", event="setup",
+            obj={"mode": "warm", "ok": False, "reason": str(e)})
+        frames.invalidate()  # 覚えたフレームがエラー画面・フォームなしだった：通常の経路では中身で探す
+        clear_session(sess)  # 別 target が保存し直していれば残す
+        return None
+    log(f"[info] warm start: {sess['form_url']}", event="setup",
+        obj={"mode": "warm", "ok": True, "navigations": 1, "sec": round(time.perf_counter() - t0, 3)})
+    return f
+
+
+def crawl_once(page, runpath: Path, log, target: Optional[CrawlTarget] = None, warm: bool = True,
+               frames: Optional[FrameResolver] = None, deadline: Optional[Deadline] = None,
+               checkpoint: Optional[CrawlCheckpoint] = None):
+    """
+    1回分の処理（入口→条件セット→検索→ページ巡回）を実行して、
+    抽出レコードの配列を返す。ここでは例外を握りつぶさない。
+    warm=True なら保存セッションで検索フォームへ直接入ることを先に試す。
+    frames は右フレームの解決（リトライをまたいで使い回すと初回以外は探索しない）。
+    deadline（実行全体の持ち時間）を使い切ったら、巡回はそこまでの結果を返して打ち切る。
+    checkpoint に前の試行で取れたページがあれば、検索後にそこまで解析なしで送り、続きから巡回する。
+    """
+    target = target or CrawlTarget()
+    frames = frames or FrameResolver()
+    deadline = deadline or Deadline()
+    checkpoint = checkpoint if checkpoint is not None else CrawlCheckpoint()
+    resume = checkpoint.last_page + 1
+    waiter = Waiter(log, deadline=deadline)  # 条件待ち（実測は event="wait"）。timeout は残り時間で頭打ち
+    page.set_default_timeout(waiter.timeout())
+
+    # 初期ディレイ（マナー）
+    sleep_rand(INITIAL_SLEEP_MS_MIN, INITIAL_SLEEP_MS_MAX)
+
+    with deadline.step("warm_start"):
+        f = _warm_start(page, log, frames, waiter) if warm else None
+    if f is None:
+        t0 = time.perf_counter()
+
+        # 1) 入口へ
+        with deadline.step("goto_menu"):
+            goto_menu(page, waiter)
+        save_text(runpath / "gin_menu.html", page.content())
+
+        # 2) 多機能操作（1枚目だけ）
+        with deadline.step("click_multifunc"):
+            click_multifunc(page, waiter)
+
+        # 3) 2枚目直後のスナップショット
+        save_text(runpath / "gml_init.html", page.content())
+
+        # 4) 左メニュー『空き状況の確認』（左フレームの読み込み → 右フレームのフォームまで待つ）
+        with deadline.step("go_to_availability_menu"):
+            go_to_availability_menu(page, waiter)
+
+        # 5) 右フレーム
+        f = frames(page)
+        log("[info] setup: full path", event="setup",
+            obj={"mode": "full", "ok": True, "navigations": 3, "sec": round(time.perf_counter() - t0, 3)})
+
+    # 検索フォーム準備
+    with deadline.step("prepare_form"):
+        prepare_form(f, runpath, log, category=target.category, purpose=target.purpose, waiter=waiter)
+    form_url = f.url
+
+    # 日付ウィンドウ：検索の開始日を書き換え、巡回はウィンドウの終わりで打ち切る
+    bounds: Optional[Bounds] = None
+    if target.window is not None:
+        bounds = apply_window(f, target.window, log)
+        if bounds is None:
+            # 基準日が読めない：最初のウィンドウが上限なしで全部読み、ほかは何もしない（重複も欠けもなし）
+            log(f"[warn] date window {target.window.label}: selectdate がないため"
+                + ("上限なしで巡回" if target.window.offset == 0 else "スキップ"),
+                level="warn", event="shard", obj={"window": target.window.label, "ok": False})
+            if target.window.offset > 0:
+                return []
+        else:
+            log(f"[info] date window {target.window.label}: {bounds.start} 〜 {bounds.end or '終わり'}",
+                event="shard", obj={"window": target.window.label, "ok": True, **bounds._asdict()})
+    shards = current_shards() if bounds is not None else None
+    shard_key = target._replace(window=None).label
+    if shards is not None and shards.skip(shard_key, target.window):
+        # ほかのウィンドウがこの target の分割をやめた：続きはそちらが読む
+        log(f"[info] date window {target.window.label}: 分割をやめたためスキップ",
+            event="shard", obj={"window": target.window.label, "skipped_window": True})
+        return []
+
+    # 6) 検索（結果フレームの遷移完了まで待つ）
+    with deadline.step("submit_search"):
+        submit_search(f, log, waiter)
 
     # 7) 巡回
-    f = right_frame(page)
-    save_text(runpath / "result-page-001.html", f.content())
+    f = frames(page)
+
+    # 検索まで通ったので、次回用にセッションとフォーム URL を残す
+    try:
+        save_session(page.context, form_url)
+    except Exception as e:
+        log(f"[warn] session save failed: {e}")
 
     page_idx = 1
+    if resume > 1:
+        # 前の試行で取れたページは解析・保存せずに『次へ』送りして、失敗したページから再開
+        try:
+            with deadline.step("resume", page=resume):
+                f = _dom_fast_forward(page, f, 1, resume, waiter, frames)
+        except RuntimeError as e:
+            # 空きが埋まる等でページ数が減った：取れている分で終わる
+            log(f"[warn] checkpoint: {resume} ページ目まで送れず（{e}）-> {resume - 1} ページ分で終了",
+                level="warn", event="checkpoint", obj={"resume_page": resume, "ok": False})
+            return checkpoint.records()
+        page_idx = resume
+        log(f"[info] checkpoint: {resume - 1} ページ分（{len(checkpoint)}件）を再利用し {resume} ページ目から再開",
+            event="checkpoint", obj={"resume_page": resume, "ok": True, "records": len(checkpoint)})
+
     MAX_PAGES = 120  # 念のための上限
+    dom_idx = page_idx   # ブラウザ側が表示しているページ
+    pager = None         # PAGER_MODE="http" で学習できたら HttpPager
+    learn_http = PAGER_MODE == "http"  # 最初の『次へ』でリクエストを学習する
+    html = None          # 現在ページの HTML（pager で取得済みならそれ、None なら DOM から1回だけ読む）
+    page_url = f.url
+    pipeline = PagePipeline(runpath, log, checkpoint, label=target.label)  # 保存・解析は裏で
+    skipped = 0          # 日付ウィンドウの開始日より前で読まずに送ったページ
 
-    while True:
+    try:
+        while True:
+            # 持ち時間切れ：ここまでの結果で打ち切る（差分・通知は呼び出し側でそのまま行う）
+            if deadline.expired():
+                deadline.cut_short = True
+                log(f"[warn] 持ち時間 {deadline.total_sec:.0f}s を使い切ったため {page_idx} ページ目で巡回を打ち切り",
+                    level="warn", event="deadline", obj={"page": page_idx, "records": len(checkpoint)})
+                break
+            page.set_default_timeout(waiter.timeout())
+            with deadline.step("page", page=page_idx):
+                # 日付ウィンドウの外：終わりを過ぎたら終了、開始日より前は読まずに送る
+                pos = 0
+                if bounds is not None:
+                    day, html = _page_day(f, html)
+                    pos = bounds.position(day)
+                    if pos != 0 and shards is not None:
+                        # サイトが selectdate を使っていない等：ウィンドウ間で続け方を決める
+                        nb = shards.adjust(shard_key, target.window, bounds, pos, log)
+                        if nb is None:
+                            log(f"[info] date window {target.window.label}: 続きは最初のウィンドウが読む -> 巡回終了",
+                                event="shard", obj={"window": target.window.label, "stop_page": page_idx})
+                            break
+                        bounds = nb
+                        pos = bounds.position(day)
+                    if pos > 0:
+                        log(f"[info] date window の終わり（{bounds.end}）に到達 -> 巡回終了",
+                            event="shard", obj={"window": target.window.label, "end_page": page_idx})
+                        break
+                    if pos < 0:
+                        skipped += 1
+                        if html is None and learn_http:
+                            html = f.content()  # http 学習には要る
+                if pos == 0:
+                    # 保存・抽出はワーカーへ渡してすぐ次へ（終わった分だけ回収）
+                    # EXTRACT_MODE="dom" は ○ セルだけ受け取り、HTML は怪しいときだけ読む（http 学習には要る）
+                    dom = None
+                    if html is None and EXTRACT_MODE in ("dom", "check") and not (learn_http and EXTRACT_MODE == "dom"):
+                        dom = _extract_dom(f, log, page_idx)
+                    if dom is not None and EXTRACT_MODE == "dom":
+                        pipeline.submit(page_idx, None, dom=dom)
+                    else:
+                        if html is None:
+                            html = f.content()
+                        _check_frame(html, frames, page_idx)
+                        pipeline.submit(page_idx, html, dom=dom)
+                    pipeline.collect()
+
+                # 上限ガード
+                if page_idx >= MAX_PAGES:
+                    log(f"[info] ページ上限 {MAX_PAGES} 到達 -> 巡回終了（安全弁）")
+                    break
+
+                # HTTP で次ページ
+                if pager is not None:
+                    nxt = pager.fetch_next(html, page_url)
+                    if nxt is not None:
+                        html, page_url = nxt
+                        page_idx += 1
+                        sleep_rand(PAGE_SLEEP_MS_MIN, PAGE_SLEEP_MS_MAX)  # マナー
+                        continue
+                    if not has_next(html):
+                        log("[info] '次へ' not found (http). 巡回終了")
+                        break
+                    # 読めなかった → ブラウザを現在ページまで進めて DOM 巡回に戻す
+                    log(f"[warn] http pager fallback at page {page_idx + 1}: {pager.last_error}")
+                    try:
+                        pager.push_cookies(page.context)  # HTTP 側で更新された Cookie でブラウザを進める
+                    except Exception as e:
+                        log(f"[warn] http pager: cookie の反映に失敗: {e}", level="warn")
+                    f = _dom_fast_forward(page, f, dom_idx, page_idx, waiter, frames)
+                    dom_idx = page_idx
+                    pager.close()
+                    pager = None
+
+                # 次へ（不可視/無効なら即終了）。http モードは最初の『次へ』のリクエストを学習
+                if learn_http:
+                    learn_http = False
+                    form_base = f.url  # 1ページ目の URL（クリック後の f.url は2ページ目になる）
+                    clicked, req = _click_next_capturing(page, f, waiter)
+                    if clicked and req is not None:
+                        pager = _learn_pager(page, f, html, form_base, req, log)
+                else:
+                    clicked = waiter.navigation("next_page", f, lambda: next_page(f))
+                if not clicked:
+                    log("[info] '次へ' not found or not clickable. 巡回終了")
+                    break
+
+                # 次ページ（遷移完了は navigation で待ち済み）
+                page_idx += 1
+                dom_idx = page_idx
+                f = frames(page)
+                page_url = f.url
+                html = None
+                sleep_rand(PAGE_SLEEP_MS_MIN, PAGE_SLEEP_MS_MAX)  # マナー
+    except Exception as e:
+        # 残り時間で頭打ちにした timeout が切れた等：持ち時間切れなら途中までの結果を返す
+        if not deadline.expired():
+            raise
+        deadline.cut_short = True
+        log(f"[warn] 持ち時間切れで巡回を打ち切り（{page_idx} ページ目）: {e}",
+            level="warn", event="deadline", obj={"page": page_idx, "records": len(checkpoint)})
+    finally:
+        pipeline.close()  # 残りの保存・解析を待って checkpoint へ
+        if skipped:
+            log(f"[warn] date window {target.window.label}: 開始日より前の {skipped} ページを送った"
+                "（サイトが selectdate を使っていない可能性）", level="warn", event="shard",
+                obj={"window": target.window.label, "skipped": skipped})
+        if pager is not None:
+            log(f"[info] http pager: {pager.fetched} pages / {pager.client.requests} requests "
+                f"/ {pager.client.reconnects} reconnects")
+            pager.close()
+        log("[info] waits: " + ", ".join(f"{k}={v['total_ms']:.0f}ms" for k, v in waiter.summary().items()),
+            event="wait_summary", obj=waiter.summary())
+
+    return checkpoint.records()
+
+
+def _check_frame(html: str, frames: FrameResolver, page_idx: int):
+    """ 読んだページがエラー画面なら覚えたフレームを捨てて試行を失敗させる（リトライは中身で探し直す） """
+    if is_rejected(html):
+        frames.invalidate()
+        raise RuntimeError(f"error page at page {page_idx}")
+
+
+def _page_day(f, html: Optional[str]) -> Tuple[str, Optional[str]]:
+    """ 表示中のページの日付（ISO）。HTML を読む設定ならここで読み、それも返す """
+    if html is None and EXTRACT_MODE == "html":
         html = f.content()
+    day = _pick_iso_date(html) if html is not None else page_date(f)
+    return day, html
 
-        # 抽出・ログ
-        recs = parse_result_html(html)
-        log(f"[page] {page_idx}/?? 抽出: {len(recs)}件")
-        all_open.extend(recs)
 
-        # 上限ガード
-        if page_idx >= MAX_PAGES:
-            log(f"[info] ページ上限 {MAX_PAGES} 到達 -> 巡回終了（安全弁）")
-            break
+class _NotClicked(Exception):
+    pass
 
-        # 次へ（不可視/無効なら即終了）
-        if not next_page(f):
-            log("[info] '次へ' not found or not clickable. 巡回終了")
-            break
 
-        # 次ページ読み込み
-        page.wait_for_load_state("domcontentloaded")
-        page_idx += 1
-        f = right_frame(page)
-        save_text(runpath / f"result-page-{page_idx:03d}.html", f.content())
-        time.sleep(random.uniform(0.3, 0.8))
+def _click_next_capturing(page, f, waiter: Waiter):
+    """ 『次へ』を押し、発生したナビゲーション要求も返す：(押せたか, Request or None) """
+    try:
+        with page.expect_request(lambda r: r.is_navigation_request(),
+                                 timeout=waiter.timeout()) as info:  # deadline の残りで頭打ち
+            if not waiter.navigation("next_page", f, lambda: next_page(f)):
+                raise _NotClicked()
+    except _NotClicked:
+        return False, None
+    except Exception:
+        return True, None  # 押せたが要求は取れなかった → DOM のまま続行
+    return True, info.value
 
-    return all_open
 
+def _learn_pager(page, f, html: str, base_url: str, req, log) -> Optional[HttpPager]:
+    """ html（クリック前のページ）の『次へ』フォームを base_url（そのページの URL）基準で学習 """
+    try:
+        charset = f.evaluate("document.characterSet") or "utf-8"
+        pager = HttpPager.learn(html, base_url, req, page.context.cookies(), charset=charset)
+    except Exception as e:
+        log(f"[warn] http pager learn failed: {e}")
+        return None
+    if pager is None:
+        log("[warn] http pager: 『次へ』のフォームが特定できないため DOM で巡回")
+    else:
+        log(f"[info] http pager: {pager.method} {pager.action} "
+            f"overrides={sorted(pager.overrides)} increments={sorted(pager.increments)}")
+    return pager
+
+
+def _dom_fast_forward(page, f, from_idx: int, to_idx: int, waiter: Waiter, frames: FrameResolver):
+    """ ブラウザを from_idx → to_idx ページまで解析なしで『次へ』送りする """
+    for _ in range(to_idx - from_idx):
+        if not waiter.navigation("fast_forward", f, lambda: next_page(f)):
+            raise RuntimeError(f"fast-forward failed before page {to_idx}")
+        f = frames(page)
+    return f
+
+
+def finalize(extracted, dry_run=False, force_mail=False, store: Optional[DiffStore] = None,
+             alerted: Optional[dict] = None):
+    """
+    抽出結果 → 差分 → 通知 → prev 保存。各段の失敗は握りつぶして最後まで走る。
+    通常実行と replay（modules.replay）で共用。新規レコードを返す。
+    alerted（EarlyNotifier.alerted）があれば、速報済みの枠を除いて「まとめ」として送る。
+    """
+    alerted = alerted or {}
+    if store is None:
+        store = open_store(DATA_DIR)
 
-def run_once(show=False, slowmo=0, dry_run=False, force_mail=False):
-    runpath = run_dir(DATA_DIR)
-    log = logger_factory(runpath)
-    load_dotenv()  # SMTP など環境変数読み込み
+    try:
+        with span("diff", cat="finalize"):
+            new_records = store.diff(extracted)
+    except Exception as e:
+        print(f"[error] diff failed: {e}")
+        new_records = []
 
-    log(f"[start] show={show} slowmo={slowmo} dry_run={dry_run}")
+    # 強制送信フラグ（CLI or 環境変数）
+    env_force = os.getenv("FORCE_MAIL", "0") == "1"
+    if force_mail or env_force:
+        records_to_send = extracted
+    else:
+        records_to_send = [r for r in new_records if DiffStore._key(r) not in alerted]
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=not show, slow_mo=slowmo)
-        ctx = browser.new_context(user_agent=USER_AGENT, timezone_id="Asia/Tokyo")
-        page = ctx.new_page()
+    print(f"[diff] 新規 {len(new_records)}件" + (f"（速報済み {len(alerted)}件）" if alerted else ""))
 
-        success = False
-        extracted = []
+    try:
+        if alerted and not records_to_send:
+            print("[mail] skipped (すべて速報済み)")
+        else:
+            with span("send_mail", cat="finalize", n=len(records_to_send)):
+                sent = send_mail(records_to_send, dry_run=dry_run,
+                                 kind="まとめ" if alerted else "", alerted=len(alerted))
+            print("[mail] sent" if sent else "[mail] skipped (dry_run or 0件)")
+    except Exception as e:
+        print(f"[error] mail send failed: {e}")
 
-        # --- 入口〜巡回だけをリトライ対象にする ---
+    try:
+        if not dry_run:
+            # union 保存：カテゴリをまたいでも既知を保持
+            with span("save_prev", cat="finalize"):
+                store.save(extracted, mode="union")
+    except Exception as e:
+        print(f"[error] save prev failed: {e}")
+
+    return new_records
+
+
+def new_crawl_context(browser):
+    """ 巡回用の BrowserContext を作り、[network] の遮断を取り付けて (ctx, NetworkFilter or None) を返す """
+    sess = load_session()
+    ctx = browser.new_context(user_agent=USER_AGENT, timezone_id="Asia/Tokyo",
+                              storage_state=sess["state"] if sess else None)
+    net = NetworkFilter.from_config()
+    if net is not None:
+        net.install(ctx)
+    return ctx, net
+
+
+def crawl_target(browser, target: CrawlTarget, runpath: Path, log, ctx=None, net=None,
+                 deadline: Optional[Deadline] = None):
+    """
+    target 1組を専用の BrowserContext で巡回（入口〜巡回だけをリトライ対象にする）。
+    全リトライに失敗したら最後の例外を送出。持ち時間切れならリトライしない。
+    ctx を渡した場合はそれを使い回し、閉じない（daemon のウォームなコンテキスト）。
+    """
+    deadline = deadline or Deadline()
+    owns = ctx is None
+    if owns:
+        ctx, net = new_crawl_context(browser)
+    frames = FrameResolver()          # 右フレームはリトライをまたいで覚えておく
+    checkpoint = CrawlCheckpoint()    # 取れたページはリトライで取り直さない
+    try:
+        page = ctx.pages[0] if ctx.pages else ctx.new_page()
         for attempt in range(1, MAX_RETRIES + 1):
             try:
-                extracted = crawl_once(page, runpath, log)
-                success = True
-                break  # 成功したら抜ける（ここで再スタートしない）
+                # 成功したら抜ける（ここで再スタートしない）。ウォームスタートは初回だけ試す
+                with track(target.label), span("crawl_once", target=target.label, attempt=attempt):
+                    return crawl_once(page, runpath, log, target, warm=(attempt == 1), frames=frames,
+                                      deadline=deadline, checkpoint=checkpoint)
             except Exception as e:
-                log(f"[warn] attempt {attempt} failed: {e}")
+                log(f"[warn] attempt {attempt} failed at page {checkpoint.last_page + 1}: {e}")
                 traceback.print_exc()
-                if attempt >= MAX_RETRIES:
+                frames.invalidate()  # エラー画面・外れたフレームを次の試行で引き続けない
+                if attempt >= MAX_RETRIES or deadline.expired():
+                    if checkpoint.pages:
+                        # 取れた分だけでも差分・通知に回す
+                        log(f"[warn] {target.label}: {checkpoint.last_page} ページ分（{len(checkpoint)}件）で打ち切り",
+                            level="warn", event="checkpoint", obj={"partial": True, "pages": checkpoint.last_page})
+                        return checkpoint.records()
                     raise
-                time.sleep(1.5 * attempt)
+                time.sleep(min(1.5 * attempt, deadline.remaining()))
+        return []
+    finally:
+        log(frames.summary(), event="frame_cache", obj={"target": target.label, **frames.stats()})
+        if net is not None:
+            log(net.summary(), event="network", obj={"target": target.label, **net.stats()})
+            net.reset()
+        if owns:
+            try:
+                ctx.close()
+            except Exception:
+                pass
+
+
+def _crawl_target_over_cdp(cdp_url: str, target: CrawlTarget, runpath: Path, log,
+                           deadline: Optional[Deadline] = None):
+    """
+    ワーカースレッド用：sync API はスレッドをまたげないため、スレッドごとに
+    playwright を起動して同じブラウザへ CDP 接続し、専用コンテキストで巡回する。
+    """
+    from playwright.sync_api import sync_playwright
+
+    with sync_playwright() as p:
+        browser = p.chromium.connect_over_cdp(cdp_url)
+        try:
+            return crawl_target(browser, target, runpath, log, deadline=deadline)
+        finally:
+            try:
+                browser.close()  # 接続を切るだけ（ブラウザ本体は起動元が閉じる）
+            except Exception:
+                pass
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def merge_records(chunks) -> List[dict]:
+    """ 複数 target の結果を (date, time, facility) で重複排除しつつ順序維持で結合 """
+    merged = {}
+    for recs in chunks:
+        for r in recs:
+            merged.setdefault(DiffStore._key(r), r)
+    return list(merged.values())
+
+
+def _labeled_log(log, label: str, line: str, *args, **kwargs):
+    """ 行頭に target のラベルを付けて log へ """
+    log(f"[{label}] {line}", *args, **kwargs)
+
+
+def target_jobs(targets: List[CrawlTarget], runpath: Path, log):
+    """ target ごとの (target, スナップショット保存先, ラベル付き logger) を作る（sync/async 共用） """
+    if len(targets) <= 1:
+        return [(t, runpath, log) for t in targets]
+    jobs = []
+    for i, target in enumerate(targets, 1):
+        tpath = runpath / f"{i:02d}-{target.category}"
+        tpath.mkdir(parents=True, exist_ok=True)
+        tlog = partial(_labeled_log, log, target.label)
+        jobs.append((target, tpath, tlog))
+    return jobs
 
+
+def launch_browser(p, show=False, slowmo=0, workers: int = 1):
+    """
+    Chromium を起動して (browser, cdp_url) を返す。
+    workers > 1 のときはワーカースレッドが CDP で繋げるようデバッグポートを開ける。
+    """
+    launch_args = []
+    cdp_url = None
+    if workers > 1:
+        port = _free_port()
+        launch_args.append(f"--remote-debugging-port={port}")
+        cdp_url = f"http://127.0.0.1:{port}"
+    browser = p.chromium.launch(headless=not show, slow_mo=slowmo, args=launch_args)
+    return browser, cdp_url
+
+
+def crawl_with_browser(browser, cdp_url: Optional[str], targets: List[CrawlTarget], runpath: Path, log,
+                       concurrency: int = CRAWL_CONCURRENCY, contexts: Optional[dict] = None,
+                       deadline: Optional[Deadline] = None):
+    """
+    起動済みのブラウザで targets を巡回し、結果を1つに結合して返す。
+      - cdp_url があり concurrency > 1 かつ複数 target：CDP 経由で各スレッドから別コンテキストを同時に巡回
+      - それ以外：同じブラウザで順番に。contexts（target → (ctx, net)）があれば使い回す
+    スナップショットは target が複数なら runpath/NN-分類1/ に分けて保存。
+    1つでも成功すればその分で続行、全滅なら最後の例外を送出。
+    deadline は全 target で共有する（実行全体の持ち時間）。
+    """
+    deadline = deadline or Deadline()
+    workers = min(max(1, concurrency), len(targets))
+    jobs = target_jobs(targets, runpath, log)
+    results, errors = [], []
+    if workers > 1 and cdp_url:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="crawl") as ex:
+            futs = [ex.submit(_crawl_target_over_cdp, cdp_url, t, tp, tl, deadline) for t, tp, tl in jobs]
+            for (t, _tp, _tl), fut in zip(jobs, futs):
+                try:
+                    results.append(fut.result())
+                except Exception as e:
+                    errors.append(e)
+                    log(f"[error] {t.label} failed: {e}")
+    else:
+        for t, tp, tl in jobs:
+            ctx, net = (contexts or {}).get(t, (None, None))
+            try:
+                results.append(crawl_target(browser, t, tp, tl, ctx=ctx, net=net, deadline=deadline))
+            except Exception as e:
+                errors.append(e)
+                log(f"[error] {t.label} failed: {e}")
+
+    if not results and errors:
+        raise errors[-1]
+    return merge_records(results)
+
+
+def crawl_targets(p, targets: List[CrawlTarget], runpath: Path, log,
+                  show=False, slowmo=0, concurrency: int = CRAWL_CONCURRENCY,
+                  deadline: Optional[Deadline] = None):
+    """ ブラウザを1つ起動して targets を巡回し、閉じて結果を返す（1回実行用） """
+    workers = min(max(1, concurrency), len(targets))
+    browser, cdp_url = launch_browser(p, show=show, slowmo=slowmo, workers=workers)
+    try:
+        return crawl_with_browser(browser, cdp_url, targets, runpath, log, concurrency=concurrency,
+                                  deadline=deadline)
+    finally:
         # ブラウザはここで閉じる（失敗しても無視して進む）
         try:
             browser.close()
         except Exception:
             pass
 
-    # --- 差分・通知はリトライしない＆ここで終了まで走る ---
-    if success:
-        prev_path = DATA_DIR / "prev.json"
-        store = DiffStore(prev_path)
-
-        try:
-            new_records = store.diff(extracted)
-        except Exception as e:
-            print(f"[error] diff failed: {e}")
-            new_records = []
 
-        # 強制送信フラグ（CLI or 環境変数）
-        env_force = os.getenv("FORCE_MAIL", "0") == "1"
-        records_to_send = extracted if (force_mail or env_force) else new_records
+def write_timings(tracer: Tracer, runpath: Path, log):
+    """ timings.json / trace.json を書いて要約を1行ログ """
+    try:
+        t = tracer.write(runpath)
+    except Exception as e:
+        log(f"[warn] timings write failed: {e}")
+        return
+    pg = t["pages"]
+    log(f"[timing] total={t['total_ms'] / 1000:.1f}s pages={pg['n']} "
+        f"p50={pg['p50_ms']:.0f}ms p95={pg['p95_ms']:.0f}ms", event="timings", obj=t)
 
-        print(f"[diff] 新規 {len(new_records)}件")
 
-        try:
-            sent = send_mail(records_to_send, dry_run=dry_run)
-            print("[mail] sent" if sent else "[mail] skipped (dry_run or 0件)")
-        except Exception as e:
-            print(f"[error] mail send failed: {e}")
+def run_once(show=False, slowmo=0, dry_run=False, force_mail=False,
+             targets: Optional[List[CrawlTarget]] = None, concurrency: int = CRAWL_CONCURRENCY):
+    runpath = run_dir(DATA_DIR)
+    log = logger_factory(runpath)
+    load_dotenv()  # SMTP など環境変数読み込み
+    force_mail = force_mail or os.getenv("FORCE_MAIL", "0") == "1"  # 速報と finalize で同じ判定にする
 
-        try:
-            if not dry_run:
-                # union 保存：カテゴリをまたいでも既知を保持
-                store.save(extracted, mode="union")
-        except Exception as e:
-            print(f"[error] save prev failed: {e}")
+    targets = shard_targets(targets or [CrawlTarget(c, p) for c, p in CRAWL_TARGETS])  # SHARD_DAYS > 0 なら日付ウィンドウごとに
+    concurrency = shard_concurrency(targets, concurrency)
+    activate_shards(ShardRun() if any(t.window is not None for t in targets) else None)
+    log(f"[start] show={show} slowmo={slowmo} dry_run={dry_run} "
+        f"targets={[t.label for t in targets]} concurrency={concurrency}")
 
-        # ★ ここで確実に終了
-        return 0
+    from playwright.sync_api import sync_playwright  # replay では読み込まない
 
-    # success=False でここに来るのは異常系のみ
-    return 1
+    tracer = Tracer(log)
+    activate(tracer)
+    deadline = Deadline()  # TOTAL_TIMEOUT_SEC：巡回はこの中で打ち切り、差分・通知は必ず行う
+    store = open_store(DATA_DIR)
+    pages = PageCache.open_for(DATA_DIR)  # 前回と同じページは解析を省く（PAGE_CACHE）
+    try:
+        with span("run", cat="run"):
+            # 巡回中に新規が見つかればその場で速報（EARLY_NOTIFY）
+            early = EarlyNotifier.start_for(store, dry_run, log, force_mail=force_mail)
+            try:
+                with sync_playwright() as p, span("crawl", cat="run"):
+                    extracted = crawl_targets(p, targets, runpath, log, show=show, slowmo=slowmo,
+                                              concurrency=concurrency, deadline=deadline)
+            finally:
+                if early is not None:
+                    early.stop()
+
+            # --- 差分・通知はリトライしない＆ここで終了まで走る ---
+            with span("finalize", cat="run"):
+                finalize(extracted, dry_run=dry_run, force_mail=force_mail, store=store,
+                         alerted=early.alerted if early is not None else None)
+    finally:
+        activate(None)
+        activate_shards(None)
+        if pages is not None:
+            pages.finish(log)  # 変化のあったページ数をログして次回の比較元を保存
+            activate_pages(None)
+        log(deadline.summary(), event="budget", obj=deadline.stats())
+        write_timings(tracer, runpath, log)
+        sweep_after_run(DATA_DIR, runpath, log)  # スナップショットを書き切って保持期間の掃除
+        log.close()  # 残りのログを書き切る
+    # ★ ここで確実に終了
+    return 0
 
 
 def main():
@@ -219,16 +829,51 @@ def main():
     parser.add_argument("--slowmo", type=int, default=0)
     parser.add_argument("--dry-run", action="store_true")
     parser.add_argument("--force-mail", action="store_true")  # ← 追加
+    parser.add_argument("--targets", type=parse_targets_arg, default=None,
+                        help="巡回する '分類1[:目的]' をカンマ区切りで（既定: config/ENV の CRAWL_TARGETS）")
+    parser.add_argument("--concurrency", type=int, default=CRAWL_CONCURRENCY,
+                        help="同時に巡回する target 数の上限")
+    parser.add_argument("--engine", choices=("sync", "async"), default="sync",
+                        help="sync: playwright.sync_api（従来） / async: playwright.async_api（1つのイベントループで並行）")
+    parser.add_argument("--daemon", action="store_true",
+                        help="常駐してブラウザを温めたまま --interval ごとに巡回")
+    parser.add_argument("--interval", default="15m", help="--daemon の間隔（例: 15m, 90s, 1h）")
+    parser.add_argument("--jitter", type=float, default=0.15, help="間隔のゆらぎ（0.15 = ±15%%）")
+    parser.add_argument("--recycle-runs", type=int, default=20,
+                        help="--daemon でコンテキストを作り直すまでの巡回回数")
+    parser.add_argument("--recycle-mem-mb", type=float, default=1500,
+                        help="--daemon でブラウザ関連プロセスの RSS がこれを超えたら再起動")
+    parser.add_argument("--max-cycles", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--replay", type=Path, metavar="RUN_DIR",
+                        help="保存済み run ディレクトリの result-page-*.html を再処理（ブラウザなし）")
+    parser.add_argument("--send", action="store_true",
+                        help="--replay 時も実際に送信し prev.json を更新する（既定は dry-run）")
     args = parser.parse_args()
 
+    if args.replay:
+        from .replay import replay_run
+        return replay_run(args.replay, dry_run=not args.send, force_mail=args.force_mail)
+
     # 排他ロック
     lock_path = DATA_DIR / "nerima.lock"
     if not acquire_lock(lock_path):
         print("[info] another instance is running. exit.")
         return 0
     try:
-        rc = run_once(show=args.show, slowmo=args.slowmo,
-                      dry_run=args.dry_run, force_mail=args.force_mail)
+        if args.daemon:
+            from .daemon import parse_interval, run_daemon
+            return run_daemon(parse_interval(args.interval), jitter=args.jitter,
+                              recycle_runs=args.recycle_runs, recycle_mem_mb=args.recycle_mem_mb,
+                              show=args.show, slowmo=args.slowmo, dry_run=args.dry_run,
+                              force_mail=args.force_mail, targets=args.targets,
+                              max_cycles=args.max_cycles, lock_path=lock_path)
+        if args.engine == "async":
+            from .runner_async import run_once as run_engine
+        else:
+            run_engine = run_once
+        rc = run_engine(show=args.show, slowmo=args.slowmo,
+                        dry_run=args.dry_run, force_mail=args.force_mail,
+                        targets=args.targets, concurrency=args.concurrency)
         return rc
     finally:
         release_lock(lock_path)
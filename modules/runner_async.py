@@ -0,0 +1,363 @@
+# modules/runner_async.py — runner.py の async エンジン（main.py --engine async）
+# 1つのイベントループ上で複数 target をコンテキスト別に同時巡回し、
+# スナップショット書き込みと解析はスレッドに逃がしてナビゲーションと重ねる。
+from __future__ import annotations
+import asyncio
+import os
+import traceback
+from pathlib import Path
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+from .const import (
+    USER_AGENT, INITIAL_SLEEP_MS_MIN, INITIAL_SLEEP_MS_MAX, PAGE_SLEEP_MS_MIN, PAGE_SLEEP_MS_MAX, MAX_RETRIES,
+    CRAWL_TARGETS, CRAWL_CONCURRENCY, EXTRACT_MODE,
+)
+from .flow_async import (
+    goto_menu, click_multifunc, AsyncFrameResolver,
+    prepare_form, submit_search, next_page,
+    go_to_availability_menu, sleep_rand,
+)
+from .waits import AsyncWaiter
+from .pagecache import PageCache, page_key, parse_page, activate as activate_pages
+from .extract import extract_frame_async, compare_records, page_date_async
+from .scraper import _pick_iso_date
+from .shard import Bounds, ShardRun, apply_window_async
+from .shard import activate as activate_shards, current as current_shards
+from .netfilter import NetworkFilter
+from .artifacts import run_dir, save_text, sweep_after_run
+from .trace import Tracer, activate, span, track
+from .deadline import Deadline
+from .diffstore import open_store
+from .stream import EarlyNotifier
+from .runner import (
+    DATA_DIR, CrawlCheckpoint, CrawlTarget, finalize, logger_factory, merge_records, shard_concurrency, shard_targets,
+    target_jobs, write_timings, _check_frame,
+)
+
+
+def _parse(html: str, dom=None, log=None, page_idx: int = 0, label: str = ""):
+    # to_thread はコンテキストを引き継ぐので track() もそのまま効く
+    recs, hit = parse_page(page_key(label, page_idx), html, log=log)
+    if hit:
+        log(f"[page] {page_idx} 前回と同じ結果表 -> 解析を省略", level="debug")
+    if dom is not None:
+        only_dom, only_html = compare_records(dom, recs)
+        if only_dom or only_html:
+            log(f"[warn] extract check: page {page_idx} dom={len(dom)} html={len(recs)} "
+                f"(dom のみ {len(only_dom)} / html のみ {len(only_html)})",
+                level="warn", event="extract_check",
+                obj={"page": page_idx, "only_dom": [r.to_record() for r in only_dom[:5]],
+                     "only_html": [r.to_record() for r in only_html[:5]]})
+    return recs
+
+
+async def _extract_dom(f, log, page_idx: int):
+    """ runner._extract_dom の async 版 """
+    try:
+        with span("extract_dom", page=page_idx):
+            recs, issues = await extract_frame_async(f)
+    except Exception as e:
+        issues = [f"evaluate failed: {e}"]
+    if not issues:
+        return recs
+    log(f"[warn] dom extract: page {page_idx} {'; '.join(issues)} -> HTML で取り直し",
+        level="warn", event="extract_dom", obj={"page": page_idx, "issues": issues})
+    return None
+
+
+async def _done(recs):
+    return recs
+
+
+async def _fast_forward(page, f, from_idx: int, to_idx: int, waiter: AsyncWaiter, frames: AsyncFrameResolver):
+    """ runner._dom_fast_forward の async 版 """
+    for _ in range(to_idx - from_idx):
+        if not await waiter.navigation("fast_forward", f, lambda: next_page(f)):
+            raise RuntimeError(f"fast-forward failed before page {to_idx}")
+        f = await frames(page)
+    return f
+
+
+async def crawl_once_async(page, runpath: Path, log, target: Optional[CrawlTarget] = None,
+                           frames: Optional[AsyncFrameResolver] = None, deadline: Optional[Deadline] = None,
+                           checkpoint: Optional[CrawlCheckpoint] = None):
+    """ runner.crawl_once の async 版。書き込み・解析は to_thread で待ち合わせずに走らせる。 """
+    target = target or CrawlTarget()
+    deadline = deadline or Deadline()
+    checkpoint = checkpoint if checkpoint is not None else CrawlCheckpoint()
+    resume = checkpoint.last_page + 1
+    waiter = AsyncWaiter(log, deadline=deadline)
+    frames = frames or AsyncFrameResolver()
+    page.set_default_timeout(waiter.timeout())
+
+    def _save(name: str, html: str):
+        save_text(runpath / name, html)  # 圧縮・書き込みは artifacts の専用スレッド
+
+    await sleep_rand(INITIAL_SLEEP_MS_MIN, INITIAL_SLEEP_MS_MAX)
+
+    with deadline.step("goto_menu"):
+        await goto_menu(page, waiter)
+    _save("gin_menu.html", await page.content())
+
+    with deadline.step("click_multifunc"):
+        await click_multifunc(page, waiter)
+    _save("gml_init.html", await page.content())
+
+    with deadline.step("go_to_availability_menu"):
+        await go_to_availability_menu(page, waiter)
+
+    f = await frames(page)
+    with deadline.step("prepare_form"):
+        await prepare_form(f, runpath, log, category=target.category, purpose=target.purpose, waiter=waiter)
+
+    # 日付ウィンドウ（runner.crawl_once と同じ扱い）
+    bounds: Optional[Bounds] = None
+    if target.window is not None:
+        bounds = await apply_window_async(f, target.window, log)
+        if bounds is None:
+            log(f"[warn] date window {target.window.label}: selectdate がないため"
+                + ("上限なしで巡回" if target.window.offset == 0 else "スキップ"),
+                level="warn", event="shard", obj={"window": target.window.label, "ok": False})
+            if target.window.offset > 0:
+                return []
+        else:
+            log(f"[info] date window {target.window.label}: {bounds.start} 〜 {bounds.end or '終わり'}",
+                event="shard", obj={"window": target.window.label, "ok": True, **bounds._asdict()})
+    shards = current_shards() if bounds is not None else None
+    shard_key = target._replace(window=None).label
+    if shards is not None and shards.skip(shard_key, target.window):
+        log(f"[info] date window {target.window.label}: 分割をやめたためスキップ",
+            event="shard", obj={"window": target.window.label, "skipped_window": True})
+        return []
+    skipped = 0
+
+    with deadline.step("submit_search"):
+        await submit_search(f, log, waiter)
+
+    parses = []  # (page_idx, 解析タスク)
+
+    async def _collect(wait: bool = False):
+        # 先頭から終わっている分を checkpoint へ（ページ順。add で速報の stream にも流れる）
+        while parses and (wait or parses[0][1].done()):
+            idx, task = parses.pop(0)
+            try:
+                recs = await task
+            except Exception as e:
+                log(f"[warn] page {idx} parse failed: {e}")
+                continue
+            log(f"[page] {idx}/{page_idx} 抽出: {len(recs)}件")
+            checkpoint.add(idx, recs)
+
+    page_idx = 1
+    MAX_PAGES = 120  # 念のための上限
+    f = await frames(page)
+
+    if resume > 1:
+        try:
+            with deadline.step("resume", page=resume):
+                f = await _fast_forward(page, f, 1, resume, waiter, frames)
+        except RuntimeError as e:
+            log(f"[warn] checkpoint: {resume} ページ目まで送れず（{e}）-> {resume - 1} ページ分で終了",
+                level="warn", event="checkpoint", obj={"resume_page": resume, "ok": False})
+            return checkpoint.records()
+        page_idx = resume
+        log(f"[info] checkpoint: {resume - 1} ページ分（{len(checkpoint)}件）を再利用し {resume} ページ目から再開",
+            event="checkpoint", obj={"resume_page": resume, "ok": True, "records": len(checkpoint)})
+
+    try:
+        while True:
+            if deadline.expired():
+                deadline.cut_short = True
+                log(f"[warn] 持ち時間 {deadline.total_sec:.0f}s を使い切ったため {page_idx} ページ目で巡回を打ち切り",
+                    level="warn", event="deadline", obj={"page": page_idx})
+                break
+            page.set_default_timeout(waiter.timeout())
+            with deadline.step("page", page=page_idx):
+                html, pos = None, 0
+                if bounds is not None:  # runner.crawl_once と同じ
+                    if EXTRACT_MODE == "html":
+                        html = await f.content()
+                    day = _pick_iso_date(html) if html is not None else await page_date_async(f)
+                    pos = bounds.position(day)
+                    if pos != 0 and shards is not None:
+                        nb = shards.adjust(shard_key, target.window, bounds, pos, log)
+                        if nb is None:
+                            log(f"[info] date window {target.window.label}: 続きは最初のウィンドウが読む -> 巡回終了",
+                                event="shard", obj={"window": target.window.label, "stop_page": page_idx})
+                            break
+                        bounds = nb
+                        pos = bounds.position(day)
+                    if pos > 0:
+                        log(f"[info] date window の終わり（{bounds.end}）に到達 -> 巡回終了",
+                            event="shard", obj={"window": target.window.label, "end_page": page_idx})
+                        break
+                    if pos < 0:
+                        skipped += 1
+                if pos == 0:
+                    dom = await _extract_dom(f, log, page_idx) if EXTRACT_MODE in ("dom", "check") else None
+                    if dom is not None and EXTRACT_MODE == "dom":
+                        parses.append((page_idx, asyncio.create_task(_done(dom))))
+                    else:
+                        html = html if html is not None else await f.content()
+                        _check_frame(html, frames, page_idx)
+                        _save(f"result-page-{page_idx:03d}.html", html)
+                        parses.append((page_idx, asyncio.create_task(
+                            asyncio.to_thread(_parse, html, dom, log, page_idx, target.label))))
+                    await _collect()
+
+                if page_idx >= MAX_PAGES:
+                    log(f"[info] ページ上限 {MAX_PAGES} 到達 -> 巡回終了（安全弁）")
+                    break
+                if not await waiter.navigation("next_page", f, lambda: next_page(f)):
+                    log("[info] '次へ' not found or not clickable. 巡回終了")
+                    break
+
+                page_idx += 1
+                f = await frames(page)
+                await sleep_rand(PAGE_SLEEP_MS_MIN, PAGE_SLEEP_MS_MAX)  # マナー
+    except Exception as e:
+        if not deadline.expired():
+            raise
+        deadline.cut_short = True
+        log(f"[warn] 持ち時間切れで巡回を打ち切り（{page_idx} ページ目）: {e}",
+            level="warn", event="deadline", obj={"page": page_idx})
+    finally:
+        # 例外で抜けても、解析できたページは checkpoint に入れてリトライで取り直さない
+        await _collect(wait=True)
+        if skipped:
+            log(f"[warn] date window {target.window.label}: 開始日より前の {skipped} ページを送った"
+                "（サイトが selectdate を使っていない可能性）", level="warn", event="shard",
+                obj={"window": target.window.label, "skipped": skipped})
+        log("[info] waits: " + ", ".join(f"{k}={v['total_ms']:.0f}ms" for k, v in waiter.summary().items()),
+            event="wait_summary", obj=waiter.summary())
+    return checkpoint.records()
+
+
+async def crawl_target_async(browser, target: CrawlTarget, runpath: Path, log,
+                             deadline: Optional[Deadline] = None):
+    """ target 1組を専用コンテキストで巡回（リトライは runner.crawl_target と同じ） """
+    deadline = deadline or Deadline()
+    ctx = await browser.new_context(user_agent=USER_AGENT, timezone_id="Asia/Tokyo")
+    net = NetworkFilter.from_config()
+    if net is not None:
+        await net.install_async(ctx)
+    frames = AsyncFrameResolver()
+    checkpoint = CrawlCheckpoint()
+    try:
+        page = await ctx.new_page()
+        for attempt in range(1, MAX_RETRIES + 1):
+            try:
+                with track(target.label), span("crawl_once", target=target.label, attempt=attempt):
+                    return await crawl_once_async(page, runpath, log, target, frames=frames,
+                                                  deadline=deadline, checkpoint=checkpoint)
+            except Exception as e:
+                log(f"[warn] attempt {attempt} failed at page {checkpoint.last_page + 1}: {e}")
+                traceback.print_exc()
+                frames.invalidate()  # エラー画面・外れたフレームを次の試行で引き続けない
+                if attempt >= MAX_RETRIES or deadline.expired():
+                    if checkpoint.pages:
+                        log(f"[warn] {target.label}: {checkpoint.last_page} ページ分（{len(checkpoint)}件）で打ち切り",
+                            level="warn", event="checkpoint", obj={"partial": True, "pages": checkpoint.last_page})
+                        return checkpoint.records()
+                    raise
+                await asyncio.sleep(min(1.5 * attempt, deadline.remaining()))
+        return []
+    finally:
+        log(frames.summary(), event="frame_cache", obj={"target": target.label, **frames.stats()})
+        if net is not None:
+            log(net.summary(), event="network", obj={"target": target.label, **net.stats()})
+        try:
+            await ctx.close()
+        except Exception:
+            pass
+
+
+async def crawl_targets_async(p, targets: List[CrawlTarget], runpath: Path, log,
+                              show=False, slowmo=0, concurrency: int = CRAWL_CONCURRENCY,
+                              deadline: Optional[Deadline] = None):
+    """ 1つのブラウザで targets を最大 concurrency 件ずつ同時に巡回して結合 """
+    deadline = deadline or Deadline()
+    browser = await p.chromium.launch(headless=not show, slow_mo=slowmo)
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def _one(target, tpath, tlog):
+        async with sem:
+            return await crawl_target_async(browser, target, tpath, tlog, deadline=deadline)
+
+    try:
+        jobs = target_jobs(targets, runpath, log)
+        outcomes = await asyncio.gather(*(_one(*job) for job in jobs), return_exceptions=True)
+    finally:
+        try:
+            await browser.close()
+        except Exception:
+            pass
+
+    results, errors = [], []
+    for (t, _tp, _tl), out in zip(jobs, outcomes):
+        if isinstance(out, BaseException):
+            errors.append(out)
+            log(f"[error] {t.label} failed: {out}")
+        else:
+            results.append(out)
+    if not results and errors:
+        raise errors[-1]
+    return merge_records(results)
+
+
+async def run_once_async(show=False, slowmo=0, dry_run=False, force_mail=False,
+                         targets: Optional[List[CrawlTarget]] = None,
+                         concurrency: int = CRAWL_CONCURRENCY):
+    runpath = run_dir(DATA_DIR)
+    log = logger_factory(runpath)
+    load_dotenv()
+    force_mail = force_mail or os.getenv("FORCE_MAIL", "0") == "1"  # runner.run_once と同じ
+
+    targets = shard_targets(targets or [CrawlTarget(c, p) for c, p in CRAWL_TARGETS])  # SHARD_DAYS > 0 なら日付ウィンドウごとに
+    concurrency = shard_concurrency(targets, concurrency)
+    activate_shards(ShardRun() if any(t.window is not None for t in targets) else None)
+    log(f"[start] engine=async show={show} slowmo={slowmo} dry_run={dry_run} "
+        f"targets={[t.label for t in targets]} concurrency={concurrency}")
+
+    from playwright.async_api import async_playwright
+
+    tracer = Tracer(log)
+    activate(tracer)
+    deadline = Deadline()
+    store = open_store(DATA_DIR)
+    pages = PageCache.open_for(DATA_DIR)
+    try:
+        with span("run", cat="run"):
+            # 速報は別スレッドで送るのでイベントループは止まらない
+            early = EarlyNotifier.start_for(store, dry_run, log, force_mail=force_mail)
+            try:
+                async with async_playwright() as p:
+                    with span("crawl", cat="run"):
+                        extracted = await crawl_targets_async(p, targets, runpath, log, show=show, slowmo=slowmo,
+                                                              concurrency=concurrency, deadline=deadline)
+            finally:
+                if early is not None:
+                    await asyncio.to_thread(early.stop)
+
+            # 差分・通知（SMTP はブロッキングなのでスレッドで）
+            with span("finalize", cat="run"):
+                await asyncio.to_thread(finalize, extracted, dry_run, force_mail, store,
+                                        early.alerted if early is not None else None)
+    finally:
+        activate(None)
+        activate_shards(None)
+        if pages is not None:
+            pages.finish(log)
+            activate_pages(None)
+        log(deadline.summary(), event="budget", obj=deadline.stats())
+        write_timings(tracer, runpath, log)
+        sweep_after_run(DATA_DIR, runpath, log)
+        log.close()
+    return 0
+
+
+def run_once(**kwargs) -> int:
+    """ 同期の呼び出し口（runner.main から使う） """
+    return asyncio.run(run_once_async(**kwargs))
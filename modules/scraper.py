@@ -1,8 +1,14 @@
 # modules/scraper.py
 import re
-from typing import List, Dict, Tuple, Optional
+import sys
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Callable, List, Dict, Tuple, Optional
 
-Record = Dict[str, str]
+from .const import PARSER_BACKEND
+from .utils import Slot
+
+Record = Slot  # 抽出結果1件（date/time/facility は Slot.to_record() で dict に）
 
 _TIME_RE = re.compile(r'^\d{1,2}:\d{2}$')
 
@@ -14,7 +20,10 @@ def _iso_from_header(html: str) -> str:
     m = re.search(r'<h3>\s*<span>\s*([^<]+?)\s*</span>\s*</h3>', html)
     if not m:
         return ""
-    text = m.group(1)
+    return _iso_from_era_text(m.group(1))
+
+def _iso_from_era_text(text: str) -> str:
+    """ "令和07年10月04日(土)" → "2025-10-04"。読めなければ "" """
     # "令和07年10月04日(土)" -> era, yy, mm, dd
     m2 = re.search(r'(令和|平成|昭和)\s*(\d{1,2})年\s*(\d{1,2})月\s*(\d{1,2})日', text)
     if not m2:
@@ -52,7 +61,10 @@ def _parse_time_label_from_header_fragment(th_html: str) -> Tuple[str, str]:
     """
     <th ...>11:00<br>～<br>13:00</th> などから ("11:00", "13:00")
     """
-    txt = _strip_html(th_html)
+    return _parse_time_label_from_text(_strip_html(th_html))
+
+def _parse_time_label_from_text(txt: str) -> Tuple[str, str]:
+    """ 空白除去済みの "11:00～13:00" から ("11:00", "13:00")。取れなければ ("", "") """
     if "～" in txt:
         s, e = txt.split("～", 1)
         s, e = s.strip(), e.strip()
@@ -65,6 +77,7 @@ def _find_header_time_near(html: str, anchor_pos: int, col: int, search_back_cha
     アンカー位置（施設行の開始付近）から上方向（最大 search_back_chars）へ遡って、
     同じ col の <th id="tdX_col"> ... </th> を最後に見つかったものを採用。
     これにより、ページ内に複数ブロックがあっても、該当ブロックのヘッダーに紐づく。
+    （旧方式：○セルごとに正規表現を作って窓を再走査する。比較用に残す）
     """
     start = max(0, anchor_pos - search_back_chars)
     window = html[start:anchor_pos]
@@ -78,6 +91,39 @@ def _find_header_time_near(html: str, anchor_pos: int, col: int, search_back_cha
     th_html = last_match.group(2)
     return _parse_time_label_from_header_fragment(th_html)
 
+_HEADER_TH_RE = re.compile(r'<th[^>]+id="td(\d+)_(\d+)"[^>]*>(.*?)</th>', re.DOTALL)
+
+class _HeaderIndex:
+    """
+    ページ全体を1回だけ走査して <th id="tdX_col"> の位置を col ごとに昇順で持つ索引。
+    lookup() は _find_header_time_near と同じ規則（アンカー手前 search_back_chars 以内で
+    完全に収まる直近のヘッダー）を二分探索で解決する。
+    """
+
+    def __init__(self, html: str):
+        self._ends: Dict[int, List[int]] = {}
+        self._starts: Dict[int, List[int]] = {}
+        self._labels: Dict[int, List[Tuple[str, str]]] = {}
+        for m in _HEADER_TH_RE.finditer(html):
+            col = int(m.group(2))
+            self._ends.setdefault(col, []).append(m.end())
+            self._starts.setdefault(col, []).append(m.start())
+            self._labels.setdefault(col, []).append(_parse_time_label_from_header_fragment(m.group(3)))
+
+    def lookup(self, anchor_pos: int, col: int, search_back_chars: int = 8000) -> Tuple[str, str]:
+        ends = self._ends.get(col)
+        if not ends:
+            return "", ""
+        i = bisect_right(ends, anchor_pos) - 1
+        if i < 0 or self._starts[col][i] < max(0, anchor_pos - search_back_chars):
+            return "", ""
+        return self._labels[col][i]
+
+@lru_cache(maxsize=4096)
+def _facility_name(n1: str, n2: str) -> str:
+    """ "施設名 部屋名"（同じ組は毎ページ作り直さず、intern 済みの1つを共有） """
+    return sys.intern((n1 + " " + n2).strip())
+
 def _iter_facility_rows_with_span(html: str):
     """
     施設見出し行を抽出（マッチ位置も返す）。
@@ -92,7 +138,7 @@ def _iter_facility_rows_with_span(html: str):
         re.DOTALL
     )
     for m in tr_re.finditer(html):
-        facility = (m.group("n1") + " " + m.group("n2")).strip()
+        facility = _facility_name(m.group("n1"), m.group("n2"))
         block = m.group(1)           # <tr> ... </tr>（施設行全体）
         row_html = m.group("rest")   # 右側セル部分
         yield facility, row_html, m.start(), m.end()
@@ -131,17 +177,29 @@ def _merge_ranges(pairs: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
         out.append((cur_s, cur_e))
     return out
 
-def parse_result_html(html: str) -> List[Record]:
+def _parse_regex(html: str, header_lookup: str = "index") -> List[Record]:
     """
     方針：
       1) 日付はヘッダの和暦→ISOを最優先（なければ selectdate）。
       2) 各施設行ごとに、行のアンカー位置から“直前に出現した同じcolのヘッダー<th id="tdX_col">”を逆探索し、
          そのヘッダーに書かれた "HH:MM～HH:MM" を時刻として採用。
       3) 同一行で連続する枠は time を結合（例: 13:00–15:00 + 15:00–17:00 → 13:00–17:00）。
+
+    header_lookup:
+      "index" : ページを1回走査したヘッダー索引を二分探索（既定）
+      "scan"  : ○セルごとに直前 8000 文字を逆走査（旧方式・出力は同一）
+      ※ 旧 parse_result_html の実装（backend="regex" / "regex-scan"）
     """
     date_iso = _pick_iso_date(html)
     out: List[Record] = []
 
+    if header_lookup == "scan":
+        find_time = lambda pos, col: _find_header_time_near(html, pos, col)
+    elif header_lookup == "index":
+        find_time = _HeaderIndex(html).lookup
+    else:
+        raise ValueError(f"unknown header_lookup: {header_lookup}")
+
     for facility, row_html, row_start, _row_end in _iter_facility_rows_with_span(html):
         cols = _ok_cells(row_html)
         if not cols:
@@ -150,7 +208,7 @@ def parse_result_html(html: str) -> List[Record]:
         # 各○について、この施設行の開始位置（row_start）より手前で直近のヘッダーを探す
         time_pairs: List[Tuple[str, str]] = []
         for col in cols:
-            s, e = _find_header_time_near(html, row_start, col)
+            s, e = find_time(row_start, col)
             time_pairs.append((s, e))
 
         # 連続結合
@@ -158,9 +216,160 @@ def parse_result_html(html: str) -> List[Record]:
         for s, e in merged:
             if not (s and e):
                 continue
-            out.append({
-                "date": date_iso,            # ISOで保存（仕様）
-                "time": f"{s}–{e}",
-                "facility": facility,
-            })
+            out.append(Slot.make(date_iso, s, e, facility))
+    return out
+
+
+# ===== lxml バックエンド =====
+_TD_ID_RE = re.compile(r'td\d+_(\d+)$')
+_OK_TD_XPATH = 'td[contains(concat(" ", normalize-space(@class), " "), " ok ")][.//img[@alt="O"]]'
+
+def _lxml_facility(tr) -> Optional[str]:
+    """ 先頭セルが <th><strong>施設名</strong><br>部屋名</th> の行なら施設名を返す """
+    first = next((c for c in tr if isinstance(c.tag, str)), None)
+    if first is None or first.tag != "th":
+        return None
+    strong = first.find("strong")
+    br = first.find("br")
+    if strong is None or br is None:
+        return None
+    n1, n2 = strong.text or "", br.tail or ""
+    if not (n1 and n2):
+        return None
+    return _facility_name(n1, n2)
+
+_XML_DECL_RE = re.compile(r"^\s*<\?xml[^>]*\?>")
+
+
+class ParseError(ValueError):
+    """ バックエンドがページを読めなかった（parse_result_html が regex で読み直す） """
+
+def _parse_lxml(html: str) -> List[Record]:
+    """
+    lxml の DOM を文書順に1回だけ辿る：
+      - <th id="tdX_col"> を見るたび col → (start, end) を更新（＝直前のヘッダー）
+      - 施設行 <tr> では td.ok（img[alt=O] を含む）の col を XPath で拾い、その時点のヘッダーで時刻を引く
+    regex 版と違い 8000 文字の遡り上限や属性の書き方（<tr class=...> 等）には依存しない。
+    """
+    from lxml import etree, html as lxml_html
+
+    date_iso = _pick_iso_date(html)
+    try:
+        # str に <?xml encoding=...?> があると lxml は ValueError にするので宣言だけ落とす
+        root = lxml_html.document_fromstring(_XML_DECL_RE.sub("", html, count=1))
+    except (etree.ParserError, ValueError) as e:
+        # 空きゼロと区別できなくなるので [] にはしない：呼び出し側が regex で読み直す
+        raise ParseError(f"lxml parse failed ({e})") from e
+
+    out: List[Record] = []
+    headers: Dict[int, Tuple[str, str]] = {}
+    ok_tds = etree.XPath(_OK_TD_XPATH)
+
+    for el in root.iter("tr", "th"):
+        if el.tag == "th":
+            m = _TD_ID_RE.match(el.get("id") or "")
+            if m:
+                txt = re.sub(r"\s+", "", "".join(el.itertext()))
+                headers[int(m.group(1))] = _parse_time_label_from_text(txt)
+            continue
+
+        facility = _lxml_facility(el)
+        if facility is None:
+            continue
+        cols = sorted(
+            int(m.group(1))
+            for m in (_TD_ID_RE.match(td.get("id") or "") for td in ok_tds(el))
+            if m
+        )
+        if not cols:
+            continue
+
+        merged = _merge_ranges([headers.get(col, ("", "")) for col in cols])
+        for s, e in merged:
+            if not (s and e):
+                continue
+            out.append(Slot.make(date_iso, s, e, facility))
     return out
+
+
+# ===== バックエンド登録 =====
+Parser = Callable[[str], List[Record]]
+
+PARSERS: Dict[str, Parser] = {
+    "regex": _parse_regex,
+    "regex-scan": lambda html: _parse_regex(html, header_lookup="scan"),
+    "lxml": _parse_lxml,
+}
+
+def register_parser(name: str, fn: Parser) -> None:
+    """ 追加のバックエンドを名前で登録（config.toml [parser] backend / ENV PARSER_BACKEND で選択） """
+    PARSERS[name] = fn
+
+def get_parser(backend: Optional[str] = None) -> Parser:
+    name = backend or PARSER_BACKEND
+    try:
+        return PARSERS[name]
+    except KeyError:
+        raise ValueError(f"unknown parser backend: {name} (available: {', '.join(PARSERS)})") from None
+
+def parse_result_html(html: str, backend: Optional[str] = None, log=None) -> List[Record]:
+    """
+    結果ページ HTML → [Slot(date, start, end, facility), ...]
+    backend 未指定なら設定（PARSER_BACKEND、既定 "regex"）を使う。
+    バックエンドが ParseError を出したら regex で読み直し、log（なければ print）に警告を出す。
+    """
+    try:
+        return get_parser(backend)(html)
+    except ParseError as e:
+        if log is None:
+            print(f"[warn] {e} -> regex で解析")
+        else:
+            log(f"[warn] {e} -> regex で解析", level="warn", event="parser")
+        return _parse_regex(html)
+
+def compare_backends(html: str, a: str = "regex", b: str = "lxml") -> Tuple[List[Record], List[Record]]:
+    """ 2つのバックエンドの出力差分を返す：(a にだけある, b にだけある) """
+    ra, rb = parse_result_html(html, a), parse_result_html(html, b)
+    return [r for r in ra if r not in rb], [r for r in rb if r not in ra]
+
+
+if __name__ == "__main__":
+    # 保存済み result-page-*.html で全バックエンドの一致確認と所要時間を比較
+    #   python -m modules.scraper data/run-*/result-page-*.html   （ファイル or run ディレクトリ）
+    import sys, time
+    from pathlib import Path
+    from .artifacts import iter_result_pages, read_snapshot
+
+    paths, pages = [], []
+    for a in [Path(a) for a in sys.argv[1:]] or sorted(Path("data").glob("run-*")):
+        if a.is_dir():
+            for name, html in iter_result_pages(a):
+                paths.append(a / name)
+                pages.append(html)
+        else:
+            paths.append(a)
+            pages.append(read_snapshot(a))
+    if not pages:
+        print("no result-page-*.html found")
+        raise SystemExit(1)
+
+    elapsed = {}
+    results = {}
+    for name in PARSERS:
+        t0 = time.perf_counter()
+        results[name] = [parse_result_html(h, name) for h in pages]
+        elapsed[name] = time.perf_counter() - t0
+
+    base = "regex-scan"
+    n_rec = sum(len(r) for r in results[base])
+    print(f"pages={len(pages)} records={n_rec}")
+    failed = False
+    for name in PARSERS:
+        mismatch = [str(p) for p, a, b in zip(paths, results[base], results[name]) if a != b]
+        speedup = elapsed[base] / elapsed[name] if elapsed[name] > 0 else 0.0
+        print(f"  {name:10s}: {elapsed[name]*1000:9.1f} ms  x{speedup:.1f}  mismatch={len(mismatch)}")
+        for p in mismatch[:5]:
+            print(f"    {p}")
+        failed = failed or bool(mismatch)
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,67 @@
+# modules/session.py — セッションのウォームスタート
+#
+# 検索まで通ったセッションの storage_state（Cookie 等）と、準備済み検索フォーム
+# （gml_z_group_sel_1）の URL を data/session.json に残す。次回はその状態でコンテキストを作り、
+# gin_menu → 多機能操作 → 空き状況の確認 を飛ばしてフォームへ直接入る。
+# サイトに拒否されたら（アクセス権限がありません 等）破棄して通常の経路に戻す。
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from .const import ROOT, ERROR_PAGE_TEXTS, SESSION_WARM_START, SESSION_MAX_AGE_MIN
+
+SESSION_PATH = ROOT / "data" / "session.json"
+_lock = threading.Lock()
+
+
+def load_session() -> Optional[dict]:
+    """ 有効期限内の保存セッション {"form_url", "saved_at", "state"} を返す。なければ None """
+    if not SESSION_WARM_START or not SESSION_PATH.exists():
+        return None
+    try:
+        data = json.loads(SESSION_PATH.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    if time.time() - float(data.get("saved_at", 0)) > SESSION_MAX_AGE_MIN * 60:
+        return None
+    if not data.get("form_url") or not isinstance(data.get("state"), dict):
+        return None
+    return data
+
+
+def save_session(ctx, form_url: str):
+    """ 検索が通った直後に呼ぶ。複数スレッドから呼ばれても壊れないよう置き換えで書く """
+    if not SESSION_WARM_START or not form_url:
+        return
+    data = {"form_url": form_url, "saved_at": time.time(), "state": ctx.storage_state()}
+    with _lock:
+        SESSION_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp = SESSION_PATH.with_name(f"{SESSION_PATH.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, SESSION_PATH)
+
+
+def clear_session(rejected: Optional[dict] = None):
+    """
+    保存セッションを消す。rejected（拒否された load_session() の戻り値）を渡したときは、
+    ファイルがまだその状態のときだけ消す（並行する target が保存し直した新しいセッションは残す）。
+    """
+    with _lock:
+        try:
+            if rejected is not None:
+                cur = json.loads(SESSION_PATH.read_text(encoding="utf-8"))
+                if cur.get("saved_at") != rejected.get("saved_at"):
+                    return
+            SESSION_PATH.unlink()
+        except FileNotFoundError:
+            pass
+        except ValueError:  # 書きかけ・壊れたファイルは消してよい
+            SESSION_PATH.unlink(missing_ok=True)
+
+
+def is_rejected(html: str) -> bool:
+    """ サイトがセッションを受け付けなかった画面か """
+    return any(t in html for t in ERROR_PAGE_TEXTS)
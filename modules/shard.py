@@ -0,0 +1,158 @@
+# modules/shard.py — 検索を日付ウィンドウに分けて並列に巡回する（SHARD_DAYS > 0）
+#
+# 1回の検索は開始日（formDate の hidden 'selectdate'）から1ページ1日で続くので、
+# 開始日を offset 日ずらした検索を複数作り、それぞれ別コンテキストで巡回すれば
+# 所要時間はページ数ではなく並列数で割れる。
+#   - ウィンドウ i は [基準日 + i*days, 基準日 + (i+1)*days)。最後のウィンドウは終わり（『次へ』なし）まで
+#   - 基準日はフォームにもともと入っている selectdate（各ウィンドウが自分で読む）
+#   - ページの日付が終わりに達したらそのウィンドウは打ち切り、開始日より前のページは読まずに送る
+#   - サイトが selectdate を無視していると分かったら（開始日より前のページが出たら）その実行の分割をやめる：
+#     最初のウィンドウが終わりまで読み（もう終わっていれば見つけたウィンドウが続きを引き継ぐ）、
+#     ほかのウィンドウはそこで止める。各ウィンドウが先頭からページ送りし直す無駄を繰り返さない
+# 結果の結合・重複排除は runner.merge_records（(date, time, facility)）。
+from __future__ import annotations
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional
+
+JS_SELECTDATE = """(v) => {
+    const el = document.querySelector("form[name='formDate'] input[name='selectdate']")
+        || document.querySelector("input[name='selectdate']");
+    if (!el) return null;
+    if (v) el.value = v;
+    return el.value;
+}"""
+
+
+class DateWindow(NamedTuple):
+    """ 基準日からの相対日数で表したウィンドウ（days=None は終わりまで） """
+    offset: int = 0
+    days: Optional[int] = None
+
+    @property
+    def label(self) -> str:
+        return f"d{self.offset}-" + ("" if self.days is None else str(self.offset + self.days))
+
+
+class Bounds(NamedTuple):
+    """ ウィンドウの実際の日付（ISO。end は含まない、None は上限なし） """
+    start: str
+    end: Optional[str]
+
+    def position(self, day: str) -> int:
+        """ day がウィンドウの前なら -1、中なら 0、後なら 1（日付不明は 0 として扱う） """
+        if not day:
+            return 0
+        if day < self.start:
+            return -1
+        if self.end is not None and day >= self.end:
+            return 1
+        return 0
+
+
+def date_windows(days: int, windows: int) -> List[DateWindow]:
+    """ days 日ずつ windows 個（最後は終わりまで）。days <= 0 なら分割しない（空リスト） """
+    if days <= 0 or windows <= 1:
+        return []
+    return [DateWindow(i * days, days if i < windows - 1 else None) for i in range(windows)]
+
+
+def _bounds(base: str, w: DateWindow) -> Optional[Bounds]:
+    try:
+        d0 = datetime.strptime(base.strip(), "%Y%m%d") + timedelta(days=w.offset)
+    except ValueError:
+        return None
+    end = None if w.days is None else (d0 + timedelta(days=w.days)).strftime("%Y-%m-%d")
+    return Bounds(d0.strftime("%Y-%m-%d"), end)
+
+
+def apply_window(f, w: DateWindow, log) -> Optional[Bounds]:
+    """
+    検索前のフォームの selectdate を基準日 + offset に書き換えて Bounds を返す。
+    selectdate が見つからない・読めなければ None（呼び出し側で扱いを決める）。
+    """
+    try:
+        b = _bounds(f.evaluate(JS_SELECTDATE) or "", w)
+        if b is not None:
+            f.evaluate(JS_SELECTDATE, b.start.replace("-", ""))
+    except Exception as e:
+        log(f"[warn] date window {w.label}: selectdate を設定できません: {e}", level="warn")
+        return None
+    return b
+
+
+async def apply_window_async(f, w: DateWindow, log) -> Optional[Bounds]:
+    try:
+        b = _bounds(await f.evaluate(JS_SELECTDATE) or "", w)
+        if b is not None:
+            await f.evaluate(JS_SELECTDATE, b.start.replace("-", ""))
+    except Exception as e:
+        log(f"[warn] date window {w.label}: selectdate を設定できません: {e}", level="warn")
+        return None
+    return b
+
+
+class _Search(NamedTuple):
+    """ ShardRun が target（分類1 × 目的）ごとに持つ状態 """
+    disabled: bool = False        # サイトが selectdate を使っていないと分かった
+    first_end: Optional[str] = None  # 最初のウィンドウが読み終えた終わりの日付
+    taker: Optional[DateWindow] = None  # 最初のウィンドウの続きを引き継いだウィンドウ
+
+
+class ShardRun:
+    """
+    1回の実行で、同じ target のウィンドウどうしが共有する状態（スレッド・タスクをまたぐのでロックで守る）。
+    サイトが selectdate を使っていないと分かったら、その target の分割をやめる。
+    key は target のウィンドウを除いたラベル（"分類1/目的"）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._searches: Dict[str, _Search] = {}
+
+    def skip(self, key: str, w: DateWindow) -> bool:
+        """ 検索を始める前に：分割をやめた target の2番目以降のウィンドウは何もしない """
+        with self._lock:
+            st = self._searches.get(key, _Search())
+            return st.disabled and w.offset > 0  # 続きは最初のウィンドウか引き継いだウィンドウが読む
+
+    def adjust(self, key: str, w: DateWindow, b: Bounds, pos: int, log) -> Optional[Bounds]:
+        """
+        ページがウィンドウの外（pos != 0）だったときの続け方。戻り値の Bounds で続ける（None ならここで止める）。
+          - 最初のウィンドウが終わりに達した：分割をやめていれば上限を外して続ける
+          - 2番目以降が開始日より前のページを見た：分割をやめる。最初のウィンドウが終わっていれば
+            その終わりから上限なしで引き継ぎ、まだ巡回中なら最初のウィンドウに任せて止める
+        """
+        with self._lock:
+            st = self._searches.get(key, _Search())
+            if w.offset == 0:
+                if pos > 0:
+                    if st.disabled:
+                        return Bounds(b.start, None)
+                    self._searches[key] = st._replace(first_end=b.end)
+                return b
+            if pos > 0 or st.taker == w:
+                return b  # 自分の終わり／引き継いだ後の読み飛ばし
+            if not st.disabled:
+                st = st._replace(disabled=True)
+                log(f"[warn] date window {w.label}: 開始日より前のページが出たため、{key} の分割をやめる"
+                    "（サイトが selectdate を使っていない）", level="warn", event="shard",
+                    obj={"target": key, "window": w.label, "disabled": True})
+            if st.first_end is not None and st.taker is None:
+                self._searches[key] = st._replace(taker=w)
+                return Bounds(st.first_end, None)
+            self._searches[key] = st
+            return None
+
+
+_active: Optional[ShardRun] = None  # 巡回スレッドから見えるようにモジュール変数で持つ
+
+
+def activate(run: Optional[ShardRun]):
+    """ 以後のウィンドウが共有する ShardRun（None で無効化：各ウィンドウは単独で判断） """
+    global _active
+    _active = run
+
+
+def current() -> Optional[ShardRun]:
+    return _active
@@ -0,0 +1,146 @@
+# modules/stream.py — 巡回中のレコードを流して、新規をその場で速報する
+#
+# ページを抽出し終えるたび（CrawlCheckpoint.add）publish() でここへ流し、
+# 別スレッドの EarlyNotifier が RecordStream から受け取って prev と突き合わせる。
+# 巡回（ブラウザ操作）は止めずに、1ページ目で見つかった空きを巡回の終わりを待たずに知らせる。
+#   - 速報のモードは EARLY_NOTIFY（"off" / "first" / "interval"）
+#   - 巡回後の finalize では速報済みを除いた新規だけを「まとめ」で送る（同じ枠を二度知らせない）
+# 有効な stream がなければ publish は何もしない（replay やライブラリ利用時）。
+from __future__ import annotations
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+from .const import EARLY_NOTIFY, EARLY_NOTIFY_SEC
+from .diffstore import DiffStore, Record
+from .utils import Slot
+from .notifier import send_mail
+from .trace import span
+
+_END = object()
+_active: Optional["RecordStream"] = None  # 巡回スレッドから見えるようにモジュール変数で持つ
+
+
+class RecordStream:
+    """ ページ単位の抽出結果を届いた順に渡すキュー。for rec in stream でレコードを1件ずつ取り出せる """
+
+    def __init__(self):
+        self._q: "queue.Queue" = queue.Queue()
+
+    def put(self, recs: List[Record]):
+        self._q.put(list(recs))
+
+    def close(self):
+        self._q.put(_END)
+
+    def batches(self, tick_sec: Optional[float] = None) -> Iterator[List[Record]]:
+        """ ページ単位のリストを close() まで。tick_sec ごとに空リストも返す（時間で区切る側のため） """
+        while True:
+            try:
+                item = self._q.get(timeout=tick_sec)
+            except queue.Empty:
+                yield []
+                continue
+            if item is _END:
+                return
+            yield item
+
+    def __iter__(self) -> Iterator[Record]:
+        for batch in self.batches():
+            yield from batch
+
+
+def activate(stream: Optional[RecordStream]):
+    """ 以後の publish() の送り先（None で無効化） """
+    global _active
+    _active = stream
+
+
+def publish(recs: List[Record]):
+    """ 有効な stream があれば1ページ分のレコードを流す。なければ何もしない """
+    s = _active
+    if s is not None and recs:
+        s.put(recs)
+
+
+class EarlyNotifier:
+    """
+    RecordStream を別スレッドで読み、prev にない枠を速報する。
+    速報した枠は alerted に残り、finalize のまとめからは除かれる。
+    """
+
+    def __init__(self, store: DiffStore, mode: str = EARLY_NOTIFY, interval_sec: float = EARLY_NOTIFY_SEC,
+                 dry_run: bool = False, log=print):
+        if mode not in ("first", "interval"):
+            raise ValueError(f"unknown early notify mode: {mode}")
+        self.store = store
+        self.mode = mode
+        self.interval_sec = float(interval_sec)
+        self.dry_run = dry_run
+        self.log = log
+        self.stream = RecordStream()
+        self.alerted: Dict[Slot, Record] = {}  # 速報済み（キー → レコード）
+        self._seen = set()               # この実行で新規と判定済みのキー（target をまたいだ重複も除く）
+        self._pending: List[Record] = []  # 新規だがまだ速報していない
+        self._last: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def start_for(cls, store: DiffStore, dry_run: bool, log, force_mail: bool = False) -> Optional["EarlyNotifier"]:
+        """ 設定で有効なら起動して返す。"off" や強制送信（全件を最後に送る）のときは None """
+        if EARLY_NOTIFY == "off" or force_mail:
+            return None
+        n = cls(store, dry_run=dry_run, log=log)
+        n.start()
+        return n
+
+    def start(self):
+        activate(self.stream)
+        self._thread = threading.Thread(target=self._run, name="early-notify", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ 巡回が終わったら呼ぶ。未速報の分は送らずに finalize のまとめへ回す """
+        activate(None)
+        self.stream.close()
+        if self._thread is not None:
+            self._thread.join()
+        if self.alerted or self._pending:
+            self.log(f"[notify] 速報 {len(self.alerted)}件 / 未速報 {len(self._pending)}件（まとめで送信）",
+                     event="early_notify", obj={"alerted": len(self.alerted), "pending": len(self._pending)})
+
+    def _run(self):
+        tick = self.interval_sec if self.mode == "interval" else None
+        for batch in self.stream.batches(tick):
+            try:
+                self.feed(batch)
+            except Exception as e:
+                self.log(f"[warn] early notify failed: {e}", level="warn")
+
+    def feed(self, batch: List[Record]):
+        for r in self.store.diff(batch):
+            k = DiffStore._key(r)
+            if k not in self._seen:
+                self._seen.add(k)
+                self._pending.append(r)
+        if self._pending and self._due():
+            self._send()
+
+    def _due(self) -> bool:
+        if self._last is None:
+            return True  # 最初の新規はすぐ
+        return self.mode == "interval" and time.monotonic() - self._last >= self.interval_sec
+
+    def _send(self):
+        recs, self._pending = self._pending, []
+        try:
+            with span("early_notify", cat="notify", n=len(recs)):
+                send_mail(recs, dry_run=self.dry_run, kind="速報")
+        except Exception:
+            self._pending = recs + self._pending  # 次の機会（なければまとめ）で送る
+            raise
+        self._last = time.monotonic()
+        for r in recs:
+            self.alerted[DiffStore._key(r)] = r
+        self.log(f"[notify] 速報 {len(recs)}件", event="early_notify", obj={"sent": len(recs)})
@@ -0,0 +1,137 @@
+# modules/trace.py — 手順ごとの所要時間（span）と Chrome trace 出力
+#
+# run_once などで Tracer を有効にすると、span("prepare_form") 等で囲んだ区間が
+#   - log.jsonl（event="span"、level="debug" なのでコンソールには出さない）
+#   - run ディレクトリの timings.json（手順別の合計・p50/p95、ページ時間、全体）
+#   - run ディレクトリの trace.json（chrome://tracing / https://ui.perfetto.dev で開ける）
+# に残る。有効な Tracer がなければ span は何もしない（replay やライブラリ利用時）。
+from __future__ import annotations
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+TIMINGS_JSON = "timings.json"
+TRACE_JSON = "trace.json"
+
+_active: Optional["Tracer"] = None  # スレッドをまたいで見えるようにモジュール変数で持つ
+_track: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_track", default=None)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """ 最近傍順位法（件数が少なくても実在した値を返す） """
+    if not values:
+        return 0.0
+    v = sorted(values)
+    k = max(0, min(len(v) - 1, math.ceil(q / 100 * len(v)) - 1))
+    return v[k]
+
+
+def _stats(values: List[float]) -> dict:
+    return {
+        "n": len(values),
+        "total_ms": round(sum(values), 1),
+        "p50_ms": round(_percentile(values, 50), 1),
+        "p95_ms": round(_percentile(values, 95), 1),
+        "max_ms": round(max(values), 1) if values else 0.0,
+    }
+
+
+class Tracer:
+    """ 1回の実行ぶんの span を集める。スレッド・asyncio タスクのどちらからでも使える """
+
+    def __init__(self, log=None):
+        self.log = log
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._events: List[dict] = []
+        self._tracks: Dict[str, int] = {}     # トラック名 → trace 上の tid
+        self._durations: Dict[str, List[float]] = {}
+
+    def _tid(self) -> int:
+        # track() で名前を付けた区間はその名前ごと、なければスレッドごとに1段
+        name = _track.get() or threading.current_thread().name
+        with self._lock:
+            if name not in self._tracks:
+                self._tracks[name] = len(self._tracks) + 1
+            return self._tracks[name]
+
+    def record(self, name: str, start: float, end: float, cat: str = "crawl", **args):
+        ms = (end - start) * 1000
+        ev = {
+            "name": name, "cat": cat, "ph": "X", "pid": os.getpid(), "tid": self._tid(),
+            "ts": round((start - self._t0) * 1e6), "dur": round((end - start) * 1e6),
+        }
+        if args:
+            ev["args"] = args
+        with self._lock:
+            self._events.append(ev)
+            self._durations.setdefault(name, []).append(ms)
+        if self.log is not None:
+            self.log(f"[span] {name} {ms:.0f}ms", level="debug", event="span",
+                     obj={"name": name, "ms": round(ms, 1), "track": _track.get(), **args})
+
+    @contextmanager
+    def span(self, name: str, cat: str = "crawl", **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter(), cat, **args)
+
+    def timings(self) -> dict:
+        with self._lock:
+            durations = {k: list(v) for k, v in self._durations.items()}
+        total = durations.get("run", [])
+        return {
+            "total_ms": round(sum(total), 1) if total else round((time.perf_counter() - self._t0) * 1000, 1),
+            "pages": _stats(durations.get("page", [])),
+            "spans": {k: _stats(v) for k, v in sorted(durations.items())},
+        }
+
+    def write(self, runpath: Path) -> dict:
+        """ timings.json と trace.json を書いて timings を返す """
+        timings = self.timings()
+        with self._lock:
+            meta = [
+                {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                for name, tid in self._tracks.items()
+            ]
+            events = meta + list(self._events)
+        (runpath / TIMINGS_JSON).write_text(json.dumps(timings, ensure_ascii=False, indent=2), encoding="utf-8")
+        (runpath / TRACE_JSON).write_text(
+            json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, ensure_ascii=False), encoding="utf-8"
+        )
+        return timings
+
+
+def activate(tracer: Optional[Tracer]):
+    """ 以後の span() の記録先（None で無効化） """
+    global _active
+    _active = tracer
+
+
+@contextmanager
+def span(name: str, cat: str = "crawl", **args):
+    """ 有効な Tracer があれば区間を記録する。なければ何もしない """
+    t = _active
+    if t is None:
+        yield
+        return
+    with t.span(name, cat, **args):
+        yield
+
+
+@contextmanager
+def track(name: str):
+    """ この中の span を trace 上で name の段にまとめる（target ごと等） """
+    token = _track.set(name)
+    try:
+        yield
+    finally:
+        _track.reset(token)
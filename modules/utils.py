@@ -1,6 +1,7 @@
-import re, unicodedata, hashlib, json
+import re, sys, unicodedata, hashlib, json
 from datetime import datetime
-from dataclasses import dataclass, asdict
+from functools import lru_cache
+from typing import NamedTuple
 
 WAVE_CHARS = r"[–—―〜～-]"
 
@@ -10,6 +11,7 @@ def nfkc(s: str) -> str:
 def squeeze_ws(s: str) -> str:
     return re.sub(r"\s+", " ", s).strip()
 
+@lru_cache(maxsize=4096)  # 施設名などは毎ページ同じ文字列が来る
 def norm_text(s: str) -> str:
     return squeeze_ws(nfkc(s))
 
@@ -37,18 +39,67 @@ def extract_times(s: str):
     m = re.search(r"(\d{1,2}:\d{2})～(\d{1,2}:\d{2})", t)
     return m.groups() if m else (None, None)
 
+@lru_cache(maxsize=4096)
 def facility_id(name: str) -> str:
     return "hash:" + hashlib.md5(norm_text(name).encode("utf-8")).hexdigest()[:8]
 
-@dataclass(frozen=True)
-class SlotKey:
-    date_iso: str
-    start: str
-    end: str
-    facility_id: str
+# ===== 空き枠レコード =====
+@lru_cache(maxsize=None)  # "HH:MM" は高々 1440 通り
+def hhmm_to_min(s: str) -> int:
+    """ "9:30" / "09:30" → 570。読めなければ -1 """
+    h, _, m = (s or "").partition(":")
+    return int(h) * 60 + int(m) if h.isdigit() and m.isdigit() else -1
 
-def record_to_key(rec: dict) -> SlotKey:
-    return SlotKey(rec["date_iso"], rec["start"], rec["end"], rec["facility_id"])
+def min_to_hhmm(n: int) -> str:
+    """ 570 → "9:30"（サイトのヘッダーと同じく時は0埋めしない：prev.json・メールの文字列を変えない） """
+    return f"{n // 60}:{n % 60:02d}" if n >= 0 else ""
+
+@lru_cache(maxsize=4096)
+def iso_to_int(iso: str) -> int:
+    """ "2025-10-04" → 20251004。空・読めなければ 0 """
+    d = (iso or "").replace("-", "")
+    return int(d) if len(d) == 8 and d.isdigit() else 0
+
+def int_to_iso(n: int) -> str:
+    return f"{n // 10000:04d}-{n // 100 % 100:02d}-{n % 100:02d}" if n else ""
+
+class Slot(NamedTuple):
+    """
+    空き枠1つ（抽出 → 差分 → 通知 で共通）。
+    日付は YYYYMMDD の int、時刻は 0:00 からの分、施設名は intern 済みの文字列。
+    タプルなのでそのまま差分キーになり、比較・ハッシュは int 3つと共有文字列だけで済む。
+    """
+    date: int
+    start: int
+    end: int
+    facility: str
+
+    @classmethod
+    def make(cls, date_iso: str, start: str, end: str, facility: str) -> "Slot":
+        return cls(iso_to_int(date_iso), hhmm_to_min(start), hhmm_to_min(end), sys.intern(facility))
+
+    @classmethod
+    def from_record(cls, rec: dict) -> "Slot":
+        """ prev.json 等の dict（{"date","time","facility"}。旧 "date_iso" も可）から """
+        s, _, e = (rec.get("time") or "").partition("–")
+        return cls.make(rec.get("date_iso") or rec.get("date", ""), s, e, rec.get("facility", ""))
+
+    @property
+    def date_iso(self) -> str:
+        return int_to_iso(self.date)
+
+    @property
+    def time(self) -> str:
+        return f"{min_to_hhmm(self.start)}–{min_to_hhmm(self.end)}"
+
+    def to_record(self) -> dict:
+        """ JSON・ログ用の dict（prev.json と同じ形） """
+        return {"date": self.date_iso, "time": self.time, "facility": self.facility}
+
+SlotKey = Slot  # 旧名
+
+def record_to_key(rec: dict) -> Slot:
+    return Slot.from_record(rec)
 
 def json_dumps(obj) -> str:
     return json.dumps(obj, ensure_ascii=False, indent=2)
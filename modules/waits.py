@@ -0,0 +1,219 @@
+# modules/waits.py — 固定スリープの代わりの条件待ち
+#
+# 「0.3 秒寝る」ではなく、フレームの遷移完了・選択肢の反映・hidden の u_yobi 書き換え など
+# 具体的な条件を待ち、実際に待った時間を log.jsonl（event="wait"）に残す。
+# マナーとしての間隔（INITIAL_/PAGE_SLEEP_MS_*）は flow.sleep_rand で別に明示的に入れる。
+from __future__ import annotations
+import asyncio
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from .const import STEP_TIMEOUT_SEC
+
+if TYPE_CHECKING:
+    from .deadline import Deadline
+
+POLL_MS = 50  # until() の確認間隔
+CONFIRM_WAIT_MS = 3000  # confirm()：来ないかもしれない遷移と、その後の反映を待つ上限
+
+# 選択中の option の文言に label が含まれるか（確定後の反映確認）
+JS_SELECTED_LABEL = """(label) => Array.from(document.querySelectorAll('select')).some(
+    s => s.selectedIndex >= 0 && (s.options[s.selectedIndex].text || '').includes(label))"""
+
+# hidden の u_yobi が prev から書き換わったか
+JS_YOBI_CHANGED = """(prev) => {
+    const e = document.querySelector("form[name='formDate'] input[name='u_yobi']");
+    return !e || e.value !== prev;
+}"""
+JS_YOBI_VALUE = """() => {
+    const e = document.querySelector("form[name='formDate'] input[name='u_yobi']");
+    return e ? e.value : null;
+}"""
+
+
+class _NoNavigation(Exception):
+    """ action が何もしなかった（押せなかった）ので遷移を待たない """
+
+
+def _is_timeout(e: Exception) -> bool:
+    # playwright を import せずに TimeoutError を見分ける（sync/async どちらも同名）
+    return type(e).__name__ == "TimeoutError"
+
+
+class Waiter:
+    """
+    1回の巡回ぶんの条件待ち。step ごとの実測を log に出し、集計も持つ。
+    待ちがタイムアウトしても例外にはせず（ok=False を記録して）続行し、後段の操作に判断を任せる。
+    deadline があれば、待ちもクリック等の timeout も実行全体の残り時間で頭打ちにする。
+    """
+
+    def __init__(self, log=None, timeout_ms: Optional[int] = None, deadline: Optional["Deadline"] = None):
+        self.log = log
+        self.timeout_ms = int(timeout_ms or STEP_TIMEOUT_SEC * 1000)
+        self.deadline = deadline
+        self.samples: Dict[str, List[float]] = {}
+
+    def timeout(self, ms: Optional[float] = None) -> int:
+        """ Playwright に渡す timeout（既定は STEP_TIMEOUT_SEC）。deadline の残りで頭打ち """
+        ms = self.timeout_ms if ms is None else ms
+        return self.deadline.ms(ms) if self.deadline is not None else int(ms)
+
+    def _record(self, step: str, t0: float, ok: bool, **extra) -> float:
+        ms = (time.perf_counter() - t0) * 1000
+        self.samples.setdefault(step, []).append(ms)
+        if self.log is not None:
+            self.log(f"[wait] {step}: {ms:.0f}ms{'' if ok else ' (timeout)'}",
+                     level="debug" if ok else "warn", event="wait",
+                     obj={"step": step, "ms": round(ms, 1), "ok": ok, **extra})
+        return ms
+
+    def until(self, step: str, predicate: Callable[[], bool], timeout_ms: Optional[int] = None) -> bool:
+        """ predicate() が真になるまで POLL_MS 間隔で確認（複数フレームにまたがる条件用） """
+        t0 = time.perf_counter()
+        deadline = t0 + self.timeout(timeout_ms) / 1000
+        while True:
+            try:
+                if predicate():
+                    self._record(step, t0, True)
+                    return True
+            except Exception:
+                pass
+            if time.perf_counter() >= deadline:
+                self._record(step, t0, False)
+                return False
+            time.sleep(POLL_MS / 1000)
+
+    def js(self, step: str, frame, expression: str, arg=None, timeout_ms: Optional[int] = None) -> bool:
+        """ フレーム内の JS 条件が真になるまで（ブラウザ側で待つので往復しない） """
+        t0 = time.perf_counter()
+        try:
+            frame.wait_for_function(expression, arg=arg, timeout=self.timeout(timeout_ms))
+        except Exception as e:
+            if not _is_timeout(e):
+                raise
+            self._record(step, t0, False)
+            return False
+        self._record(step, t0, True)
+        return True
+
+    def navigation(self, step: str, frame, action: Callable[[], Optional[bool]]) -> bool:
+        """
+        action()（クリック等）で frame（page でも可）が遷移し終わるまで待つ。
+        action() が False を返したら押せなかったとみなして待たずに False。
+        """
+        t0 = time.perf_counter()
+        try:
+            with frame.expect_navigation(wait_until="domcontentloaded", timeout=self.timeout()):
+                if action() is False:
+                    raise _NoNavigation()
+        except _NoNavigation:
+            return False
+        except Exception as e:
+            if not _is_timeout(e):
+                raise
+            self._record(step, t0, False)
+            return True  # 押せてはいる
+        self._record(step, t0, True)
+        return True
+
+    def confirm(self, step: str, frame, action: Callable[[], None], expression: str, arg=None,
+                timeout_ms: int = CONFIRM_WAIT_MS) -> bool:
+        """
+        遷移するとは限らない操作（『確定』等。JS だけのボタンや選択済みなら遷移しない）：
+        遷移は timeout_ms だけ待ち、来なくても止まらずに expression（選択の反映など）を同じ上限で待つ。
+        action() 自体の失敗（押せない等）はそのまま送出。
+        """
+        t0 = time.perf_counter()
+        done, navigated = False, True
+        try:
+            with frame.expect_navigation(wait_until="domcontentloaded", timeout=self.timeout(timeout_ms)):
+                action()
+                done = True
+        except Exception as e:
+            if not (done and _is_timeout(e)):
+                raise
+            navigated = False
+        try:
+            frame.wait_for_function(expression, arg=arg, timeout=self.timeout(timeout_ms))
+            ok = True
+        except Exception as e:
+            if not _is_timeout(e):
+                raise
+            ok = False
+        self._record(step, t0, ok, navigated=navigated)
+        return ok
+
+    def summary(self) -> dict:
+        """ step → {"n", "total_ms", "max_ms"} """
+        return {
+            step: {"n": len(v), "total_ms": round(sum(v), 1), "max_ms": round(max(v), 1)}
+            for step, v in self.samples.items()
+        }
+
+
+class AsyncWaiter(Waiter):
+    """ playwright.async_api 用（記録・集計は Waiter と共通） """
+
+    async def until(self, step, predicate, timeout_ms=None) -> bool:
+        t0 = time.perf_counter()
+        deadline = t0 + self.timeout(timeout_ms) / 1000
+        while True:
+            try:
+                if await predicate():
+                    self._record(step, t0, True)
+                    return True
+            except Exception:
+                pass
+            if time.perf_counter() >= deadline:
+                self._record(step, t0, False)
+                return False
+            await asyncio.sleep(POLL_MS / 1000)
+
+    async def js(self, step, frame, expression, arg=None, timeout_ms=None) -> bool:
+        t0 = time.perf_counter()
+        try:
+            await frame.wait_for_function(expression, arg=arg, timeout=self.timeout(timeout_ms))
+        except Exception as e:
+            if not _is_timeout(e):
+                raise
+            self._record(step, t0, False)
+            return False
+        self._record(step, t0, True)
+        return True
+
+    async def navigation(self, step, frame, action) -> bool:
+        t0 = time.perf_counter()
+        try:
+            async with frame.expect_navigation(wait_until="domcontentloaded", timeout=self.timeout()):
+                if await action() is False:
+                    raise _NoNavigation()
+        except _NoNavigation:
+            return False
+        except Exception as e:
+            if not _is_timeout(e):
+                raise
+            self._record(step, t0, False)
+            return True
+        self._record(step, t0, True)
+        return True
+
+    async def confirm(self, step, frame, action, expression, arg=None, timeout_ms: int = CONFIRM_WAIT_MS) -> bool:
+        t0 = time.perf_counter()
+        done, navigated = False, True
+        try:
+            async with frame.expect_navigation(wait_until="domcontentloaded", timeout=self.timeout(timeout_ms)):
+                await action()
+                done = True
+        except Exception as e:
+            if not (done and _is_timeout(e)):
+                raise
+            navigated = False
+        try:
+            await frame.wait_for_function(expression, arg=arg, timeout=self.timeout(timeout_ms))
+            ok = True
+        except Exception as e:
+            if not _is_timeout(e):
+                raise
+            ok = False
+        self._record(step, t0, ok, navigated=navigated)
+        return ok
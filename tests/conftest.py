@@ -0,0 +1,5 @@
+# tests/conftest.py — リポジトリ直下から `python -m pytest` でも `pytest` でも modules を import できるように
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,107 @@
+# tests/test_diffstore.py — 既知枠ストア（JSON / SQLite が同じ結果を返すこと、過去日の削除、prev.json の移行）
+import json
+
+import pytest
+
+from modules import diffstore
+from modules.diffstore import DiffStore, SqliteDiffStore, open_store
+from modules.utils import Slot
+
+TODAY = 20251010
+
+
+@pytest.fixture(autouse=True)
+def fixed_today(monkeypatch):
+    monkeypatch.setattr(diffstore, "_today", lambda: TODAY)
+
+
+def slot(date: str, time: str = "9:00–11:00", facility: str = "施設A 部屋1") -> Slot:
+    return Slot.from_record({"date": date, "time": time, "facility": facility})
+
+
+KNOWN = [slot("2025-10-10"), slot("2025-10-11", "13:00–15:00"), slot("2025-10-12", facility="施設B 部屋2")]
+CURRENT = KNOWN[1:] + [slot("2025-10-11", "15:00–17:00"), slot("2025-10-20")]
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request, tmp_path):
+    s = open_store(tmp_path, request.param)
+    yield s
+    s.close()
+
+
+def test_diff_returns_only_new_slots(store):
+    store.save(KNOWN)
+    assert store.diff(CURRENT) == CURRENT[2:]
+    assert store.diff(KNOWN) == []
+
+
+def test_diff_accepts_legacy_dicts(store):
+    store.save(KNOWN)
+    assert store.diff([s.to_record() for s in CURRENT]) == [s.to_record() for s in CURRENT[2:]]
+
+
+def test_save_union_and_overwrite(store):
+    store.save(KNOWN)
+    store.save(CURRENT)
+    assert sorted(store.prev) == sorted(set(KNOWN) | set(CURRENT))
+    assert len(store) == len(set(KNOWN) | set(CURRENT))
+    store.save(CURRENT, mode="overwrite")
+    assert sorted(store.prev) == sorted(CURRENT)
+
+
+def test_prev_setter_replaces_known(store):
+    store.save(KNOWN)
+    store.prev = CURRENT[:1]
+    assert list(store.prev) == CURRENT[:1]
+    assert store.diff(KNOWN) == [KNOWN[0], KNOWN[2]]
+
+
+def test_sqlite_persists_across_reopen(tmp_path):
+    s = SqliteDiffStore(tmp_path / "prev.sqlite3")
+    s.save(KNOWN)
+    s.close()
+    s = SqliteDiffStore(tmp_path / "prev.sqlite3")
+    try:
+        assert s.diff(CURRENT) == CURRENT[2:]
+    finally:
+        s.close()
+
+
+def test_sqlite_prunes_past_dates(tmp_path):
+    s = SqliteDiffStore(tmp_path / "prev.sqlite3")
+    try:
+        undated = Slot(0, 540, 660, "日付不明")
+        s.save([slot("2025-10-01"), slot("2025-10-09"), undated] + KNOWN)
+        assert sorted(s.prev) == sorted(KNOWN + [undated])  # 今日より前だけ消え、日付なしは残る
+    finally:
+        s.close()
+
+
+def test_sqlite_migrates_prev_json_once(tmp_path):
+    (tmp_path / "prev.json").write_text(
+        json.dumps([s.to_record() for s in KNOWN] + [slot("2025-10-01").to_record()], ensure_ascii=False),
+        encoding="utf-8")
+    s = open_store(tmp_path, "sqlite")
+    try:
+        assert s.migrated == len(KNOWN) + 1
+        assert sorted(s.prev) == sorted(KNOWN)  # 過去日は移行後に削除
+    finally:
+        s.close()
+
+    # 2回目以降は取り込まない（prev.json が変わっても、SQLite 側の変更が優先）
+    (tmp_path / "prev.json").write_text(json.dumps([slot("2025-10-30").to_record()]), encoding="utf-8")
+    s = open_store(tmp_path, "sqlite")
+    try:
+        assert s.migrated == 0
+        assert sorted(s.prev) == sorted(KNOWN)
+    finally:
+        s.close()
+    assert json.loads((tmp_path / "prev.json").read_text(encoding="utf-8"))  # prev.json は残す
+
+
+def test_json_store_file_format(tmp_path):
+    s = DiffStore(tmp_path / "prev.json")
+    s.save(KNOWN[:1])
+    assert json.loads((tmp_path / "prev.json").read_text(encoding="utf-8")) == [
+        {"date": "2025-10-10", "time": "9:00–11:00", "facility": "施設A 部屋1"}]
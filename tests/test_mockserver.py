@@ -0,0 +1,77 @@
+# tests/test_mockserver.py — 代役サーバ相手に検索 → HTTP ページャで最後のページまで送る（ブラウザなし）
+from types import SimpleNamespace
+from urllib.parse import urlencode
+
+import pytest
+
+from modules.httppager import HttpPager, KeepAliveClient, _parse_set_cookie, page_forms
+from modules.mockserver import BASE, MockConfig, _result_page, start_mock_server
+from modules.scraper import parse_result_html
+
+pytest.importorskip("lxml")  # page_forms が使う
+
+
+@pytest.fixture
+def server(request):
+    srv = start_mock_server(getattr(request, "param", None) or MockConfig(pages=6, facilities=8, cols=4, seed=5))
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _search(srv):
+    """ ブラウザと同じ順に入口 → 検索まで進め、(1ページ目の HTML, URL, Cookie) を返す """
+    client = KeepAliveClient(timeout=5)
+    root = srv.base_url + BASE
+    status, msg, _ = client.request("GET", f"{root}/gin_menu")
+    cookie = _parse_set_cookie(msg["set-cookie"], f"{root}/gin_menu")
+    headers = {"Cookie": f"{cookie['name']}={cookie['value']}",
+               "Content-Type": "application/x-www-form-urlencoded"}
+    client.request("GET", f"{root}/gml_init", headers=headers)
+    form = {"bunrui1": "屋内スポーツ施設", "kakutei1": "1", "mokuteki": "バレーボール", "kakutei2": "1"}
+    client.request("POST", f"{root}/gml_z_group_sel_1", urlencode(form, encoding="cp932").encode(), headers)
+    status, _, data = client.request("POST", f"{root}/gml_z_result", b"selectdate=20251001", headers)
+    client.close()
+    assert status == 200
+    return data.decode("cp932"), f"{root}/gml_z_result", cookie
+
+
+def _learn(html, url, cookie):
+    # 『次へ』を押したときにブラウザが送るリクエスト（onclick で nav=next を入れて submit）
+    action, method, fields = page_forms(html, url)[0]
+    sent = urlencode([(k, "next" if k == "nav" else v) for k, v in fields])
+    req = SimpleNamespace(method=method, url=action, post_data=sent)
+    return HttpPager.learn(html, url, req, [cookie], charset="Shift_JIS")
+
+
+def test_pages_through_every_result_page(server):
+    cfg = server.state.cfg
+    html, url, cookie = _search(server)
+    pager = _learn(html, url, cookie)
+    assert pager is not None and pager.overrides == {"nav": "next"}
+
+    pages = [html]
+    while True:
+        nxt = pager.fetch_next(pages[-1], url)
+        if nxt is None:
+            break
+        html, url = nxt
+        pages.append(html)
+    pager.close()
+
+    assert pager.last_error == ""
+    assert len(pages) == cfg.pages == server.state.stats["result_pages"]
+    for i, page in enumerate(pages, start=1):
+        assert parse_result_html(page) == parse_result_html(_result_page(cfg, i))
+    assert len({r.date for page in pages for r in parse_result_html(page)}) == cfg.pages
+
+
+@pytest.mark.parametrize("server", [MockConfig(pages=4, facilities=3, cols=2, error_rate=1.0)], indirect=True)
+def test_error_page_stops_the_pager(server):
+    server.state.cfg.error_rate = 0.0
+    html, url, cookie = _search(server)
+    pager = _learn(html, url, cookie)
+    server.state.cfg.error_rate = 1.0
+    assert pager.fetch_next(html, url) is None
+    assert pager.last_error == "response is not a result page"
+    pager.close()
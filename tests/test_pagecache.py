@@ -0,0 +1,67 @@
+# tests/test_pagecache.py — ページ指紋で解析を省く（同じなら前回の結果、変われば解析し直す）
+from modules import pagecache
+from modules.bench import synth_result_page
+from modules.pagecache import PageCache, fingerprint, page_key, parse_page
+from modules.scraper import parse_result_html
+
+HTML = synth_result_page(4, 15, 6, seed=2)
+
+
+def _with_form(html: str, token: str) -> str:
+    form = f'<form name="formNext"><input type="hidden" name="token" value="{token}"></form>'
+    return synth_result_page(4, 15, 6, seed=2, form_html=form)
+
+
+def test_fingerprint_ignores_form_inputs_but_not_the_table():
+    assert fingerprint(_with_form(HTML, "a")) == fingerprint(_with_form(HTML, "b"))
+    assert fingerprint(HTML) != fingerprint(synth_result_page(4, 15, 6, seed=3))  # ○ の位置が違う
+    assert fingerprint(HTML, "regex") != fingerprint(HTML, "lxml")  # パーサが違えば別物
+
+
+def test_hit_on_same_page_miss_on_change(tmp_path):
+    key = page_key("屋内スポーツ施設/バレーボール", 1)
+    c = PageCache(tmp_path / "page_cache.json")
+    recs, hit = c.parse(key, HTML)
+    assert not hit and recs == parse_result_html(HTML)
+    c.save()
+
+    c = PageCache(tmp_path / "page_cache.json")
+    recs2, hit = c.parse(key, HTML)
+    assert hit and recs2 == recs
+
+    changed = synth_result_page(4, 15, 6, seed=9)
+    recs3, hit = c.parse(key, changed)
+    assert not hit and recs3 == parse_result_html(changed)
+    assert c.stats() == {"pages": 2, "new": 1, "reused": 1}
+
+
+def test_save_keeps_only_pages_seen_this_run(tmp_path):
+    path = tmp_path / "page_cache.json"
+    c = PageCache(path)
+    c.parse("t#1", HTML)
+    c.parse("t#2", HTML)
+    c.save()
+    c = PageCache(path)
+    c.parse("t#1", HTML)
+    c.save()
+    c = PageCache(path)
+    assert c.parse("t#2", HTML)[1] is False  # 前回見なかったページは落ちている
+
+
+def test_corrupt_cache_is_ignored(tmp_path):
+    path = tmp_path / "page_cache.json"
+    path.write_text("{broken", encoding="utf-8")
+    recs, hit = PageCache(path).parse("t#1", HTML)
+    assert not hit and recs == parse_result_html(HTML)
+
+
+def test_parse_page_without_active_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(pagecache, "_active", None)
+    assert parse_page("t#1", HTML) == (parse_result_html(HTML), False)
+    cache = PageCache(tmp_path / "page_cache.json")
+    pagecache.activate(cache)
+    try:
+        parse_page("t#1", HTML)
+        assert parse_page("t#1", HTML)[1] is False  # 比較元は前回の save 分だけ（同じ実行内では当てない）
+    finally:
+        pagecache.activate(None)
@@ -0,0 +1,66 @@
+# tests/test_scraper.py — 結果ページのパーサ（ヘッダー索引・バックエンド間の一致）
+import re
+
+import pytest
+
+from modules.bench import synth_result_page
+from modules.scraper import _HEADER_TH_RE, _HeaderIndex, _find_header_time_near, parse_result_html
+
+SHAPES = [(1, 5, 6, 0), (2, 40, 8, 1), (30, 12, 3, 7), (61, 1, 1, 2)]  # (日, 施設数, 列数, seed)
+PAGES = [synth_result_page(day, facilities, cols, seed=seed) for day, facilities, cols, seed in SHAPES]
+IDS = ["d{}-f{}-c{}-s{}".format(*shape) for shape in SHAPES]
+
+
+@pytest.mark.parametrize("html", PAGES, ids=IDS)
+def test_header_index_matches_linear_scan(html):
+    idx = _HeaderIndex(html)
+    cols = {int(m.group(2)) for m in _HEADER_TH_RE.finditer(html)} | {99}  # 99: ヘッダーのない列
+    anchors = [m.start() for m in re.finditer(r"<tr", html)] + [0, len(html)]
+    for pos in anchors:
+        for col in cols:
+            for back in (8000, 200, 0):
+                assert idx.lookup(pos, col, back) == _find_header_time_near(html, pos, col, back)
+
+
+def test_header_index_ignores_header_cut_by_search_window():
+    head = '<th id="td1_1">9:00<br>～<br>11:00</th>'
+    html = head + "x" * 50 + "<tr>"
+    anchor = html.index("<tr>")
+    assert _HeaderIndex(html).lookup(anchor, 1) == ("9:00", "11:00")
+    # ヘッダーの先頭が遡り範囲の外なら見つからない（_find_header_time_near と同じ）
+    back = anchor - 5
+    assert _HeaderIndex(html).lookup(anchor, 1, back) == ("", "") == _find_header_time_near(html, anchor, 1, back)
+
+
+@pytest.mark.parametrize("html", PAGES, ids=IDS)
+def test_regex_index_and_scan_agree(html):
+    assert parse_result_html(html, "regex") == parse_result_html(html, "regex-scan")
+
+
+def test_corpus_has_slots():
+    assert sum(len(parse_result_html(html, "regex")) for html in PAGES) > 100
+
+
+@pytest.mark.parametrize("html", PAGES, ids=IDS)
+def test_lxml_matches_regex(html):
+    pytest.importorskip("lxml")
+    assert parse_result_html(html, "lxml") == parse_result_html(html, "regex")
+
+
+def test_lxml_handles_xml_declaration_and_declared_charset():
+    pytest.importorskip("lxml")
+    html = '<?xml version="1.0" encoding="Shift_JIS"?>\n' + synth_result_page(3, 10, 6, seed=4, charset="Shift_JIS")
+    assert parse_result_html(html, "lxml") == parse_result_html(html, "regex") != []
+
+
+def test_lxml_failure_falls_back_to_regex_and_logs(monkeypatch):
+    lxml_html = pytest.importorskip("lxml.html")
+
+    def boom(_html):
+        raise ValueError("boom")
+
+    monkeypatch.setattr(lxml_html, "document_fromstring", boom)
+    logged = []
+    recs = parse_result_html(PAGES[1], "lxml", log=lambda line, **kw: logged.append((line, kw)))
+    assert recs == parse_result_html(PAGES[1], "regex")
+    assert len(logged) == 1 and logged[0][1]["level"] == "warn"
@@ -0,0 +1,81 @@
+# tests/test_shard.py — 日付ウィンドウ（境界の判定と、selectdate が効かないときに分割をやめる ShardRun）
+import threading
+
+from modules.shard import Bounds, DateWindow, ShardRun, _bounds, date_windows
+
+KEY = "屋内スポーツ施設/バレーボール"
+W0, W1, W2 = date_windows(7, 3)
+B0 = Bounds("2025-10-01", "2025-10-08")
+B1 = Bounds("2025-10-08", "2025-10-15")
+B2 = Bounds("2025-10-15", None)
+
+
+class Log:
+    def __init__(self):
+        self.lines = []
+
+    def __call__(self, line, **kw):
+        self.lines.append((line, kw))
+
+
+def test_windows_and_bounds():
+    assert (W0, W1, W2) == (DateWindow(0, 7), DateWindow(7, 7), DateWindow(14, None))
+    assert date_windows(0, 4) == [] and date_windows(7, 1) == []
+    assert _bounds("20251001", W1) == B1 and _bounds("20251001", W2) == B2
+    assert _bounds("", W0) is None
+    assert [B1.position(d) for d in ("2025-10-07", "2025-10-08", "2025-10-14", "2025-10-15", "")] == [-1, 0, 0, 1, 0]
+
+
+def test_normal_sharding_keeps_each_window_bounded():
+    run, log = ShardRun(), Log()
+    assert not run.skip(KEY, W1)
+    assert run.adjust(KEY, W0, B0, 1, log) == B0  # 最初のウィンドウは自分の終わりで止まる
+    assert run.adjust(KEY, W1, B1, 1, log) == B1
+    assert not run.skip(KEY, W2) and log.lines == []
+
+
+def test_first_window_finished_then_later_window_takes_over():
+    run, log = ShardRun(), Log()
+    run.adjust(KEY, W0, B0, 1, log)                 # 最初のウィンドウが 10-08 で終了
+    taken = run.adjust(KEY, W1, B1, -1, log)        # W1 が開始日より前のページを見た
+    assert taken == Bounds(B0.end, None)
+    assert taken.position("2025-10-05") == -1 and taken.position("2025-10-08") == 0
+    assert run.adjust(KEY, W1, taken, -1, log) == taken  # 引き継いだ後の読み飛ばしは続ける
+    assert run.adjust(KEY, W2, B2, -1, log) is None      # ほかのウィンドウは止める
+    assert run.skip(KEY, W2) and not run.skip(KEY, W0)
+    assert len(log.lines) == 1 and log.lines[0][1]["event"] == "shard"
+
+
+def test_first_window_still_running_reads_to_the_end():
+    run, log = ShardRun(), Log()
+    assert run.adjust(KEY, W1, B1, -1, log) is None  # 最初のウィンドウに任せて止める
+    assert run.adjust(KEY, W0, B0, 1, log) == Bounds(B0.start, None)
+    assert run.adjust(KEY, W2, B2, -1, log) is None
+    assert run.skip(KEY, W1) and run.skip(KEY, W2)
+
+
+def test_targets_are_independent():
+    run, log = ShardRun(), Log()
+    run.adjust(KEY, W1, B1, -1, log)
+    assert run.skip(KEY, W2)
+    assert not run.skip("文化施設/合唱", W2)
+    assert run.adjust("文化施設/合唱", W0, B0, 1, log) == B0
+
+
+def test_only_one_window_takes_over_under_contention():
+    run, log = ShardRun(), Log()
+    run.adjust(KEY, W0, B0, 1, log)
+    windows = [DateWindow(7 * i, 7) for i in range(1, 9)]
+    results = {}
+    barrier = threading.Barrier(len(windows))
+
+    def worker(w):
+        barrier.wait()
+        results[w] = run.adjust(KEY, w, Bounds("2025-10-08", "2025-10-15"), -1, log)
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in windows]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(r is not None for r in results.values()) == 1
@@ -0,0 +1,37 @@
+# tests/test_utils.py — Slot（抽出 → 差分 → 通知で共通のレコード）
+import json
+
+import pytest
+
+from modules.bench import synth_result_page
+from modules.scraper import parse_result_html
+from modules.utils import Slot
+
+
+@pytest.mark.parametrize("rec", [
+    {"date": "2025-10-04", "time": "9:00–11:00", "facility": "施設001 部屋1"},
+    {"date": "2026-01-31", "time": "19:00–22:00", "facility": "体育館 第2"},
+    {"date": "2025-12-01", "time": "7:00–9:00", "facility": "会議室"},
+])
+def test_from_record_to_record_round_trip(rec):
+    slot = Slot.from_record(rec)
+    assert slot.to_record() == rec
+    assert Slot.from_record(slot.to_record()) == slot
+
+
+def test_from_record_accepts_legacy_date_iso():
+    rec = {"date_iso": "2025-10-04", "time": "13:00–15:00", "facility": "施設A 部屋1"}
+    assert Slot.from_record(rec).to_record() == {"date": "2025-10-04", "time": "13:00–15:00", "facility": "施設A 部屋1"}
+
+
+def test_parsed_slots_survive_json():
+    slots = parse_result_html(synth_result_page(5, 20, 6, seed=3), "regex")
+    assert slots
+    raw = json.loads(json.dumps([s.to_record() for s in slots], ensure_ascii=False))
+    assert [Slot.from_record(r) for r in raw] == slots
+
+
+def test_facility_names_are_shared():
+    a = Slot.from_record({"date": "2025-10-04", "time": "9:00–11:00", "facility": "".join(["施設", "X"])})
+    b = Slot.from_record({"date": "2025-10-05", "time": "9:00–11:00", "facility": "".join(["施設", "X"])})
+    assert a.facility is b.facility